@@ -0,0 +1,156 @@
+import pandas as pd
+
+# --- ANALYTICS DE TICKETS ---
+# Os KPIs e gráficos usam contagens agregadas calculadas no backend sobre o grafo inteiro
+# (GET /tickets/analytics/aggregates). As linhas de detalhe são paginadas sob demanda
+# (GET /tickets/analytics?dimension=&value=&limit=&offset=).
+# Se o backend ainda não tiver a rota de agregados, o app cai para a amostra de 100 tickets
+# e os mesmos agregados são calculados localmente (TicketTable.aggregates).
+# Tudo que é derivado dos dados (distribuições, top KPIs, agrupamentos do drill-down) é montado
+# uma única vez por versão dos dados no AnalyticsModel; o app faz o cache por essa versão.
+
+DIMENSIONS = (
+    "sintoma_categoria",
+    "causa_categoria",
+    "recurso_nivel_2",
+    "solucao_categoria",
+    "lista_erros",
+    "lista_eventos",
+)
+LIST_DIMENSIONS = ("lista_erros", "lista_eventos")
+
+AGGREGATES_SUFFIX = "/aggregates"
+DEFAULT_PAGE_SIZE = 50
+
+
+def fetch_aggregates(api, path, dimensions=DIMENSIONS, top=50):
+    # Retorna {"version": str, "total": int, "dimensions": {dim: [{"categoria", "quantidade"}, ...]}}
+    # ou None quando o backend não expõe a rota (404/405)
+    # GET condicional: em 304 o JSON anterior é reaproveitado e a versão (ETag) não muda
+    result = api.get_json(f"{path}{AGGREGATES_SUFFIX}", params={"dimensions": ",".join(dimensions), "top": top})
+    if result.status_code in (404, 405):
+        return None
+    if not result.ok:
+        raise RuntimeError(f"HTTP {result.status_code}: {result.text[:300]}")
+    data = result.data
+    return {
+        "version": result.version,
+        "total": int(data.get("total", 0)),
+        "dimensions": {d: data.get("dimensions", {}).get(d, []) for d in dimensions},
+    }
+
+
+def fetch_detail_page(api, path, dimension=None, value=None, offset=0, limit=DEFAULT_PAGE_SIZE):
+    # Retorna (DataFrame da página, total de linhas do filtro)
+    params = {"limit": limit, "offset": offset}
+    if dimension and value is not None:
+        params.update({"dimension": dimension, "value": value})
+    result = api.get_json(path, params=params)
+    if not result.ok:
+        raise RuntimeError(f"HTTP {result.status_code}: {result.text[:300]}")
+    data = result.data
+    if isinstance(data, list):
+        # Backend antigo: lista simples sem total
+        return pd.DataFrame(data), offset + len(data)
+    return pd.DataFrame(data.get("items", [])), int(data.get("total", 0))
+
+
+def join_list_column(series, sep=", ", empty="-"):
+    # .str.join opera direto nas listas; valores que não são lista viram o marcador vazio
+    if series.dtype != object:
+        return pd.Series(empty, index=series.index)
+    joined = series.where(series.map(type).eq(list)).str.join(sep)
+    return joined.where(joined.notna() & (joined != ""), empty)
+
+
+def format_list_columns(df):
+    # Processamento de listas para exibição (String bonita)
+    df = df.copy()
+    for col, col_str in (("lista_erros", "erros_str"), ("lista_eventos", "eventos_str")):
+        df[col_str] = join_list_column(df[col]) if col in df.columns else "-"
+    return df
+
+
+def build_long_format(df, dimensions=DIMENSIONS):
+    # Tabela longa (id, dimensao, categoria) com as listas já explodidas e sem linhas repetidas:
+    # todas as contagens e máscaras do drill-down saem dela com operações vetorizadas
+    partes = []
+    for d in dimensions:
+        if d not in df.columns:
+            continue
+        parte = df[["id", d]]
+        if d in LIST_DIMENSIONS:
+            parte = parte.explode(d)
+        parte = parte.rename(columns={d: "categoria"})
+        parte = parte[parte["categoria"].notna() & (parte["categoria"] != "")]
+        partes.append(parte.assign(dimensao=d))
+    if not partes:
+        return pd.DataFrame(columns=["id", "categoria", "dimensao"])
+    return pd.concat(partes, ignore_index=True).drop_duplicates()
+
+
+def build_label_index(df, width=30):
+    # id -> "id - titulo..." montado uma vez por carga (evita filtrar o DataFrame por opção do selectbox)
+    base = df.drop_duplicates(subset=["id"])
+    titulos = base["titulo"].fillna("").astype(str) if "titulo" in base.columns else pd.Series("", index=base.index)
+    labels = base["id"].astype(str) + " - " + titulos.str[:width] + "..."
+    return dict(zip(base["id"], labels))
+
+
+class TicketTable:
+    # Amostra local pré-processada uma vez por carga: strings de exibição, tabela longa e rótulos
+    def __init__(self, df):
+        self.df = format_list_columns(df)
+        self.long = build_long_format(df)
+        self.labels = build_label_index(df)
+        # (dimensao, categoria) -> ids: agrupamentos do drill-down prontos
+        self.groups = self.long.groupby(["dimensao", "categoria"])["id"].unique().to_dict()
+        self._filtered = {}
+
+    def aggregates(self, dimensions=DIMENSIONS):
+        # Mesmo formato de fetch_aggregates, calculado sobre a amostra local
+        counts = self.long.groupby(["dimensao", "categoria"]).size()
+        resultado = {}
+        for d in dimensions:
+            serie = counts.xs(d, level="dimensao") if d in counts.index.get_level_values("dimensao") else counts.iloc[:0]
+            serie = serie.sort_values(ascending=False, kind="stable")
+            resultado[d] = [{"categoria": k, "quantidade": int(v)} for k, v in serie.items()]
+        return {"total": int(self.df["id"].nunique()), "dimensions": resultado}
+
+    def filter(self, dimension, value):
+        # Máscara via agrupamento pré-calculado (serve para colunas simples e listas), memoizada
+        key = (dimension, value)
+        if key not in self._filtered:
+            ids = self.groups.get(key, [])
+            self._filtered[key] = self.df[self.df["id"].isin(ids)].drop_duplicates(subset=["id"])
+        return self._filtered[key]
+
+
+def distribution_frame(aggregates, dimension):
+    rows = aggregates["dimensions"].get(dimension, [])
+    df_chart = pd.DataFrame(rows, columns=["categoria", "quantidade"])
+    df_chart.columns = ["Categoria", "Quantidade"]
+    return df_chart
+
+
+def top_category(aggregates, dimension, default="N/A"):
+    rows = aggregates["dimensions"].get(dimension, [])
+    return rows[0]["categoria"] if rows else default
+
+
+
+class AnalyticsModel:
+    # Tudo que a aba de tickets precisa, pré-calculado para uma versão dos dados
+    def __init__(self, version, aggregates, table=None):
+        self.version = version
+        self.aggregates = aggregates
+        self.table = table
+        self.server_side = table is None
+        self.total = aggregates["total"]
+        self.top_modulo = top_category(aggregates, "recurso_nivel_2")
+        self.top_erro = top_category(aggregates, "lista_erros", default="Nenhum")
+        self.distributions = {d: distribution_frame(aggregates, d) for d in DIMENSIONS}
+        self.category_totals = {
+            d: dict(zip(df_chart["Categoria"], df_chart["Quantidade"]))
+            for d, df_chart in self.distributions.items()
+        }
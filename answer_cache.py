@@ -0,0 +1,134 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# --- CACHE DE RESPOSTAS DO CHAT ---
+# Perguntas de primeiro turno (sem histórico e sem imagem) se repetem muito: "como calcular férias",
+# "erro S-1200 rubrica". A resposta do /queries é guardada pela pergunta normalizada (minúsculas,
+# sem acentos e pontuação) e pelo contexto (sistema). O padrão é só a mesma pergunta; perguntas
+# parecidas (similaridade de trigramas de caracteres) são opt-in e nunca casam se os códigos
+# citados diferem ("S-1200" x "S-1210"). Só respostas de agentes de consulta entram no cache:
+# o cache é compartilhado entre sessões e não pode repetir uma ação (ex.: abrir ticket).
+# TTL + LRU limitado; o app limpa tudo quando os prompts do agente mudam (/prompts).
+
+DEFAULT_TTL_SECONDS = 6 * 60 * 60
+DEFAULT_MAX_ENTRIES = 500
+DEFAULT_FUZZY_SIMILARITY = 0.9
+
+READ_ONLY_AGENTS = ("receptionist", "specialist")
+SIDE_EFFECT_AGENTS = ("ticket",)
+# Metadados que indicam que o agente chamou ferramentas ou executou alguma ação
+SIDE_EFFECT_KEYS = ("tool_calls", "tools", "tools_used", "actions", "side_effects")
+
+_CODE_PATTERN = re.compile(r"[a-z0-9]+(?:[-./][a-z0-9]+)*")
+
+
+def _strip_accents(text):
+    decomposed = unicodedata.normalize("NFKD", str(text or "").lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def normalize_prompt(text):
+    limpo = "".join(c if c.isalnum() else " " for c in _strip_accents(text))
+    return " ".join(limpo.split())
+
+
+def code_tokens(text):
+    # Números e códigos citados na pergunta ("S-1200", "1210", "v2.3"), com a pontuação interna
+    return frozenset(t for t in _CODE_PATTERN.findall(_strip_accents(text)) if any(c.isdigit() for c in t))
+
+
+def is_cacheable(metadata):
+    # Só respostas de agentes de consulta, sem ferramenta/ação registrada nos metadados
+    metadata = metadata or {}
+    agent = str(metadata.get("agent") or "").lower()
+    if not agent or any(a in agent for a in SIDE_EFFECT_AGENTS):
+        return False
+    if not any(a in agent for a in READ_ONLY_AGENTS):
+        return False
+    return not any(metadata.get(k) for k in SIDE_EFFECT_KEYS)
+
+
+def _trigrams(normalized):
+    padded = f"  {normalized} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class CachedAnswer:
+    __slots__ = ("text", "metadata", "created_at", "hits", "grams", "codes")
+
+    def __init__(self, text, metadata, grams, codes):
+        self.text = text
+        self.metadata = metadata
+        self.created_at = time.time()
+        self.hits = 0
+        self.grams = grams
+        self.codes = codes
+
+
+class AnswerCache:
+    def __init__(self, ttl=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (contexto, pergunta normalizada) -> CachedAnswer
+        # Compartilhado entre sessões do processo (st.cache_resource)
+        self._lock = threading.Lock()
+
+    def _expired(self, entry, now):
+        return now - entry.created_at > self.ttl
+
+    def get(self, context, prompt, similarity=None):
+        # Devolve (CachedAnswer, similaridade) ou None. similarity=None: só a pergunta exata (normalizada).
+        normalized = normalize_prompt(prompt)
+        if not normalized:
+            return None
+        key = (context, normalized)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                entry = None
+            score = 1.0
+            if entry is None and similarity:
+                entry, score, key = self._most_similar(context, normalized, code_tokens(prompt), similarity, now)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            return entry, score
+
+    def _most_similar(self, context, normalized, codes, similarity, now):
+        # Varredura linear: o cache é limitado (max_entries), então continua na casa do milissegundo
+        grams = _trigrams(normalized)
+        best = (None, 0.0, None)
+        for key, entry in self._entries.items():
+            if key[0] != context or self._expired(entry, now):
+                continue
+            # Mesmo texto com outro código é outra pergunta ("erro S-1200" x "erro S-1210")
+            if entry.codes != codes:
+                continue
+            score = 2 * len(grams & entry.grams) / (len(grams) + len(entry.grams))
+            if score >= similarity and score > best[1]:
+                best = (entry, score, key)
+        return best
+
+    def put(self, context, prompt, text, metadata=None):
+        normalized = normalize_prompt(prompt)
+        if not normalized or not text:
+            return
+        with self._lock:
+            self._entries[(context, normalized)] = CachedAnswer(text, dict(metadata or {}), _trigrams(normalized),
+                                                                code_tokens(prompt))
+            self._entries.move_to_end((context, normalized))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,146 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# --- CLIENTE HTTP COMPARTILHADO ---
+# Uma única Session por processo (criada via st.cache_resource no app.py):
+# reaproveita as conexões TCP/TLS com o BASE_URL entre reruns do Streamlit.
+
+CONNECT_TIMEOUT = 5
+
+# Timeout de leitura por rota (prefixo do path). Rotas não listadas usam o default.
+DEFAULT_READ_TIMEOUTS = {
+    "/queries": 60,
+    "/ingest-pipeline": 900,
+    "/tickets/analytics": 10,
+    "/debug/cypher": 30,
+    "/prompts": 15,
+    "/taxonomies/nodes": 15,
+}
+DEFAULT_READ_TIMEOUT = 30
+
+# Retry com backoff apenas em métodos idempotentes (POST/PUT/DELETE nunca são repetidos).
+# Só status de sobrecarga e falhas de conexão: um read timeout não é repetido (cada tentativa
+# esperaria o timeout inteiro de novo e travaria o fragmento por vários ciclos)
+RETRY_METHODS = frozenset(["GET", "HEAD", "OPTIONS"])
+RETRY_STATUS = (429, 502, 503, 504)
+
+# Quantas respostas (URL+params) guardamos para GETs condicionais
+CONDITIONAL_CACHE_SIZE = 256
+
+
+class JsonResult:
+    # Resultado de um GET condicional: em 304 o `data` é o JSON já decodificado da resposta anterior
+    def __init__(self, status_code, data=None, version=None, not_modified=False, text=""):
+        self.status_code = status_code
+        self.data = data
+        self.version = version
+        self.not_modified = not_modified
+        self.text = text
+
+    @property
+    def ok(self):
+        return self.status_code == 200
+
+    def json(self):
+        return self.data
+
+
+class ApiClient:
+    def __init__(self, base_url, tenant_id, pool_size=20, read_timeouts=None,
+                 retries=3, backoff_factor=0.5):
+        self.base_url = base_url.rstrip("/")
+        self.tenant_id = tenant_id
+        self.read_timeouts = {**DEFAULT_READ_TIMEOUTS, **(read_timeouts or {})}
+
+        retry = Retry(
+            total=retries,
+            read=0,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS,
+            allowed_methods=RETRY_METHODS,
+            raise_on_status=False,
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"X-Tenant-ID": tenant_id})
+
+        # (path, params) -> (ETag, Last-Modified, versão, JSON decodificado)
+        self._validators = OrderedDict()
+        self._validators_lock = threading.Lock()
+
+    def url(self, path):
+        return f"{self.base_url}{path}"
+
+    def timeout_for(self, path):
+        # Escolhe o prefixo mais longo que casa com o path (ex: /taxonomies/nodes/<id>)
+        matches = [p for p in self.read_timeouts if path.startswith(p)]
+        read = self.read_timeouts[max(matches, key=len)] if matches else DEFAULT_READ_TIMEOUT
+        return (CONNECT_TIMEOUT, read)
+
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault("timeout", self.timeout_for(path))
+        return self.session.request(method, self.url(path), **kwargs)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def get_json(self, path, params=None, **kwargs):
+        # GET condicional (If-None-Match / If-Modified-Since): em 304 reaproveita o JSON
+        # decodificado da última resposta 200, sem baixar nem decodificar o corpo de novo.
+        # O JSON devolvido é compartilhado entre chamadas: quem chama não deve alterá-lo.
+        key = (path, tuple(sorted((params or {}).items())))
+        with self._validators_lock:
+            cached = self._validators.get(key)
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if cached:
+            etag, last_modified, _, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        resp = self.get(path, params=params, headers=headers, **kwargs)
+
+        if resp.status_code == 304 and cached:
+            with self._validators_lock:
+                self._validators.move_to_end(key)
+            return JsonResult(200, cached[3], version=cached[2], not_modified=True)
+
+        if resp.status_code != 200:
+            return JsonResult(resp.status_code, text=resp.text)
+
+        data = resp.json()
+        etag = resp.headers.get("ETag")
+        last_modified = resp.headers.get("Last-Modified")
+        version = etag or last_modified or hashlib.sha1(resp.content).hexdigest()
+
+        if etag or last_modified:
+            with self._validators_lock:
+                self._validators[key] = (etag, last_modified, version, data)
+                self._validators.move_to_end(key)
+                while len(self._validators) > CONDITIONAL_CACHE_SIZE:
+                    self._validators.popitem(last=False)
+
+        return JsonResult(200, data, version=version)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def close(self):
+        self.session.close()
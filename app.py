@@ -1,10 +1,40 @@
 import streamlit as st
-import requests
 import uuid
 import json
 import pandas as pd
 import random
+import time
 import altair as alt
+from concurrent.futures import wait
+from api_client import ApiClient
+from chat_worker import ChatWorker, EMPTY_RESPONSE, JOB_DONE, JOB_ERROR
+from answer_cache import AnswerCache, DEFAULT_FUZZY_SIMILARITY, is_cacheable
+from message_store import DEFAULT_VISIBLE_MESSAGES, MessageStore
+from ingest_telemetry import format_seconds
+from ingest_scheduler import IngestScheduler
+from ingest_jobs import (
+    ACTIVE_STATUSES, JOB_DONE as INGEST_DONE, JOB_ERROR as INGEST_ERROR, JOB_INTERRUPTED,
+    JOB_PARTIAL, JOB_QUEUED, JOB_RUNNING as INGEST_RUNNING, IngestJobRegistry
+)
+from chat_history import (
+    HISTORY_MODE_SERVER, HISTORY_MODE_WINDOW, DEFAULT_MAX_HISTORY_TOKENS,
+    SERVER_STATE_MISSING_STATUS, MARCADOR_IMAGEM, build_history_payload, server_keeps_history
+)
+from ticket_source import TEMPLATE_JSON, TicketSource
+from prefilter import DEFAULT_MIN_CHARS, PrefilterRules, apply_rules, projected_funnel, tickets_frame
+from dedupe_index import DedupeIndex, DedupeCounter
+from vision_cache import VisionAnalyzer
+from image_prep import DEFAULT_MAX_DIMENSION, ImagePreprocessor
+from analytics import (
+    DEFAULT_PAGE_SIZE, AnalyticsModel, TicketTable, build_label_index,
+    fetch_aggregates, fetch_detail_page, format_list_columns
+)
+from taxonomy import LazyTaxonomy, TaxonomyIndex, TaxonomyTree, node_matches
+from taxonomy_bulk import (
+    BulkImporter, export_csv, export_json, parse_csv, parse_json, plan_import,
+    DEFAULT_BATCH_SIZE as BULK_DEFAULT_BATCH_SIZE, DEFAULT_MAX_WORKERS as BULK_DEFAULT_MAX_WORKERS
+)
+from ingestion import ChunkedIngestion, DEFAULT_CHUNK_SIZE, DEFAULT_MAX_WORKERS, iter_chunks
 
 # --- CONFIGURAÇÃO DA PÁGINA ---
 st.set_page_config(
@@ -17,23 +47,182 @@ st.set_page_config(
 BASE_URL = "https://api.nasajon.app/nsj-ia-suporte"
 # BASE_URL = "http://localhost:5000/nsj-ia-suporte" # Para teste local
 
-# Rotas do Sistema
-STATS_URL = f"{BASE_URL}/stats" # <--- CORREÇÃO APLICADA
-CHAT_URL = f"{BASE_URL}/queries"
-INGEST_URL = f"{BASE_URL}/ingest-pipeline"
-PROMPTS_URL = f"{BASE_URL}/prompts"
-TAXONOMY_URL = f"{BASE_URL}/taxonomies/nodes"
+# Rotas do Sistema (paths relativos ao BASE_URL, usados pelo ApiClient)
+STATS_PATH = "/stats"
+CHAT_PATH = "/queries"
+INGEST_PATH = "/ingest-pipeline"
+PROMPTS_PATH = "/prompts"
+TAXONOMY_PATH = "/taxonomies/nodes"
+ANALYTICS_PATH = "/tickets/analytics"
+CYPHER_PATH = "/debug/cypher"
 
 # Define o Tenant ID fixo (já que removemos a seleção da sidebar)
 tenant_id = "1" 
 
+# --- CLIENTE HTTP (UM POR PROCESSO) ---
+# Session com keep-alive compartilhada entre reruns e sessões: evita novo handshake TLS a cada widget.
+@st.cache_resource
+def get_api_client(base_url, tenant):
+    return ApiClient(base_url, tenant)
+
+api = get_api_client(BASE_URL, tenant_id)
+
+# Índice local (SQLite) dos tickets já aceitos pelo servidor, compartilhado pelo processo
+@st.cache_resource
+def get_dedupe_index():
+    return DedupeIndex()
+
+# --- VISÃO COMPUTACIONAL (UM SERVIÇO POR PROCESSO) ---
+@st.cache_resource
+def get_vision_service():
+    from nasajon.service.vision_service import VisionService
+    return VisionService()
+
+# Pool de análise + cache de descrições por hash do conteúdo, compartilhados pelo processo
+@st.cache_resource
+def get_vision_analyzer():
+    return VisionAnalyzer(get_vision_service)
+
+# --- CHAT EM SEGUNDO PLANO (UM POOL POR PROCESSO) ---
+CHAT_POLL_SECONDS = 0.5
+
+@st.cache_resource
+def get_chat_worker():
+    return ChatWorker(api, CHAT_PATH, retry_status=SERVER_STATE_MISSING_STATUS)
+
+# Respostas de primeiro turno reaproveitadas entre sessões; limpo quando um prompt é salvo
+@st.cache_resource
+def get_answer_cache():
+    return AnswerCache()
+
+# --- CACHE DE ANALYTICS (POR VERSÃO DOS DADOS) ---
+# O snapshot define a versão (ETag/hash) dos dados; o modelo derivado e os gráficos
+# ficam em cache por versão, então interações na aba de tickets não recalculam nada.
+# A revalidação é um GET condicional: dados inalterados custam um 304 sem corpo.
+@st.cache_data(ttl=15)
+def fetch_analytics_snapshot():
+    # Agregados calculados no backend sobre o grafo inteiro
+    try:
+        agregados = fetch_aggregates(api, ANALYTICS_PATH)
+        if agregados is not None:
+            return agregados["version"], agregados, None
+    except Exception as e:
+        st.error(f"Falha ao buscar agregados: {e}")
+
+    # Fallback: amostra fixa para backends sem a rota de agregados
+    try:
+        # Consome a rota criada no Passo 2
+        resp = api.get_json(ANALYTICS_PATH, params={"limit": 100})
+        if resp.ok:
+            data = resp.data
+            records = data.get("items", []) if isinstance(data, dict) else data
+            return resp.version, None, records
+        else:
+            st.error(f"Erro API: {resp.text}")
+    except Exception as e:
+        st.error(f"Falha de conexão: {e}")
+    return None
+
+@st.cache_resource(max_entries=8)
+def build_analytics_model(version, _agregados, _records):
+    # Parâmetros com "_" não entram na chave do cache: a versão já identifica o conteúdo
+    if _agregados is not None:
+        return AnalyticsModel(version, _agregados)
+    df = pd.DataFrame(_records)
+    if df.empty:
+        return None
+    # Amostra local: TicketTable pré-processada (tabela longa, rótulos e agrupamentos)
+    tabela = TicketTable(df)
+    return AnalyticsModel(version, tabela.aggregates(), tabela)
+
+@st.cache_resource(max_entries=64)
+def build_distribution_chart(version, dimension, _df_chart):
+    chart = alt.Chart(_df_chart).mark_bar(color="#FF4B4B", cornerRadiusEnd=4).encode(
+        x=alt.X('Quantidade', title=None), 
+        y=alt.Y('Categoria', sort='-x', title=None),
+        tooltip=['Categoria', 'Quantidade']
+    ).properties(height=300)
+    
+    text = chart.mark_text(align='left', baseline='middle', dx=3).encode(text='Quantidade')
+    return chart + text
+
+# Página de detalhe do drill-down (só a página visível é baixada), válida para uma versão dos dados
+@st.cache_data(max_entries=256)
+def fetch_detail_page_api(version, dimension, value, offset, limit):
+    try:
+        return fetch_detail_page(api, ANALYTICS_PATH, dimension, value, offset, limit)
+    except Exception as e:
+        st.error(f"Falha ao buscar tickets: {e}")
+        return pd.DataFrame(), 0
+
+def invalidate_analytics_cache():
+    # Força nova versão na próxima leitura (ex: após uma ingestão gravar tickets)
+    fetch_analytics_snapshot.clear()
+
+# --- INGESTÃO EM SEGUNDO PLANO (UM REGISTRO DE JOBS POR PROCESSO) ---
+# Repinturas por segundo do painel do job, tamanho do buffer de log e erros exibidos
+INGEST_REPAINTS_PER_SECOND = 4
+INGEST_LOG_LINES = 200
+INGEST_ERRORS_SHOWN = 20
+
+# ícone, texto, estado do st.status
+STATUS_JOB = {
+    JOB_QUEUED: ("⏳", "Na fila", "running"),
+    INGEST_RUNNING: ("🚀", "Em andamento", "running"),
+    INGEST_DONE: ("✅", "Processamento Concluído!", "complete"),
+    JOB_PARTIAL: ("⚠️", "Concluído com falhas", "error"),
+    INGEST_ERROR: ("🔌", "Erro de Conexão", "error"),
+    JOB_INTERRUPTED: ("⛔", "Interrompido", "error"),
+}
+
+@st.cache_resource
+def get_ingest_jobs():
+    return IngestJobRegistry(log_lines=INGEST_LOG_LINES)
+
+# Limite por tenant compartilhado por todas as sessões: lotes em voo e tickets/minuto
+# (protege a cota de classificação do LLM quando vários analistas ingerem ao mesmo tempo)
+INGEST_MAX_IN_FLIGHT_PER_TENANT = 4
+INGEST_TICKETS_PER_MINUTE_PER_TENANT = 600
+
+@st.cache_resource
+def get_ingest_scheduler():
+    return IngestScheduler(INGEST_MAX_IN_FLIGHT_PER_TENANT, INGEST_TICKETS_PER_MINUTE_PER_TENANT)
+
+def resumo_limite(tenant):
+    limite = get_ingest_scheduler().status(tenant)
+    linha = (f"🚦 Limite do tenant: {limite['in_flight']}/{limite['limit']} lotes em voo "
+             f"(máx. {limite['max_in_flight']}) · {limite['tokens']} de {limite['tickets_per_minute']} tickets/min "
+             f"disponíveis · {limite['queued']} lote(s) na fila")
+    if limite['backoff_s'] > 0:
+        linha += f" · backoff {format_seconds(limite['backoff_s'])}"
+    return linha
+
+def invalidar_se_gravou(job):
+    # Chamado na thread do job ao terminar: novos tickets no grafo => nova versão dos dados
+    if job.stats['salvo_sucesso'] > 0:
+        invalidate_analytics_cache()
+
 # --- ESTADO DA SESSÃO ---
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    # Registros compactos; metadados do agente ficam comprimidos fora da lista
+    st.session_state.messages = MessageStore()
+if "chat_visible" not in st.session_state:
+    # Quantas mensagens do fim do histórico são desenhadas
+    st.session_state.chat_visible = DEFAULT_VISIBLE_MESSAGES
 if "conversation_id" not in st.session_state:
     st.session_state.conversation_id = str(uuid.uuid4())
-if "vision_description" not in st.session_state:
-    st.session_state.vision_description = None
+if "vision_jobs" not in st.session_state:
+    # "file_id:config" do anexo -> {"name", "digest", "future"} (análise rodando em segundo plano)
+    st.session_state.vision_jobs = {}
+if "vision_uploader_nonce" not in st.session_state:
+    # Trocar a key do uploader limpa os anexos depois que a mensagem é enviada
+    st.session_state.vision_uploader_nonce = 0
+if "history_server_conv" not in st.session_state:
+    # conversation_id cujo histórico o servidor confirmou guardar (metadata.history_mode == "server")
+    st.session_state.history_server_conv = None
+if "history_cursor" not in st.session_state:
+    # Quantas mensagens do histórico o servidor já confirmou (modo sincronizado, contagem absoluta)
+    st.session_state.history_cursor = 0
 
 # --- CABEÇALHO ---
 col1, col2 = st.columns([1, 6])
@@ -44,13 +233,26 @@ with col2:
     st.caption(f"Painel de Atendimento Inteligente | Tenant: {tenant_id}")
 
 # --- DEFINIÇÃO DAS ABAS ---
-tab_chat, tab_admin, tab_prompts, tab_taxonomy, tab_tickets = st.tabs([
+ABAS = [
     "💬 Chat de Suporte", 
     "⚙️ Ingestão de Dados", 
     "📝 Gestão de Prompts",
     "🗂️ Gestão de Taxonomias",
     "📊 Gestão de Tickets" # <--- NOVA ABA
-])
+]
+try:
+    # Abas com estado: trocar de aba reroda o app e só a aba aberta é desenhada (e carrega dados)
+    tab_chat, tab_admin, tab_prompts, tab_taxonomy, tab_tickets = st.tabs(ABAS, key="aba_ativa", on_change="rerun")
+except TypeError:
+    # Streamlit sem estado de abas: todas são desenhadas, como antes
+    tab_chat, tab_admin, tab_prompts, tab_taxonomy, tab_tickets = st.tabs(ABAS)
+
+
+def aba_aberta(tab):
+    # .open é None quando o Streamlit não informa a aba ativa
+    return getattr(tab, "open", None) is not False
+
+# Cada aba é um fragmento: interagir com um widget reroda só a aba dele, não as cinco
 
 # ---------------------------------------------------------
 # ABA 1: CHAT DE SUPORTE
@@ -58,14 +260,67 @@ tab_chat, tab_admin, tab_prompts, tab_taxonomy, tab_tickets = st.tabs([
 # ---------------------------------------------------------
 # ABA 1: CHAT DE SUPORTE (CORRIGIDO: BOTÃO + SISTEMA FIXO)
 # ---------------------------------------------------------
-with tab_chat:
+@st.fragment
+def aba_chat():
     # --- 1. BOTÃO DE LIMPEZA (RESTAURADO) ---
-    col_btn, _ = st.columns([2, 8])
+    col_btn, col_stream, col_cache, _ = st.columns([2, 2, 2, 4])
     with col_btn:
         if st.button("🗑️ Limpar Conversa / Reiniciar", type="secondary"):
-            st.session_state.messages = []
+            # Interrompe a resposta em andamento da conversa antiga (se houver)
+            get_chat_worker().cancel(st.session_state.conversation_id)
+            st.session_state.chat_error = None
+            st.session_state.messages = MessageStore()
+            st.session_state.chat_visible = DEFAULT_VISIBLE_MESSAGES
             st.session_state.conversation_id = str(uuid.uuid4())
+            st.session_state.history_cursor = 0
+            st.session_state.vision_jobs = {}
+            st.session_state.vision_uploader_nonce += 1
             st.rerun()
+    with col_stream:
+        streaming_mode = st.toggle("⚡ Resposta em streaming", value=True,
+                                   help="Exibe a resposta token a token, conforme o agente gera o texto.")
+    with col_cache:
+        answer_cache_on = st.toggle("♻️ Reaproveitar respostas", value=True,
+                                    help="Perguntas de primeiro turno (sem histórico e sem imagem) já respondidas "
+                                         "voltam do cache local, sem chamar o agente.")
+
+    with st.expander("⚙️ Opções de Histórico", expanded=False):
+        modos_historico = {
+            "Janela local (reenvia as últimas mensagens)": HISTORY_MODE_WINDOW,
+            "Sincronizado com o servidor (envia só a mensagem nova)": HISTORY_MODE_SERVER
+        }
+        modo_label = st.radio("Envio do histórico:", list(modos_historico.keys()))
+        history_mode = modos_historico[modo_label]
+        confirmado = st.session_state.history_server_conv == st.session_state.conversation_id
+        if history_mode == HISTORY_MODE_SERVER and not confirmado:
+            # Sem confirmação do servidor, mandar só o delta perderia o contexto anterior
+            st.caption("⏳ Aguardando o servidor confirmar que guarda a conversa; "
+                       "até lá o histórico vai pela janela local.")
+            history_mode = HISTORY_MODE_WINDOW
+        max_history_tokens = st.number_input(
+            "Orçamento máximo do histórico (tokens aprox.):",
+            min_value=200, max_value=32000, value=DEFAULT_MAX_HISTORY_TOKENS, step=200
+        )
+        # Padrão: só a mesma pergunta (normalizada); perguntas parecidas são opt-in
+        cache_parecidas = st.checkbox(
+            "Reaproveitar também perguntas parecidas", value=False, disabled=not answer_cache_on,
+            help="Pode devolver a resposta de outra pergunta (ex.: \"cancelar\" x \"calcular\"). "
+                 "Perguntas com códigos diferentes (S-1200 x S-1210) nunca casam."
+        )
+        similaridade_cache = st.slider(
+            "Similaridade mínima para perguntas parecidas:",
+            min_value=0.8, max_value=0.99, value=DEFAULT_FUZZY_SIMILARITY, step=0.01,
+            disabled=not (answer_cache_on and cache_parecidas)
+        )
+
+    with st.expander("🖼️ Opções de Imagem", expanded=False):
+        # Capturas grandes são reduzidas e recodificadas (sem metadados) antes da análise
+        enviar_original = st.checkbox("Enviar imagem original (sem redimensionar)", value=False)
+        max_dimension = st.number_input(
+            "Dimensão máxima (px):", min_value=512, max_value=4096, value=DEFAULT_MAX_DIMENSION, step=128,
+            disabled=enviar_original
+        )
+    image_preprocessor = None if enviar_original else ImagePreprocessor(max_dimension)
     
     st.divider()
 
@@ -83,23 +338,50 @@ with tab_chat:
             # Botão visual para toggle ou apenas um label
             st.markdown("📎")
         with img_col2:
-            img_file = st.file_uploader(
-                "Anexar evidência visual para esta mensagem", 
+            img_files = st.file_uploader(
+                "Anexar evidências visuais para esta mensagem", 
                 type=['png', 'jpg', 'jpeg'],
-                label_visibility="collapsed"
+                accept_multiple_files=True,
+                label_visibility="collapsed",
+                key=f"chat_images_{st.session_state.vision_uploader_nonce}"
             )
 
-    # Processamento imediato da imagem se houver upload
-    if img_file and (st.session_state.get("last_img_id") != img_file.name):
-        with st.spinner("🔍 Analisando imagem..."):
-            try:
-                from nasajon.service.vision_service import VisionService
-                vision = VisionService()
-                st.session_state.vision_description = vision.analyze_stream(img_file)
-                st.session_state.last_img_id = img_file.name
-                st.toast("Imagem analisada com sucesso!", icon="✅")
-            except Exception as e:
-                st.error(f"Erro ao processar imagem: {e}")
+    # Análise em segundo plano: cada anexo novo vira um job no pool (sem spinner bloqueando o input).
+    # O cache é pelo hash do conteúdo, então reenviar a mesma imagem não gera nova análise.
+    vision_jobs = st.session_state.vision_jobs
+    prep_key = image_preprocessor.key if image_preprocessor else "original"
+    anexos = {f"{f.file_id}:{prep_key}": f for f in img_files or []}
+    for job_key in [k for k in vision_jobs if k not in anexos]:
+        del vision_jobs[job_key]
+    for job_key, f in anexos.items():
+        if job_key not in vision_jobs:
+            digest, future = get_vision_analyzer().submit(f.name, f.getvalue(), image_preprocessor)
+            vision_jobs[job_key] = {"name": f.name, "digest": digest, "future": future}
+
+    for job in vision_jobs.values():
+        if not job["future"].done():
+            st.caption(f"⏳ {job['name']}: em análise (a mensagem aguarda o resultado ao ser enviada)")
+        elif job["future"].exception():
+            st.warning(f"Erro ao processar {job['name']}: {job['future'].exception()}")
+        else:
+            st.caption(f"✅ {job['name']}: analisada")
+
+    def coletar_contexto_visual():
+        jobs = list(st.session_state.vision_jobs.values())
+        pendentes = [j["future"] for j in jobs if not j["future"].done()]
+        if pendentes:
+            with st.spinner(f"🔍 Aguardando a análise de {len(pendentes)} imagem(ns)..."):
+                wait(pendentes)
+        descricoes = []
+        vistos = set()
+        for j in jobs:
+            if j["digest"] in vistos or j["future"].exception() or not j["future"].result():
+                continue
+            vistos.add(j["digest"])
+            descricoes.append((j["name"], j["future"].result()))
+        if len(descricoes) == 1:
+            return descricoes[0][1]
+        return "\n\n".join(f"[Imagem {i}: {name}] {desc}" for i, (name, desc) in enumerate(descricoes, 1))
 
     # --- 4. INPUT DE TEXTO (Seu código original continua aqui) ---
     prompt = st.chat_input("Olá! Em que posso ajudar?")
@@ -108,168 +390,172 @@ with tab_chat:
 
     # --- 5. RENDERIZAÇÃO DO HISTÓRICO ---
     with chat_container:
-        def get_avatar(role, metadata=None):
+        def get_avatar(role, agent=None):
             if role == "user": return "👤"
-            if metadata:
-                agent = metadata.get("agent", "")
+            if agent:
                 if "receptionist" in agent: return "💁‍♀️"
                 if "specialist" in agent: return "👷‍♂️"
                 if "ticket" in agent: return "🎫"
             return "🤖"
 
-        for message in st.session_state.messages:
-            avatar = get_avatar(message["role"], message.get("debug"))
-            with st.chat_message(message["role"], avatar=avatar):
-                st.markdown(message["content"])
-                if "debug" in message:
+        # Só as últimas N mensagens são desenhadas; as anteriores sob demanda
+        store = st.session_state.messages
+        ocultas = len(store) - st.session_state.chat_visible
+        if ocultas > 0:
+            if st.button(f"⬆️ Carregar mensagens anteriores ({ocultas} ocultas)", key="btn_chat_earlier"):
+                st.session_state.chat_visible += DEFAULT_VISIBLE_MESSAGES
+                st.rerun()
+        if store.offset:
+            st.caption(f"{store.offset} mensagens mais antigas foram descartadas desta sessão.")
+
+        for posicao, message in store.tail(st.session_state.chat_visible):
+            with st.chat_message(message.role, avatar=get_avatar(message.role, message.agent)):
+                st.markdown(message.content)
+                if message.has_debug:
                     with st.expander("ℹ️ Bastidores"):
-                        st.json(message["debug"])
+                        if message.cached:
+                            st.caption(f"♻️ Resposta do cache (similaridade {message.cached['similaridade']:.0%}, "
+                                       f"gerada há {message.cached['idade_min']} min)")
+                        st.caption(f"Agente: {message.agent or '-'}")
+                        # Metadados descomprimidos e desenhados só quando pedidos
+                        if st.checkbox("Mostrar metadados completos", key=f"bastidores_{posicao}"):
+                            st.json(store.metadata(message))
 
     # --- 6. PROCESSAMENTO DO PROMPT ---
+    # O POST roda no ChatWorker (segundo plano); a resposta é acompanhada pelo fragmento abaixo
+    chat_worker = get_chat_worker()
+    conversation_id = st.session_state.conversation_id
+
     if prompt:
-        with chat_container:
-            # 1. Recupera descrição da imagem se houver (Contexto Visual)
-            contexto_visual = st.session_state.get("vision_description")
-            
-            # 2. Exibe apenas a mensagem do usuário (Visualmente Limpo)
-            # Se houver imagem, mostramos um pequeno ícone indicativo
-            display_text = prompt
+        if chat_worker.get(conversation_id) is not None:
+            # Uma requisição por conversa: a mensagem nova não é enviada em paralelo
+            st.warning("⏳ Ainda aguardando a resposta anterior. Cancele-a para enviar outra pergunta.")
+        else:
+            st.session_state.chat_error = None
+            with chat_container:
+                # 1. Recupera descrição da imagem se houver (Contexto Visual)
+                contexto_visual = coletar_contexto_visual()
+
+                # 2. Exibe apenas a mensagem do usuário (Visualmente Limpo)
+                # Se houver imagem, mostramos um pequeno ícone indicativo
+                display_text = prompt
+                if contexto_visual:
+                    display_text = f"{MARCADOR_IMAGEM}{prompt}"
+
+                # Salva no histórico visual (apenas o texto original para não poluir)
+                st.session_state.messages.append({"role": "user", "content": display_text})
+
+            # 3. Prepara o Prompt Enriquecido para o Agente
+            prompt_final = prompt
             if contexto_visual:
-                display_text = f"📎 *[Imagem Anexada]*\n\n{prompt}"
-            
-            st.chat_message("user", avatar="👤").markdown(display_text)
-            
-            # Salva no histórico visual (apenas o texto original para não poluir)
-            st.session_state.messages.append({"role": "user", "content": display_text})
+                prompt_final = f" [EVIDÊNCIA VISUAL DA TELA]: {contexto_visual}\n\n[PERGUNTA]: {prompt}"
+
+            # 4. Prepara histórico (excluindo a mensagem atual que já vai no 'message')
+            def _payload_chat(mode):
+                return {
+                    "conversation_id": conversation_id,
+                    "message": prompt_final, # Enviamos o prompt com a descrição da imagem
+                    "context": {"sistema": sistema},
+                    **build_history_payload(
+                        st.session_state.messages, mode,
+                        cursor=st.session_state.history_cursor,
+                        offset=st.session_state.messages.offset,
+                        max_tokens=int(max_history_tokens)
+                    )
+                }
+
+            # Primeiro turno sem imagem: pode vir do cache (e a resposta do agente pode ir para ele)
+            cacheavel = answer_cache_on and len(st.session_state.messages) == 1 and not contexto_visual
+            cache_hit = None
+            if cacheavel:
+                cache_hit = get_answer_cache().get(
+                    sistema, prompt, similarity=similaridade_cache if cache_parecidas else None
+                )
+            st.session_state.answer_cache_prompt = prompt if cacheavel else None
+
+            if cache_hit:
+                cached, score = cache_hit
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": cached.text,
+                    "debug": cached.metadata,
+                    "agent": cached.metadata.get("agent"),
+                    "cached": {"similaridade": score, "idade_min": int((time.time() - cached.created_at) // 60)}
+                })
+                # Sem chamada ao servidor: o cursor fica, e o turno vai como delta na próxima pergunta
+                st.session_state.vision_jobs = {}
+                st.session_state.vision_uploader_nonce += 1
+                st.rerun()
+
+            # 5. Envia em segundo plano. Servidor sem estado da conversa (409/410): o worker
+            # reenvia com a janela local.
+            chat_worker.submit(
+                conversation_id,
+                _payload_chat(history_mode),
+                fallback_payload=_payload_chat(HISTORY_MODE_WINDOW) if history_mode == HISTORY_MODE_SERVER else None,
+                stream=streaming_mode
+            )
+
+            # Os anexos pertencem a esta mensagem: limpa para não repetir na próxima
+            st.session_state.vision_jobs = {}
+            st.session_state.vision_uploader_nonce += 1
+            st.rerun()
 
+    # --- 7. RESPOSTA EM ANDAMENTO ---
+    # Só este fragmento reroda enquanto o job não termina (o resto do app fica parado)
+    @st.fragment(run_every=CHAT_POLL_SECONDS)
+    def acompanhar_resposta():
+        job = chat_worker.get(conversation_id)
+        if job is None:
+            return
+        if not job.done():
             with st.chat_message("assistant", avatar="🤖"):
-                message_placeholder = st.empty()
-                message_placeholder.markdown("🧠 *Analisando solicitação...*")
-                
-                try:
-                    # 3. Prepara o Prompt Enriquecido para o Agente
-                    prompt_final = prompt
-                    if contexto_visual:
-                        prompt_final = f" [EVIDÊNCIA VISUAL DA TELA]: {contexto_visual}\n\n[PERGUNTA]: {prompt}"
-
-                    # 4. Prepara histórico (excluindo a mensagem atual que já vai no 'message')
-                    historico_para_enviar = []
-                    for msg in st.session_state.messages[:-1]:
-                        # Limpa marcadores visuais do histórico para não confundir o modelo
-                        content_clean = msg["content"].replace("📎 *[Imagem Anexada]*\n\n", "")
-                        msg_payload = {"role": msg["role"], "content": content_clean}
-                        if "agent" in msg: msg_payload["agent"] = msg["agent"]
-                        historico_para_enviar.append(msg_payload)
-
-                    payload = {
-                        "conversation_id": st.session_state.conversation_id,
-                        "message": prompt_final, # Enviamos o prompt com a descrição da imagem
-                        "history": historico_para_enviar,
-                        "context": {"sistema": sistema} 
-                    }
-                    
-                    headers = {
-                        "X-Tenant-ID": tenant_id,
-                        "Content-Type": "application/json"
-                    }
-                    
-                    # 5. Chama API
-                    response = requests.post(CHAT_URL, json=payload, headers=headers, timeout=60)
-                    
-                    if response.status_code == 200:
-                        # SUCESSO!
-                        
-                        # A. Limpa o buffer da imagem para não repetir na próxima
-                        st.session_state.vision_description = None
-                        st.session_state.last_img_id = None # Reseta ID para permitir re-upload se quiser
-                        
-                        data = response.json()
-                        bot_response = data.get("response") or data.get("answer") or "⚠️ Resposta vazia."
-                        metadata = data.get("metadata", {})
-                        
-                        message_placeholder.markdown(bot_response)
-                        
-                        st.session_state.messages.append({
-                            "role": "assistant", 
-                            "content": bot_response, 
-                            "debug": metadata,
-                            "agent": metadata.get("agent")
-                        })
-                        st.rerun()
-                    else:
-                        message_placeholder.error(f"❌ Erro {response.status_code}: {response.text}")
-                
-                except requests.exceptions.ConnectionError:
-                    message_placeholder.error(f"🔌 Não foi possível conectar em: {CHAT_URL}")
-                except Exception as e:
-                    message_placeholder.error(f"🔌 Erro inesperado: {str(e)}")
+                parcial = job.partial_text
+                st.markdown(f"{parcial} ▌" if parcial else "🧠 *Analisando solicitação...*")
+                st.button("⏹️ Cancelar resposta", key="btn_cancel_chat",
+                          on_click=chat_worker.cancel, args=(conversation_id,))
+            return
+
+        chat_worker.pop(conversation_id)
+        if job.status == JOB_DONE:
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": job.text,
+                "debug": job.metadata,
+                "agent": job.metadata.get("agent")
+            })
+            # O servidor agora conhece todas as mensagens até aqui
+            st.session_state.history_cursor = st.session_state.messages.offset + len(st.session_state.messages)
+            # Modo sincronizado só vale se o servidor confirmou (nesta conversa) que guarda o estado
+            st.session_state.history_server_conv = conversation_id if server_keeps_history(job.metadata) else None
+            # Só respostas de agentes de consulta: o cache é do processo e não pode repetir uma ação
+            if (st.session_state.get("answer_cache_prompt") and job.text != EMPTY_RESPONSE
+                    and is_cacheable(job.metadata)):
+                get_answer_cache().put(sistema, st.session_state.answer_cache_prompt, job.text, job.metadata)
+            st.session_state.answer_cache_prompt = None
+        elif job.status == JOB_ERROR:
+            st.session_state.chat_error = job.error
+        st.rerun()
+
+    with chat_container:
+        if chat_worker.get(conversation_id) is not None:
+            acompanhar_resposta()
+        elif st.session_state.get("chat_error"):
+            st.error(st.session_state.chat_error)
+
+with tab_chat:
+    if aba_aberta(tab_chat):
+        aba_chat()
 # ABA 2: INGESTÃO E VISUALIZAÇÃO (VERSÃO FINAL)
 # ---------------------------------------------------------
 # ---------------------------------------------------------
 # ABA 2: INGESTÃO E VISUALIZAÇÃO (VERSÃO FINAL + TEMPLATE)
 # ---------------------------------------------------------
-with tab_admin:
+@st.fragment
+def aba_ingestao():
     st.header("🚀 Ingestão de Tickets")
 
     # --- 1. TEMPLATE VISUAL PARA O USUÁRIO ---
-    # Define o modelo anonimizado
-    TEMPLATE_JSON = [
-      {
-        "ticket": {
-          "ticket_id": "uuid-gerado-automaticamente",
-          "numeroprotocolo": 12345678,
-          "sistema": "Persona SQL",
-          "versao_sistema": "2.0.0",
-          "tipo": "Dúvida",
-          "situacao": 3,
-          "prioridade": "Normal",
-          "ocorrencias": "S2EDU006 - DÚVIDA SOBRE CÁLCULO",
-          "canal_abertura": "portal",
-          "resumo_admin": "Erro no cálculo de férias",
-          "ultima_resposta_resumo": "Verificamos que a rubrica estava incorreta...",
-          "atendimentosituacao": "uuid-situacao"
-        },
-        "datas": {
-          "datacriacao": "2025-01-27 10:00:00+00",
-          "data_ultima_resposta": "2025-01-27 12:00:00+00",
-          "data_ultima_resposta_admin": "2025-01-27 11:30:00+00",
-          "dataconclusao": "2025-01-27 14:00:00+00"
-        },
-        "cliente": {
-          "id_cliente": "uuid-cliente",
-          "codigo_cliente": "99999",
-          "nome_cliente": "EMPRESA EXEMPLO LTDA",
-          "nome_fantasia_cliente": "EMPRESA EXEMPLO",
-          "cnpj_cliente": 12345678000199,
-          "email_contato": "contato@empresa.com.br",
-          "nome_contato": "FULANO DE TAL",
-          "telefone_contato": "11-99999-9999"
-        },
-        "suporte": {
-          "nome_equipe": "Suporte Persona",
-          "responsavel_web": "analista@nasajon.com.br"
-        },
-        "conversa": [
-          {
-            "timestamp": "2025-01-27 10:00:00+00",
-            "role": "analista",
-            "author_name": "Analista Nasajon",
-            "canal": "manual",
-            "text": "Olá, qual seria sua dúvida?",
-            "imagens": []
-          },
-          {
-            "timestamp": "2025-01-27 10:05:00+00",
-            "role": "cliente",
-            "author_name": "Fulano de Tal",
-            "canal": "portal",
-            "text": "O cálculo do evento S-1200 está retornando erro de rubrica.",
-            "imagens": ["https://exemplo.com/print_erro.png"]
-          }
-        ]
-      }
-    ]
-
     with st.expander("ℹ️ Ver Modelo de JSON Esperado (Template)", expanded=False):
         st.markdown("O sistema espera uma **Lista de Objetos** com a seguinte estrutura:")
         st.json(TEMPLATE_JSON)
@@ -284,15 +570,32 @@ with tab_admin:
         horizontal=True
     )
 
-    raw_data = []
+    # Fonte lazy: os tickets são lidos do arquivo sob demanda (preview, contagem e envio),
+    # nunca guardados como lista entre reruns
+    ticket_source = None
+    total_disponivel = 0
+    fonte_key = None  # identifica o conteúdo carregado (cache do pré-filtro)
+
+    # Contagens já feitas nesta sessão (evita reler o arquivo a cada rerun)
+    if "ticket_counts" not in st.session_state:
+        st.session_state.ticket_counts = {}
 
     # --- LÓGICA DE CARREGAMENTO ---
     if tipo_entrada == "📂 Upload de Arquivo JSON":
-        uploaded_file = st.file_uploader("Selecione o arquivo tickets.json", type=['json'])
+        uploaded_file = st.file_uploader(
+            "Selecione o arquivo tickets.json (ou .ndjson / .jsonl)",
+            type=['json', 'ndjson', 'jsonl']
+        )
         if uploaded_file:
             try:
-                raw_data = json.load(uploaded_file)
+                ticket_source = TicketSource.from_uploaded_file(uploaded_file)
+                # file_id muda a cada upload: arquivos diferentes com mesmo nome e tamanho não colidem
+                fonte_key = uploaded_file.file_id
+                if fonte_key not in st.session_state.ticket_counts:
+                    st.session_state.ticket_counts[fonte_key] = ticket_source.count()
+                total_disponivel = st.session_state.ticket_counts[fonte_key]
             except Exception as e:
+                ticket_source = None
                 st.error(f"Erro ao ler arquivo: {e}")
 
     else: # Colar Manualmente
@@ -303,17 +606,19 @@ with tab_admin:
         )
         if json_text:
             try:
-                loaded = json.loads(json_text)
-                # Garante que seja lista mesmo se colar um único objeto
-                raw_data = [loaded] if isinstance(loaded, dict) else loaded
+                # Aceita lista, objeto único ou um objeto por linha
+                ticket_source = TicketSource.from_text(json_text)
+                total_disponivel = ticket_source.count()
+                fonte_key = f"texto:{hash(json_text)}"
             except json.JSONDecodeError:
+                ticket_source = None
                 st.warning("Aguardando JSON válido...")
             except Exception as e:
+                ticket_source = None
                 st.error(f"Erro: {e}")
 
     # --- 3. PROCESSAMENTO (SE HOUVER DADOS) ---
-    if raw_data:
-        total_disponivel = len(raw_data)
+    if ticket_source and total_disponivel:
         st.success(f"📂 {total_disponivel} tickets carregados prontos para análise.")
 
         # --- PRÉ-VISUALIZAÇÃO RICA ---
@@ -340,7 +645,7 @@ with tab_admin:
                             if m.get('imagens'):
                                 st.image(m['imagens'][0], width=150, caption="Imagem Anexada")
 
-            for item in raw_data[:3]:
+            for item in ticket_source.preview(3):
                 _render_preview(item)
                 st.divider()
 
@@ -366,108 +671,314 @@ with tab_admin:
                 help="⚠️ Se marcado, apaga TODO o banco antes de iniciar."
             )
 
+        col_chunk, col_workers = st.columns(2)
+        with col_chunk:
+            chunk_size = st.number_input(
+                "Tickets por lote (chunk):",
+                min_value=1, max_value=500, value=DEFAULT_CHUNK_SIZE, step=10,
+                help="Cada lote é enviado em uma requisição separada; falhas só perdem o lote atual."
+            )
+        with col_workers:
+            max_workers = st.number_input(
+                "Lotes em paralelo:",
+                min_value=1, max_value=8, value=DEFAULT_MAX_WORKERS, step=1
+            )
+
+        col_dedupe, col_dedupe_info = st.columns(2)
+        with col_dedupe:
+            modos_dedupe = {
+                "Pular tickets já enviados": "drop",
+                "Apenas sinalizar (envia mesmo assim)": "flag",
+                "Desligado": "off"
+            }
+            dedupe_label = st.selectbox(
+                "Dedupe local (antes do upload):", list(modos_dedupe.keys()),
+                help="Compara ID + conteúdo da conversa com o índice local de tickets já aceitos pelo servidor."
+            )
+            dedupe_mode = modos_dedupe[dedupe_label]
+        with col_dedupe_info:
+            dedupe_index = get_dedupe_index()
+            st.caption(f"🗃️ Índice local: {dedupe_index.size(tenant_id)} tickets já aceitos neste tenant.")
+            if st.button("Limpar índice local"):
+                dedupe_index.clear(tenant_id)
+                st.rerun()
+
+        # --- PRÉ-FILTRO LOCAL ---
+        # Regras baratas antes do upload: o DataFrame do lote é montado uma vez por conteúdo/quantidade
+        # e mudar as regras só reaplica as máscaras vetorizadas (projeção instantânea do funil)
+        prefiltro = None
+        if st.checkbox("🧹 Pré-filtro local (descartar tickets fora de escopo antes do upload)", value=False):
+            chave = (fonte_key, int(quantidade))
+            cache_pf = st.session_state.get("prefilter_frame")
+            if cache_pf is None or cache_pf[0] != chave:
+                inicio = time.perf_counter()
+                frame_pf = tickets_frame(ticket_source.head(int(quantidade)))
+                cache_pf = st.session_state.prefilter_frame = (chave, frame_pf, time.perf_counter() - inicio)
+            _, frame_pf, segundos_frame = cache_pf
+
+            contagem_sistemas = frame_pf["sistema"].value_counts()
+            col_pf_sis, col_pf_heur = st.columns(2)
+            with col_pf_sis:
+                sistemas_aceitos = st.multiselect(
+                    "Sistemas aceitos:", list(contagem_sistemas.index), default=list(contagem_sistemas.index),
+                    format_func=lambda s: f"{s or '(sem sistema)'} ({contagem_sistemas[s]})"
+                )
+                min_chars = st.number_input(
+                    "Mínimo de caracteres de conteúdo:", min_value=0, max_value=5000,
+                    value=DEFAULT_MIN_CHARS, step=10,
+                    help="Soma do texto da conversa sem contar mensagens só de cumprimento."
+                )
+            with col_pf_heur:
+                exigir_conversa = st.checkbox("Descartar conversa vazia", value=True)
+                descartar_cumprimentos = st.checkbox("Descartar conversa só com cumprimentos", value=True)
+                exigir_analista = st.checkbox("Descartar sem resposta do analista", value=True)
+
+            inicio = time.perf_counter()
+            resultado_pf = apply_rules(frame_pf, PrefilterRules(
+                sistemas=sistemas_aceitos, require_conversa=exigir_conversa,
+                require_analyst_reply=exigir_analista, drop_greetings_only=descartar_cumprimentos,
+                min_chars=min_chars
+            ))
+            funil_pf, motivos_pf = projected_funnel(resultado_pf)
+            segundos_regras = time.perf_counter() - inicio
+
+            pf1, pf2, pf3, pf4 = st.columns(4)
+            pf1.metric("Carregados", funil_pf['total_recebido'])
+            pf2.metric("Filtro Sistema (projeção)", funil_pf['filtrado_sistema'])
+            pf3.metric("IA rejeitaria (projeção)", funil_pf['classificado_inutil'])
+            pf4.metric("Seguem para o upload", funil_pf['aprovados'])
+            with st.expander("Detalhe por regra", expanded=False):
+                st.dataframe(pd.DataFrame(motivos_pf), hide_index=True, use_container_width=True)
+            st.caption(f"⚡ Lote analisado em {format_seconds(segundos_frame)} · "
+                       f"regras aplicadas em {format_seconds(segundos_regras)}")
+            prefiltro = (resultado_pf["aprovado"].to_numpy().copy(), funil_pf)
+
+        # Checkpoint por tenant (SQLite, no registro de jobs): lotes já concluídos são pulados
+        jobs_registry = get_ingest_jobs()
+        lotes_concluidos = jobs_registry.checkpoint_size(tenant_id)
+
+        if lotes_concluidos:
+            col_ckp, col_ckp_btn = st.columns([3, 1])
+            col_ckp.info(f"♻️ {lotes_concluidos} lotes já concluídos neste tenant serão pulados (retomada).")
+            if col_ckp_btn.button("Recomeçar do zero", use_container_width=True):
+                jobs_registry.clear_checkpoint(tenant_id)
+                st.rerun()
+            if clean_start:
+                # A retomada vence o Reset Full (apagar o banco perderia os lotes já gravados)
+                st.warning("⚠️ Com uma retomada pendente o Reset Full será ignorado. "
+                           "Clique em **Recomeçar do zero** para apagar o banco e reenviar tudo.")
+
+        st.caption(resumo_limite(tenant_id))
+
         # --- BOTÃO DE AÇÃO ---
         if st.button("🔥 Iniciar Pipeline IA", type="primary"):
-            data_to_send = raw_data[:int(quantidade)]
-            
-            status_container = st.status("🚀 Inicializando conexão...", expanded=True)
-            progress_bar = status_container.progress(0)
-            current_action = status_container.empty()
-            
-            try:
-                INGEST_URL = "https://api.nasajon.app/nsj-ia-suporte/ingest-pipeline"
-                
-                payload_ingesta = {
-                    "tickets": data_to_send,
-                    "clear_db": clean_start
-                }
-                
-                headers = {"Content-Type": "application/json", "X-Tenant-ID": tenant_id}
-                
-                response = requests.post(
-                    INGEST_URL, 
-                    json=payload_ingesta,
-                    headers=headers,
-                    timeout=900,
-                    stream=True 
+            # O job lê de uma cópia do conteúdo: continua rodando mesmo se esta sessão acabar
+            fonte = ticket_source.detach()
+            data_to_send = fonte.head(int(quantidade))
+            total_envio = int(quantidade)
+            rotulo_job = f"{fonte.name} · {total_envio} tickets"
+
+            if prefiltro is not None:
+                # Só os aprovados no pré-filtro seguem (mesma ordem do arquivo)
+                aprovados, funil_pf = prefiltro
+                data_to_send = (item for item, ok in zip(data_to_send, aprovados) if ok)
+                total_envio = int(aprovados.sum())
+                rotulo_job = f"{fonte.name} · {total_envio} de {int(quantidade)} tickets (pré-filtro)"
+
+            if total_envio == 0:
+                st.warning("Nenhum ticket passou no pré-filtro local: nada foi enviado.")
+            else:
+                # Dedupe local no meio do stream: tickets conhecidos nem chegam a ser serializados.
+                # Com Reset Full o banco vai ser apagado: tudo precisa ser reenviado, sem filtro.
+                dedupe_counter = DedupeCounter()
+                if dedupe_mode != "off" and not clean_start:
+                    data_to_send = dedupe_index.filter_new(
+                        tenant_id, data_to_send, counter=dedupe_counter, drop=(dedupe_mode == "drop")
+                    )
+
+                def _registrar_aceitos(chunk, chunk_stats):
+                    # Chunk sem erro técnico: todos os tickets foram gravados, já existiam ou foram avaliados
+                    if dedupe_mode != "off" and not chunk_stats.get("erro_processamento"):
+                        dedupe_index.mark_accepted(tenant_id, chunk)
+
+                def _limpar_indice():
+                    # Banco apagado pelo Reset Full: os tickets aceitos antes não existem mais no servidor
+                    dedupe_index.clear(tenant_id)
+
+                def _montar_runner(done_ids):
+                    return ChunkedIngestion(
+                        api, INGEST_PATH,
+                        chunks=iter_chunks(data_to_send, int(chunk_size)),
+                        total_tickets=total_envio,
+                        clear_db=clean_start,
+                        max_workers=int(max_workers),
+                        done_ids=done_ids,
+                        on_chunk_done=_registrar_aceitos,
+                        scheduler=get_ingest_scheduler(),
+                        tenant_id=tenant_id,
+                        on_db_cleared=_limpar_indice,
+                        dedupe_counter=dedupe_counter
+                    )
+
+                job = jobs_registry.submit(
+                    tenant_id, rotulo_job, total_envio, _montar_runner,
+                    options={
+                        "chunk_size": int(chunk_size), "max_workers": int(max_workers),
+                        "clear_db": clean_start, "dedupe_mode": dedupe_mode,
+                        "prefiltro": prefiltro[1] if prefiltro is not None else None
+                    },
+                    dedupe_counter=dedupe_counter,
+                    on_finish=invalidar_se_gravou
                 )
-                
-                final_stats = None
-                
-                if response.status_code == 200:
-                    for line in response.iter_lines():
-                        if line:
-                            try:
-                                event = json.loads(line.decode('utf-8'))
-                                step = event.get('step')
-                                msg = event.get('msg', '')
-                                
-                                if step == 'init':
-                                    status_container.write(f"ℹ️ {msg}")
-                                elif step == 'progress':
-                                    curr = event.get('current', 0)
-                                    total = event.get('total', 1)
-                                    progress_bar.progress(curr / total)
-                                    current_action.markdown(f"**{msg}**")
-                                elif step == 'log':
-                                # Se a mensagem já vier formatada como bloco de código (nosso JSON de debug), 
-                                # não colocamos crases extras.
-                                    if "```" in msg:
-                                        status_container.markdown(msg) # Renderiza o bloco de código JSON bonito
-                                    else:
-                                        status_container.markdown(f"`{msg}`") # Mensagens normais ficam inline
-                                elif step == 'error':
-                                    status_container.error(msg)
-                                elif step == 'final':
-                                    final_stats = event
-                            except:
-                                continue
-
-                    status_container.update(label="✅ Processamento Concluído!", state="complete", expanded=False)
-                    
-                    # --- DASHBOARD DETALHADO (FUNIL) ---
-                    if final_stats and 'stats' in final_stats:
-                        st.divider()
-                        st.markdown("### 📊 Relatório de Ingestão")
-                        
-                        s = final_stats['stats'] 
-                        
-                        col1, col2, col3, col4 = st.columns(4)
-                        with col1:
-                            st.metric("1. Total Recebido", s['total_recebido'])
-                        with col2:
-                            st.metric("2. Já Existiam", s['ja_existia'], 
-                                     delta=f"{s['ja_existia']} ignorados", delta_color="off")
-                        with col3:
-                            st.metric("3. Classificados Úteis", s['classificado_util'], 
-                                     delta=f"{s['classificado_util']} aprovados")
-                        with col4:
-                            st.metric("4. Gravados no Neo4j", s['salvo_sucesso'], 
-                                     delta=f"+{s['salvo_sucesso']}", delta_color="normal")
-                        
-                        st.caption("Detalhes dos tickets descartados ou com erro:")
-                        d1, d2, d3 = st.columns(3)
-                        d1.metric("Filtro Sistema", s['filtrado_sistema'])
-                        d2.metric("IA Rejeitou", s['classificado_inutil'])
-                        d3.metric("Erros Técnicos", s['erro_processamento'])
-
-                        if s['salvo_sucesso'] > 0:
-                            st.balloons()
-                        elif s['erro_processamento'] > 0:
-                            st.error("Houve erros técnicos durante a gravação.")
-                        elif s['ja_existia'] == s['total_recebido']:
-                            st.warning("Nenhum dado novo: Todos os tickets já existiam no banco.")
-                        elif s['classificado_inutil'] > 0:
-                            st.warning("Os tickets foram processados, mas a IA considerou todos inúteis/incompletos.")
-                
-                else:
-                    status_container.update(label="❌ Erro na API", state="error")
-                    st.error(f"HTTP {response.status_code}: {response.text}")
-                    
-            except Exception as e:
-                status_container.update(label="🔌 Erro de Conexão", state="error")
-                st.error(f"Detalhes: {str(e)}")
+                st.session_state.ingest_job_id = job.id
+
+    # --- 4. EXECUÇÕES (JOBS EM SEGUNDO PLANO) ---
+    # Os jobs são do processo, não da sessão: ao recarregar a página o painel volta a acompanhar
+    # o job em andamento mais recente do tenant
+    def mostrar_job(snap, celebrar=False):
+        icone, texto, estado = STATUS_JOB[snap["status"]]
+        ativo = snap["status"] in ACTIVE_STATUSES
+        if snap["status"] == JOB_PARTIAL:
+            texto = f"Concluído com {snap['failed_chunks']} lote(s) com falha. Envie o lote de novo para retomar."
+
+        with st.status(f"{icone} {texto} · {snap['label']}", state=estado, expanded=ativo):
+            if snap["progress"]:
+                lote_p, curr, total, msg_p = snap["progress"]
+                st.progress(min(curr / max(total, 1), 1.0))
+                st.markdown(f"**{lote_p} {msg_p}**")
+            elif snap["status"] == JOB_QUEUED:
+                posicao = get_ingest_jobs().queue_position(snap["id"])
+                st.caption(f"Aguardando um worker livre (posição {posicao} na fila de jobs)..." if posicao
+                           else "Aguardando um worker livre...")
+            if snap["summary"]:
+                st.caption(snap["summary"])
+            if ativo and snap["waiting"]:
+                posicao, motivo = snap["waiting"][0]
+                st.info(f"⏳ {len(snap['waiting'])} lote(s) aguardando · próximo na posição {posicao} "
+                        f"da fila do tenant ({motivo})")
+            if ativo:
+                st.caption(resumo_limite(snap["tenant_id"]))
+            for erro in snap["errors"][-INGEST_ERRORS_SHOWN:]:
+                st.error(erro)
+            if snap["log"]:
+                st.code("\n".join(snap["log"]), language=None)
+            if snap["error"]:
+                st.error(f"Detalhes: {snap['error']}")
+
+        for aviso in snap["notices"]:
+            st.warning(aviso)
+        funil_pf = snap["options"].get("prefiltro")
+        if funil_pf:
+            st.caption(f"🧹 Pré-filtro local: {funil_pf['total_recebido'] - funil_pf['aprovados']} de "
+                       f"{funil_pf['total_recebido']} tickets descartados antes do upload "
+                       f"(sistema: {funil_pf['filtrado_sistema']}, conteúdo: {funil_pf['classificado_inutil']}).")
+        if ativo:
+            return
+
+        if snap["throttles"]:
+            st.caption(f"🚦 O servidor pediu para desacelerar {snap['throttles']} vez(es) (429/503); "
+                       "os lotes foram reenviados após o backoff.")
+        if snap["parse_errors"]:
+            st.warning(f"⚠️ {snap['parse_errors']} linha(s) do stream do servidor não eram JSON válido e foram ignoradas.")
+
+        # --- DASHBOARD DETALHADO (FUNIL) ---
+        # Stats do funil = soma dos lotes do job, inclusive os concluídos em execuções anteriores
+        s = snap["stats"]
+        if snap["chunks"]:
+            st.divider()
+            st.markdown("### 📊 Relatório de Ingestão")
+
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("1. Total Recebido", s['total_recebido'])
+            with col2:
+                st.metric("2. Já Existiam", s['ja_existia'], 
+                         delta=f"{s['ja_existia']} ignorados", delta_color="off")
+            with col3:
+                st.metric("3. Classificados Úteis", s['classificado_util'], 
+                         delta=f"{s['classificado_util']} aprovados")
+            with col4:
+                st.metric("4. Gravados no Neo4j", s['salvo_sucesso'], 
+                         delta=f"+{s['salvo_sucesso']}", delta_color="normal")
+
+            st.caption("Detalhes dos tickets descartados ou com erro:")
+            d1, d2, d3 = st.columns(3)
+            d1.metric("Filtro Sistema", s['filtrado_sistema'])
+            d2.metric("IA Rejeitou", s['classificado_inutil'])
+            d3.metric("Erros Técnicos", s['erro_processamento'])
+
+            if s['salvo_sucesso'] > 0:
+                if celebrar:
+                    st.balloons()
+            elif s['erro_processamento'] > 0:
+                st.error("Houve erros técnicos durante a gravação.")
+            elif s['ja_existia'] == s['total_recebido']:
+                st.warning("Nenhum dado novo: Todos os tickets já existiam no banco.")
+            elif s['classificado_inutil'] > 0:
+                st.warning("Os tickets foram processados, mas a IA considerou todos inúteis/incompletos.")
+
+    # Só este fragmento reroda enquanto o job não termina (UI limitada a INGEST_REPAINTS_PER_SECOND)
+    @st.fragment(run_every=1.0 / INGEST_REPAINTS_PER_SECOND)
+    def acompanhar_job(job_id):
+        job = get_ingest_jobs().get(job_id)
+        if job is None:
+            return
+        mostrar_job(job.snapshot())
+        if not job.active:
+            # Terminou enquanto a página estava aberta: redesenha a aba com o relatório final
+            st.session_state.ingest_job_celebrar = job_id
+            st.rerun()
+
+    jobs = get_ingest_jobs().jobs(tenant_id)
+    if jobs:
+        st.markdown("---")
+        st.markdown("### 📋 Execuções de Ingestão")
+        snaps = {j.id: j.snapshot() for j in jobs}
+        st.dataframe(pd.DataFrame([{
+            "Job": snap["id"],
+            "Início": time.strftime("%d/%m %H:%M:%S", time.localtime(snap["created_at"])),
+            "Lote": snap["label"],
+            "Status": " ".join(STATUS_JOB[snap["status"]][:2]),
+            "Progresso": f"{snap['progress'][1] if snap['progress'] else 0}/{snap['total_tickets']}",
+            "Gravados": snap["stats"]["salvo_sucesso"],
+        } for snap in snaps.values()]), hide_index=True, use_container_width=True)
+
+        ids = list(snaps)
+        acompanhado = st.session_state.get("ingest_job_id")
+        if acompanhado not in snaps:
+            acompanhado = next((j.id for j in jobs if j.active), ids[0])
+        acompanhado = st.selectbox(
+            "Acompanhar execução:", ids, index=ids.index(acompanhado),
+            format_func=lambda i: f"{STATUS_JOB[snaps[i]['status']][0]} {i} · {snaps[i]['label']}"
+        )
+        st.session_state.ingest_job_id = acompanhado
 
+        if snaps[acompanhado]["status"] in ACTIVE_STATUSES:
+            acompanhar_job(acompanhado)
+        else:
+            mostrar_job(snaps[acompanhado], celebrar=st.session_state.pop("ingest_job_celebrar", None) == acompanhado)
+
+            # --- DESEMPENHO DA EXECUÇÃO ---
+            relatorio = snaps[acompanhado]["report"]
+            if relatorio:
+                with st.expander(f"⏱️ Desempenho da execução ({relatorio['inicio']})", expanded=False):
+                    p1, p2, p3, p4 = st.columns(4)
+                    p1.metric("Tickets/s", f"{relatorio['tickets_por_segundo']:.2f}")
+                    p2.metric("Duração", format_seconds(relatorio['duracao_s']))
+                    p3.metric("p50 por ticket", format_seconds(relatorio['latencia_ticket_s']['p50']))
+                    p4.metric("p95 por ticket", format_seconds(relatorio['latencia_ticket_s']['p95']))
+                    if relatorio['etapas']:
+                        st.caption("Tempo por etapa (somado entre lotes em paralelo):")
+                        st.dataframe(pd.DataFrame(relatorio['etapas']), hide_index=True, use_container_width=True)
+                    else:
+                        st.caption("O servidor não informou etapas nesta execução.")
+                    st.download_button(
+                        "📄 Baixar relatórios das execuções (JSON)",
+                        data=json.dumps([{"job": snap["id"], "lote": snap["label"], **snap["report"]}
+                                         for snap in snaps.values() if snap["report"]],
+                                        ensure_ascii=False, indent=2),
+                        file_name="relatorio_ingestao.json", mime="application/json"
+                    )
             #-----------------------
             # --- MOVA PARA CÁ: FORA DE QUALQUER IF DE DADOS ---
     st.markdown("---")
@@ -487,14 +998,12 @@ with tab_admin:
         if col_del_btn.button("Deletar Ticket", type="secondary", use_container_width=True):
             if ticket_id_to_delete:
                 try:
-                    CYPHER_DEL_URL = "https://api.nasajon.app/nsj-ia-suporte/debug/cypher"
                     query_del = f"""
                     MATCH (t:Ticket {{id: '{ticket_id_to_delete}'}})
                     OPTIONAL MATCH (t)-[:APRESENTA_SINTOMA|POSSUI_CAUSA|APLICOU_SOLUCAO]->(det)
                     DETACH DELETE t, det
                     """
-                    headers = {"Content-Type": "application/json", "X-Tenant-ID": tenant_id}
-                    res_del = requests.post(CYPHER_DEL_URL, json={"query": query_del}, headers=headers)
+                    res_del = api.post(CYPHER_PATH, json={"query": query_del})
                     
                     if res_del.status_code == 200:
                         st.success(f"✅ Ticket `{ticket_id_to_delete}` removido.")
@@ -511,10 +1020,8 @@ with tab_admin:
         st.subheader("IDs Recentes no Banco")
         if st.button("🔍 Listar últimos 10 tickets"):
             try:
-                CYPHER_LIST_URL = "https://api.nasajon.app/nsj-ia-suporte/debug/cypher"
                 query_list = "MATCH (t:Ticket) RETURN t.id as id, t.titulo as titulo ORDER BY t.ingested_at DESC LIMIT 10"
-                headers = {"Content-Type": "application/json", "X-Tenant-ID": tenant_id}
-                res_list = requests.post(CYPHER_LIST_URL, json={"query": query_list}, headers=headers)
+                res_list = api.post(CYPHER_PATH, json={"query": query_list})
                 
                 if res_list.status_code == 200:
                     data = res_list.json()
@@ -526,15 +1033,18 @@ with tab_admin:
                 st.error(f"Erro ao listar: {e}")
             #-----------------------
 
+with tab_admin:
+    if aba_aberta(tab_admin):
+        aba_ingestao()
+
 # ---------------------------------------------------------
 # ABA 3: GESTÃO DE PROMPTS (VIA API)
 # ---------------------------------------------------------
-with tab_prompts:
+@st.fragment
+def aba_prompts():
     st.header("📝 Editor de Prompts do Sistema")
     st.info("Gerencie os System Prompts, Agentes e Tools armazenados no banco.")
 
-    API_URL = PROMPTS_URL
-    
     # Mapeamento do Sistema
     # Mapeamento do Sistema
     prompts_map = {
@@ -556,7 +1066,7 @@ with tab_prompts:
     # --- 1. CARREGAR ---
     if st.button("🔄 Carregar Dados", key="btn_load"):
         try:
-            resp = requests.get(API_URL, params={"key": selected_key}, headers={"X-Tenant-ID": tenant_id})
+            resp = api.get(PROMPTS_PATH, params={"key": selected_key})
             if resp.status_code == 200:
                 st.session_state['prompt_data'] = resp.json()
                 st.success("Carregado!")
@@ -608,24 +1118,28 @@ with tab_prompts:
                 "source_file": source_val
             }
             try:
-                resp = requests.post(API_URL, json=payload, headers={"X-Tenant-ID": tenant_id})
+                resp = api.post(PROMPTS_PATH, json=payload)
                 if resp.status_code == 200:
+                    # Respostas guardadas foram geradas com o prompt antigo
+                    get_answer_cache().clear()
                     st.success("✅ Salvo com sucesso!")
                 else:
                     st.error(f"Erro: {resp.text}")
             except Exception as e:
                 st.error(f"Erro de conexão: {e}")
 
+with tab_prompts:
+    if aba_aberta(tab_prompts):
+        aba_prompts()
+
 # ---------------------------------------------------------
 # ABA 4: GESTÃO DE TAXONOMIAS
 # ---------------------------------------------------------
-with tab_taxonomy:
+@st.fragment
+def aba_taxonomias():
     st.header("🗂️ Gestão de Categorias e Recursos")
     st.info("Defina a estrutura de conhecimento. Use 'Recursos' para hierarquia (Sistema > Módulo > Funcionalidade).")
 
-    # URL Específica desta aba
-    TAXONOMY_URL = f"{BASE_URL}/taxonomies/nodes"
-
     tipos_taxonomia = {
         "Recursos (Sistemas/Módulos)": "recurso",
         "Sintomas": "sintoma",
@@ -638,33 +1152,108 @@ with tab_taxonomy:
     selected_label = st.selectbox("Selecione a Taxonomia:", list(tipos_taxonomia.keys()))
     selected_type = tipos_taxonomia[selected_label]
 
-    # --- HELPER DE BUSCA ---
-    def fetch_nodes(t_type):
+    # --- ÁRVORE EM CACHE (POR TIPO) ---
+    # Montada uma vez por carga (índice pai -> filhos) e atualizada localmente após
+    # criar/editar/deletar. A revalidação com o servidor é um GET condicional periódico.
+    TAXONOMY_REVALIDATE_SECONDS = 30
+
+    if "taxonomy_trees" not in st.session_state:
+        st.session_state.taxonomy_trees = {}
+    if "taxonomy_index" not in st.session_state:
+        # Índice de busca aproximada por tipo (aviso de itens parecidos na criação)
+        st.session_state.taxonomy_index = {}
+
+    def get_taxonomy_tree(t_type, force=False):
+        entry = st.session_state.taxonomy_trees.get(t_type)
+        if entry and not force and time.time() - entry["checked_at"] < TAXONOMY_REVALIDATE_SECONDS:
+            return entry["tree"]
+        try:
+            resp = api.get_json(TAXONOMY_PATH, params={"type": t_type})
+        except Exception:
+            resp = None
+        if resp is None or not resp.ok:
+            return entry["tree"] if entry else TaxonomyTree([])
+        if entry and resp.version == entry["version"]:
+            # 304 / conteúdo igual: mantém a árvore (inclusive as alterações locais já aplicadas)
+            entry["checked_at"] = time.time()
+            return entry["tree"]
+        tree = TaxonomyTree(resp.data)
+        st.session_state.taxonomy_trees[t_type] = {"tree": tree, "version": resp.version, "checked_at": time.time()}
+        st.session_state.taxonomy_index[t_type] = TaxonomyIndex(resp.data)
+        return tree
+
+    def get_taxonomy_index(t_type):
+        return st.session_state.taxonomy_index.setdefault(t_type, TaxonomyIndex())
+
+    if "taxonomy_lazy" not in st.session_state:
+        st.session_state.taxonomy_lazy = {}
+    if "taxonomy_selected" not in st.session_state:
+        st.session_state.taxonomy_selected = {}
+
+    # --- NAVEGAÇÃO SOB DEMANDA ---
+    def fetch_children(parent_id):
+        # Filtro por pai no backend ("null" = raízes); GET condicional como o resto
+        try:
+            resp = api.get_json(TAXONOMY_PATH, params={
+                "type": selected_type, "parent_id": parent_id if parent_id is not None else "null"
+            })
+            found = resp.data if resp.ok else []
+        except Exception:
+            return []
+        get_taxonomy_index(selected_type).add_nodes(found)
+        # Se o backend ignorar o "parent_id", o filtro local evita a árvore achatada (e keys repetidas)
+        return [n for n in found if (n.get("parent_id") or None) == parent_id]
+
+    def search_nodes(query, limit=20):
         try:
-            resp = requests.get(TAXONOMY_URL, params={"type": t_type}, headers={"X-Tenant-ID": tenant_id})
-            return resp.json() if resp.status_code == 200 else []
-        except: return []
+            resp = api.get_json(TAXONOMY_PATH, params={"type": selected_type, "q": query, "limit": limit})
+            found = resp.data if resp.ok else []
+        except Exception:
+            found = []
+        get_taxonomy_index(selected_type).add_nodes(found)
+        # Se o backend ignorar o "q", o filtro local (nome + exemplos) garante o resultado
+        return [n for n in found if node_matches(n, query)][:limit]
+
+    def taxonomy_caches(t_type):
+        # Árvore completa (se carregada) e índice sob demanda recebem as mesmas alterações locais
+        caches = []
+        if t_type in st.session_state.taxonomy_trees:
+            caches.append(st.session_state.taxonomy_trees[t_type]["tree"])
+        if t_type in st.session_state.taxonomy_lazy:
+            caches.append(st.session_state.taxonomy_lazy[t_type])
+        if t_type in st.session_state.taxonomy_index:
+            caches.append(st.session_state.taxonomy_index[t_type])
+        return caches
+
+    def drop_taxonomy_caches(t_type):
+        st.session_state.taxonomy_trees.pop(t_type, None)
+        st.session_state.taxonomy_lazy.pop(t_type, None)
+        st.session_state.taxonomy_index.pop(t_type, None)
+
+    col_reload, col_mode, col_tree_info = st.columns([1, 2, 3])
+    with col_reload:
+        if st.button("🔄 Recarregar", key="btn_reload_taxonomy"):
+            drop_taxonomy_caches(selected_type)
+    with col_mode:
+        lazy_mode = st.toggle(
+            "Navegação sob demanda", value=True,
+            help="Busca e desenha só os filhos dos itens expandidos. Recomendado para taxonomias grandes."
+        )
 
-    nodes = fetch_nodes(selected_type)
-    
-    # --- VISUALIZAÇÃO DE ÁRVORE ---
-    node_map = {n['id']: n for n in nodes}
-    tree_options = [] 
-    
-    def build_tree_list(parent_id, level=0):
-        children = [n for n in nodes if n['parent_id'] == parent_id]
-        for child in children:
-            prefix = "└── " * level if level > 0 else "📦 "
-            label = f"{prefix}{child['name']}"
-            tree_options.append((child['id'], label))
-            build_tree_list(child['id'], level + 1)
-
-    build_tree_list(None)
-    
-    mapped_ids = {t[0] for t in tree_options}
-    for n in nodes:
-        if n['id'] not in mapped_ids:
-            tree_options.append((n['id'], f"⚠️ [Orfão] {n['name']}"))
+    if lazy_mode:
+        tree = None
+        navegador = st.session_state.taxonomy_lazy.setdefault(selected_type, LazyTaxonomy())
+    else:
+        # --- VISUALIZAÇÃO DE ÁRVORE ---
+        tree = get_taxonomy_tree(selected_type)
+        navegador = tree
+        with col_tree_info:
+            if tree.orphans or tree.cycles:
+                st.caption(f"⚠️ {len(tree.orphans)} órfão(s) e {len(tree.cycles)} item(ns) em ciclo nesta taxonomia.")
+
+    def full_tree():
+        # Importação/exportação precisam da árvore completa: só é buscada quando usadas
+        return tree if tree is not None else get_taxonomy_tree(selected_type)
 
     # --- DIVISÃO DA TELA ---
     col_tree, col_edit = st.columns([1, 1])
@@ -672,27 +1261,124 @@ with tab_taxonomy:
     # ... (Lógica das colunas será renderizada abaixo da área de importação para facilitar acesso) ...
 
     # --- ÁREA DE IMPORTAÇÃO EM LOTE ---
-    
+    with st.expander("📥 Importação / 📤 Exportação em Lote", expanded=False):
+        st.caption(
+            "CSV por níveis (ex: `Sistema,Módulo,Funcionalidade`, uma linha por caminho), "
+            "CSV explícito (`ref,name,description,parent_ref,exemplos,responsabilidade`) "
+            "ou JSON aninhado (`name`, `description`, `metadata`, `children`)."
+        )
+        bulk_file = st.file_uploader("Arquivo da hierarquia:", type=['csv', 'json'], key="bulk_taxonomy_file")
 
-    
+        if bulk_file:
+            try:
+                bulk_text = bulk_file.getvalue().decode("utf-8-sig")
+                import_nodes = parse_json(bulk_text) if bulk_file.name.endswith(".json") else parse_csv(bulk_text)
+                levels, existing_refs, import_errors = plan_import(import_nodes, full_tree())
+            except Exception as e:
+                st.error(f"Erro ao ler arquivo: {e}")
+                levels, existing_refs, import_errors = [], {}, []
+
+            total_novos = sum(len(lv) for lv in levels)
+            c_new, c_reuse, c_levels = st.columns(3)
+            c_new.metric("Novos itens", total_novos)
+            c_reuse.metric("Já existentes", len(existing_refs))
+            c_levels.metric("Níveis", len(levels))
+            for err in import_errors[:10]:
+                st.warning(err)
+
+            c_batch, c_workers = st.columns(2)
+            bulk_batch_size = c_batch.number_input("Itens por requisição:", min_value=1, max_value=1000,
+                                                   value=BULK_DEFAULT_BATCH_SIZE, step=50)
+            bulk_workers = c_workers.number_input("Requisições em paralelo:", min_value=1, max_value=8,
+                                                  value=BULK_DEFAULT_MAX_WORKERS, step=1)
+
+            if total_novos and st.button(f"📥 Importar {total_novos} itens em {selected_label}", type="primary"):
+                bulk_progress = st.progress(0)
+                importer = BulkImporter(api, TAXONOMY_PATH, selected_type,
+                                        batch_size=int(bulk_batch_size), max_workers=int(bulk_workers))
+                for event in importer.run(levels, existing_refs):
+                    if event["step"] == "progress":
+                        bulk_progress.progress(event["current"] / event["total"], text=event["msg"])
+                    elif event["step"] == "error":
+                        st.error(event["msg"])
+                    elif event["step"] == "final":
+                        # Insere tudo nas árvores locais de uma vez (sem refetch)
+                        for cache in taxonomy_caches(selected_type):
+                            cache.add_nodes(event["created"])
+                        st.success(f"✅ {len(event['created'])} criados, {event['reused']} reaproveitados, "
+                                   f"{event['failed']} com falha.")
+                        if event["partial"]:
+                            st.warning(f"⚠️ {event['partial']} lote(s) falharam no meio: os itens já criados foram "
+                                       "registrados e um novo import só envia os que faltam.")
+
+        st.divider()
+        # Os arquivos só são montados quando pedidos (evita serializar a árvore a cada rerun)
+        if st.toggle("📤 Preparar exportação", key="toggle_export_taxonomy"):
+            c_exp_json, c_exp_csv = st.columns(2)
+            export_tree = full_tree()
+            c_exp_json.download_button("Baixar JSON", data=export_json(export_tree),
+                                       file_name=f"taxonomia_{selected_type}.json", mime="application/json",
+                                       use_container_width=True)
+            c_exp_csv.download_button("Baixar CSV", data=export_csv(export_tree),
+                                      file_name=f"taxonomia_{selected_type}.csv", mime="text/csv",
+                                      use_container_width=True)
     # --- FIM DA ÁREA DE IMPORTAÇÃO ---
 
     with col_tree:
         st.subheader("Estrutura Atual")
-        if tree_options:
+        if lazy_mode:
+            def _selecionar(node, t_type=selected_type):
+                navegador.nodes.setdefault(node["id"], dict(node))
+                st.session_state.taxonomy_selected[t_type] = node["id"]
+
+            # Type-ahead: busca por nome e metadata.exemplos
+            busca = st.text_input("🔎 Buscar por nome ou exemplo:", key=f"busca_taxonomia_{selected_type}")
+            if busca and len(busca.strip()) >= 2:
+                resultados = search_nodes(busca.strip())
+                for n in resultados:
+                    st.button(f"🔹 {n['name']}", key=f"res_{selected_type}_{n['id']}",
+                              on_click=_selecionar, args=(n,), use_container_width=True)
+                if not resultados:
+                    st.caption("Nada encontrado.")
+                st.divider()
+
+            rows = navegador.visible_rows(fetch_children)
+            selected_id = st.session_state.taxonomy_selected.get(selected_type)
+            if rows:
+                with st.container(height=500):
+                    for row in rows:
+                        if row[0] == "more":
+                            _, parent_id, depth, restantes = row
+                            st.button(f"{'└── ' * depth}… mais {restantes} itens", key=f"more_{selected_type}_{parent_id}",
+                                      on_click=navegador.show_more, args=(parent_id,))
+                            continue
+                        _, node_id, depth = row
+                        c_exp, c_name = st.columns([1, 7])
+                        c_exp.button("▾" if node_id in navegador.expanded else "▸", key=f"exp_{selected_type}_{node_id}",
+                                     on_click=navegador.toggle, args=(node_id,))
+                        marcador = "👉 " if node_id == selected_id else ""
+                        c_name.button(f"{marcador}{navegador.label(node_id)}", key=f"sel_{selected_type}_{node_id}",
+                                      on_click=_selecionar, args=(navegador.get(node_id),), use_container_width=True)
+            else:
+                st.warning("Lista vazia.")
+            selected_node_data = navegador.get(selected_id) if selected_id else None
+        elif navegador.options:
             selected_node_tuple = st.radio(
                 "Navegador:",
-                options=tree_options,
+                options=navegador.options,
                 format_func=lambda x: x[1],
                 label_visibility="collapsed"
             )
             selected_id = selected_node_tuple[0]
-            selected_node_data = node_map.get(selected_id)
+            selected_node_data = navegador.get(selected_id)
         else:
             st.warning("Lista vazia.")
             selected_node_data = None
             selected_id = None
 
+    # Opções de pai: a árvore completa ou, no modo sob demanda, os itens já carregados
+    tree_options = navegador.options
+
     with col_edit:
         action = st.radio("Ação:", ["Editar Selecionado", "Criar Novo Item"], horizontal=True)
         st.divider()
@@ -719,11 +1405,26 @@ with tab_taxonomy:
                     ex_text = st.text_area("Exemplos/Variações (separar por ;):", placeholder="Exemplo 1; Exemplo 2")
                     form_meta['exemplos'] = [x.strip() for x in ex_text.split(';') if x.strip()]
 
+                criar_mesmo_assim = st.checkbox("Criar mesmo se houver itens parecidos")
                 submitted = st.form_submit_button("Salvar Novo")
                 
                 if submitted:
+                    parecidos = []
+                    if form_name and not criar_mesmo_assim:
+                        if lazy_mode:
+                            # Sob demanda o índice só tem o que já foi carregado: completa com a busca do servidor
+                            search_nodes(form_name)
+                        textos_novos = [form_name] + form_meta.get('exemplos', [])
+                        parecidos = get_taxonomy_index(selected_type).similar(textos_novos)
+
                     if not form_name:
                         st.error("Nome é obrigatório.")
+                    elif parecidos:
+                        linhas = "\n".join(
+                            f"- **{n['name']}** ({campo}, {score:.0%} parecido)" for score, campo, n in parecidos
+                        )
+                        st.warning(f"Já existem itens parecidos em {selected_label}:\n{linhas}\n\n"
+                                   "Marque *Criar mesmo se houver itens parecidos* para salvar assim mesmo.")
                     else:
                         payload = {
                             "type": selected_type,
@@ -733,8 +1434,15 @@ with tab_taxonomy:
                             "metadata": form_meta
                         }
                         try:
-                            r = requests.post(TAXONOMY_URL, json=payload, headers={"X-Tenant-ID": tenant_id})
+                            r = api.post(TAXONOMY_PATH, json=payload)
                             if r.status_code == 201:
+                                # Insere na árvore local sem refazer o fetch
+                                created = r.json() if r.content else {}
+                                if isinstance(created, dict) and created.get("id"):
+                                    for cache in taxonomy_caches(selected_type):
+                                        cache.add_node({**payload, **created})
+                                else:
+                                    drop_taxonomy_caches(selected_type)
                                 st.success("Criado!")
                                 st.rerun()
                             else: st.error(r.text)
@@ -750,9 +1458,13 @@ with tab_taxonomy:
                     form_name = st.text_input("Nome:", value=selected_node_data['name'])
                     form_desc = st.text_area("Descrição:", value=selected_node_data.get('description', ''))
                     
-                    # Hierarquia (evita ciclo removendo o próprio ID)
-                    valid_parents = [(None, "Nenhum (Raiz)")] + [t for t in tree_options if t[0] != selected_id]
+                    # Hierarquia (evita ciclo removendo o próprio ID e os descendentes)
+                    proibidos = navegador.descendants(selected_id) | {selected_id}
+                    valid_parents = [(None, "Nenhum (Raiz)")] + [t for t in tree_options if t[0] not in proibidos]
                     curr_pid = selected_node_data['parent_id']
+                    if curr_pid is not None and curr_pid not in {v[0] for v in valid_parents}:
+                        # Modo sob demanda: o pai atual pode não estar carregado
+                        valid_parents.append((curr_pid, "(pai atual)"))
                     def_idx = next((i for i, v in enumerate(valid_parents) if v[0] == curr_pid), 0)
                     
                     form_parent = st.selectbox("Pai:", options=valid_parents, index=def_idx, format_func=lambda x: x[1])
@@ -784,8 +1496,10 @@ with tab_taxonomy:
                             "parent_id": form_parent[0], "metadata": form_meta
                         }
                         try:
-                            r = requests.put(f"{TAXONOMY_URL}/{selected_id}", json=payload, headers={"X-Tenant-ID": tenant_id})
+                            r = api.put(f"{TAXONOMY_PATH}/{selected_id}", json=payload)
                             if r.status_code == 200:
+                                for cache in taxonomy_caches(selected_type):
+                                    cache.update_node(selected_id, payload)
                                 st.success("Atualizado!")
                                 st.rerun()
                             else: st.error(f"Erro: {r.text}")
@@ -793,8 +1507,10 @@ with tab_taxonomy:
                     
                     if delete_click:
                         try:
-                            r = requests.delete(f"{TAXONOMY_URL}/{selected_id}", headers={"X-Tenant-ID": tenant_id})
+                            r = api.delete(f"{TAXONOMY_PATH}/{selected_id}")
                             if r.status_code == 200:
+                                for cache in taxonomy_caches(selected_type):
+                                    cache.remove_node(selected_id)
                                 st.success("Deletado!")
                                 st.rerun()
                             else: st.error(f"Erro: {r.text}")
@@ -805,64 +1521,45 @@ with tab_taxonomy:
                 # Aqui NÃO abrimos st.form nenhum, então não dá erro de "Missing Submit Button"
                 st.info("👈 Selecione um item na lista à esquerda para editar.")
 
+with tab_taxonomy:
+    if aba_aberta(tab_taxonomy):
+        aba_taxonomias()
+
 # =========================================================
 # ABA 5: GESTÃO DE TICKETS (VIA API)
 # =========================================================
-with tab_tickets:
+@st.fragment
+def aba_tickets():
     st.header("📊 Inteligência de Suporte (Real-Time)")
     
-    # URL da nova rota que criamos no wsgi.py
-    # BASE_URL já foi definido no início do seu app.py (https://api.nasajon.app/nsj-ia-suporte)
-    ANALYTICS_URL = f"{BASE_URL}/tickets/analytics"
-    
-    # Função para buscar dados da API
-    @st.cache_data(ttl=60)
-    def fetch_tickets_api():
-        try:
-            # Consome a rota criada no Passo 2
-            resp = requests.get(ANALYTICS_URL, params={"limit": 100}, headers={"X-Tenant-ID": tenant_id}, timeout=10)
-            if resp.status_code == 200:
-                return pd.DataFrame(resp.json())
-            else:
-                st.error(f"Erro API: {resp.text}")
-                return pd.DataFrame()
-        except Exception as e:
-            st.error(f"Falha de conexão: {e}")
-            return pd.DataFrame()
+    _, col_refresh = st.columns([5, 1])
+    with col_refresh:
+        if st.button("🔄 Atualizar dados", use_container_width=True):
+            invalidate_analytics_cache()
 
     # 1. CARREGAMENTO DE DADOS
     with st.spinner("Sincronizando com Knowledge Graph..."):
-        df_tickets = fetch_tickets_api()
+        snapshot = fetch_analytics_snapshot()
+        modelo = build_analytics_model(*snapshot) if snapshot else None
 
-    if df_tickets.empty:
+    if not modelo or not modelo.total:
         st.warning("📭 Nenhum dado retornado pela API ou falha de conexão.")
     else:
-        # Processamento de listas para exibição (String bonita)
-        df_tickets['erros_str'] = df_tickets['lista_erros'].apply(lambda x: ", ".join(x) if isinstance(x, list) and x else "-")
-        df_tickets['eventos_str'] = df_tickets['lista_eventos'].apply(lambda x: ", ".join(x) if isinstance(x, list) and x else "-")
+        modo_servidor = modelo.server_side
+        tabela_local = modelo.table
+
+        if not modo_servidor:
+            st.caption("⚠️ Backend sem rota de agregados: indicadores calculados sobre uma amostra de 100 tickets.")
 
         # --- KPIs ---
         col_kpi1, col_kpi2, col_kpi3 = st.columns(3)
         with col_kpi1:
-            st.metric("Total de Tickets (Amostra)", df_tickets['id'].nunique())
+            label_total = "Total de Tickets" if modo_servidor else "Total de Tickets (Amostra)"
+            st.metric(label_total, modelo.total)
         with col_kpi2:
-            if 'recurso_nivel_2' in df_tickets.columns and not df_tickets['recurso_nivel_2'].empty:
-                top_modulo = df_tickets['recurso_nivel_2'].mode()[0]
-            else:
-                top_modulo = "N/A"
-            st.metric("Módulo Mais Crítico", top_modulo)
+            st.metric("Módulo Mais Crítico", modelo.top_modulo)
         with col_kpi3:
-            # Lógica para achar o erro mais comum (achatando as listas)
-            todos_erros = []
-            for lista in df_tickets['lista_erros']:
-                if isinstance(lista, list): todos_erros.extend(lista)
-            
-            if todos_erros:
-                from collections import Counter
-                top_erro = Counter(todos_erros).most_common(1)[0][0]
-            else:
-                top_erro = "Nenhum"
-            st.metric("Erro Mais Comum", top_erro)
+            st.metric("Erro Mais Comum", modelo.top_erro)
 
         st.divider()
 
@@ -885,92 +1582,89 @@ with tab_tickets:
             visao_selecionada = st.radio("Agrupar por:", list(opcoes_visao.keys()))
             coluna_analise = opcoes_visao[visao_selecionada]
 
-        # LÓGICA DE PREPARAÇÃO DO GRÁFICO
-        if coluna_analise in df_tickets.columns:
-            
-            # Se for Erro ou Evento (Listas), precisamos usar EXPLODE para contar individualmente
-            if coluna_analise in ["lista_erros", "lista_eventos"]:
-                df_exploded = df_tickets.explode(coluna_analise)
-                # Remove nulos e strings vazias geradas pelo explode
-                df_exploded = df_exploded[df_exploded[coluna_analise].notna() & (df_exploded[coluna_analise] != "")]
-                df_chart = df_exploded[coluna_analise].value_counts().reset_index()
+        # LÓGICA DE PREPARAÇÃO DO GRÁFICO (distribuições pré-calculadas no modelo)
+        df_chart = modelo.distributions[coluna_analise]
+
+        with c_graph:
+            if not df_chart.empty:
+                chart = build_distribution_chart(modelo.version, coluna_analise, df_chart)
+                st.altair_chart(chart, use_container_width=True)
             else:
-                # Lógica padrão para colunas simples (Sintoma, Causa, Modulo)
-                df_chart = df_tickets[coluna_analise].value_counts().reset_index()
-
-            df_chart.columns = ["Categoria", "Quantidade"]
-
-            with c_graph:
-                if not df_chart.empty:
-                    chart = alt.Chart(df_chart).mark_bar(color="#FF4B4B", cornerRadiusEnd=4).encode(
-                        x=alt.X('Quantidade', title=None), 
-                        y=alt.Y('Categoria', sort='-x', title=None),
-                        tooltip=['Categoria', 'Quantidade']
-                    ).properties(height=300)
-                    
-                    text = chart.mark_text(align='left', baseline='middle', dx=3).encode(text='Quantidade')
-                    st.altair_chart(chart + text, use_container_width=True)
-                else:
-                    st.info("Sem dados suficientes para gerar gráfico desta categoria.")
+                st.info("Sem dados suficientes para gerar gráfico desta categoria.")
         
         # --- 3. DRILL DOWN (TABELA DETALHADA) ---
         st.markdown(f"### 🔬 Detalhar: {visao_selecionada}")
         
+        df_pagina = pd.DataFrame()
         col_drill1, col_drill2 = st.columns([1, 3])
         with col_drill1:
             cats = df_chart["Categoria"].tolist() if not df_chart.empty else []
             if cats:
                 cat_foco = st.selectbox(f"Filtrar {visao_selecionada}:", cats)
+                total_cat = int(modelo.category_totals[coluna_analise][cat_foco])
+                total_paginas = max(1, -(-total_cat // DEFAULT_PAGE_SIZE))
+                pagina = st.number_input("Página:", min_value=1, max_value=total_paginas, value=1, step=1)
+                st.caption(f"{total_paginas} página(s) de até {DEFAULT_PAGE_SIZE} tickets")
             else:
                 cat_foco = None
 
         with col_drill2:
-            if cat_foco and coluna_analise in df_tickets.columns:
-                
-                # LÓGICA DE FILTRAGEM (Simples vs Lista)
-                if coluna_analise in ["lista_erros", "lista_eventos"]:
-                    # Filtra verificando se o item selecionado está DENTRO da lista daquela linha
-                    # Ex: Se selecionei "Erro 106", traz todas as linhas onde "Erro 106" está na lista_erros
-                    mask = df_tickets[coluna_analise].apply(lambda x: cat_foco in x if isinstance(x, list) else False)
-                    df_filtro = df_tickets[mask]
+            if cat_foco:
+                offset = (int(pagina) - 1) * DEFAULT_PAGE_SIZE
+
+                # LÓGICA DE FILTRAGEM: servidor pagina; na amostra filtramos localmente
+                if modo_servidor:
+                    df_filtro, total_filtro = fetch_detail_page_api(
+                        modelo.version, coluna_analise, cat_foco, offset, DEFAULT_PAGE_SIZE
+                    )
                 else:
-                    # Filtro exato padrão
-                    df_filtro = df_tickets[df_tickets[coluna_analise] == cat_foco]
-
-                # 1. Conta IDs únicos para o texto
-                st.write(f"**{df_filtro['id'].nunique()} Tickets encontrados**")
+                    df_local = tabela_local.filter(coluna_analise, cat_foco)
+                    total_filtro = len(df_local)
+                    df_filtro = df_local.iloc[offset:offset + DEFAULT_PAGE_SIZE]
+
+                if not df_filtro.empty:
+                    # Remove duplicatas baseadas no ID antes de exibir a tabela
+                    df_pagina = df_filtro.drop_duplicates(subset=['id'])
+                    if "erros_str" not in df_pagina.columns:
+                        df_pagina = format_list_columns(df_pagina)
+
+                # 1. Conta tickets para o texto
+                st.write(f"**{total_filtro} Tickets encontrados**")
                 
-                # 2. Remove duplicatas baseadas no ID antes de exibir a tabela
-                df_exibicao = df_filtro[["id", "recurso_nivel_3", "sintoma_detalhe", "erros_str", "eventos_str"]].drop_duplicates(subset=['id'])
-
-                st.dataframe(
-                    df_exibicao, 
-                    use_container_width=True, hide_index=True,
-                    column_config={
-                        "id": st.column_config.TextColumn("ID", width="small"),
-                        "recurso_nivel_3": st.column_config.TextColumn("Funcionalidade", width="medium"),
-                        "sintoma_detalhe": st.column_config.TextColumn("Resumo do Problema", width="large"),
-                        "erros_str": st.column_config.TextColumn("Códigos de Erro", width="medium"),
-                        "eventos_str": st.column_config.TextColumn("Eventos eSocial", width="medium")
-                    }
-                )
+                if not df_pagina.empty:
+                    colunas_tabela = [c for c in ["id", "recurso_nivel_3", "sintoma_detalhe", "erros_str", "eventos_str"]
+                                      if c in df_pagina.columns]
+                    st.dataframe(
+                        df_pagina[colunas_tabela], 
+                        use_container_width=True, hide_index=True,
+                        column_config={
+                            "id": st.column_config.TextColumn("ID", width="small"),
+                            "recurso_nivel_3": st.column_config.TextColumn("Funcionalidade", width="medium"),
+                            "sintoma_detalhe": st.column_config.TextColumn("Resumo do Problema", width="large"),
+                            "erros_str": st.column_config.TextColumn("Códigos de Erro", width="medium"),
+                            "eventos_str": st.column_config.TextColumn("Eventos eSocial", width="medium")
+                        }
+                    )
 
         st.divider()
 
         # --- 4. FICHA TÉCNICA (DETALHES DO TICKET) ---
         st.markdown("### 🎫 Ficha Técnica do Ticket (Knowledge Graph)")
+        st.caption("Tickets da página atual do detalhamento acima.")
         
         col_search, col_card = st.columns([1, 2])
 
         with col_search:
-            ticket_options = df_tickets["id"].tolist()
-            # Formata para mostrar ID e Titulo no dropdown
-            format_func = lambda x: f"{x} - {str(df_tickets[df_tickets['id']==x]['titulo'].values[0])[:30]}..."
-            
-            selected_id = st.selectbox("Selecione um Ticket:", ticket_options, format_func=format_func)
+            selected_id = None
+            if not df_pagina.empty:
+                ticket_options = df_pagina["id"].tolist()
+                # Formata para mostrar ID e Titulo no dropdown (índice id -> rótulo montado uma vez)
+                labels = tabela_local.labels if tabela_local is not None else build_label_index(df_pagina)
+                
+                selected_id = st.selectbox("Selecione um Ticket:", ticket_options, format_func=labels.get)
             
             if selected_id:
-                t = df_tickets[df_tickets["id"] == selected_id].iloc[0]
+                t = df_pagina.loc[df_pagina["id"] == selected_id].iloc[0]
                 
                 st.info(f"**Protocolo:** {t.get('protocolo', 'N/A')}")
                 st.caption(f"Ingerido em: {t.get('data_ingestao', 'N/A')}")
@@ -1013,3 +1707,7 @@ with tab_tickets:
                         st.write("Sem solução registrada.")
             else:
                 st.info("Selecione um ticket para ver os detalhes extraídos pela IA.")
+
+with tab_tickets:
+    if aba_aberta(tab_tickets):
+        aba_tickets()
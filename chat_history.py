@@ -0,0 +1,86 @@
+# --- HISTÓRICO DA CONVERSA ---
+# Dois modos de envio do histórico para o /queries:
+#   "server": o servidor guarda a conversa; o cliente manda só a mensagem nova,
+#             o conversation_id e o cursor (last_seen_turn) + o delta ainda não confirmado.
+#   "window": padrão, sem estado no servidor; manda as últimas mensagens que cabem
+#             no orçamento de tokens, com um resumo compacto do que ficou de fora.
+# O modo "server" só é usado depois que o servidor confirma que guarda a conversa, devolvendo
+# "history_mode": "server" nos metadados da resposta. Um backend sem estado nunca confirma
+# (nem responde 409/410), então continua recebendo a janela e não perde o contexto.
+
+MARCADOR_IMAGEM = "📎 *[Imagem Anexada]*\n\n"
+
+HISTORY_MODE_SERVER = "server"
+HISTORY_MODE_WINDOW = "window"
+
+DEFAULT_MAX_HISTORY_TOKENS = 2000
+
+# Status devolvido pelo servidor quando não conhece o conversation_id (estado expirado/reiniciado)
+SERVER_STATE_MISSING_STATUS = (409, 410)
+
+
+def server_keeps_history(metadata):
+    return (metadata or {}).get("history_mode") == HISTORY_MODE_SERVER
+
+
+def estimate_tokens(text):
+    # Aproximação barata (~4 caracteres por token) suficiente para orçamento de payload
+    return max(1, len(text) // 4)
+
+
+def to_payload(msg):
+    # Limpa marcadores visuais do histórico para não confundir o modelo
+    content_clean = msg["content"].replace(MARCADOR_IMAGEM, "")
+    msg_payload = {"role": msg["role"], "content": content_clean}
+    if msg.get("agent"):
+        msg_payload["agent"] = msg["agent"]
+    return msg_payload
+
+
+def summarize_dropped(messages, max_chars=400):
+    # Resumo local: lista as perguntas do usuário que saíram da janela
+    perguntas = [to_payload(m)["content"].split("\n")[0][:80] for m in messages if m["role"] == "user"]
+    if not perguntas:
+        return None
+    texto = f"[RESUMO] {len(messages)} mensagens anteriores omitidas. Perguntas: " + " | ".join(perguntas)
+    return {"role": "system", "content": texto[:max_chars]}
+
+
+def windowed_history(messages, max_tokens=DEFAULT_MAX_HISTORY_TOKENS):
+    # Percorre do fim para o começo até estourar o orçamento
+    window = []
+    used = 0
+    for msg in reversed(messages):
+        payload = to_payload(msg)
+        cost = estimate_tokens(payload["content"])
+        if window and used + cost > max_tokens:
+            break
+        window.append(payload)
+        used += cost
+    window.reverse()
+
+    dropped = messages[:len(messages) - len(window)]
+    if dropped:
+        resumo = summarize_dropped(dropped)
+        if resumo and used + estimate_tokens(resumo["content"]) <= max_tokens:
+            window.insert(0, resumo)
+    return window
+
+
+def build_history_payload(messages, mode, cursor=0, max_tokens=DEFAULT_MAX_HISTORY_TOKENS, offset=0):
+    # `messages` inclui a mensagem atual no final (ela vai separada no campo 'message').
+    # `cursor` é absoluto; `offset` = mensagens antigas que já saíram de `messages`.
+    previous = messages[:-1]
+
+    if mode == HISTORY_MODE_SERVER:
+        # Só o que o servidor ainda não confirmou (ex: turnos cuja chamada falhou)
+        return {
+            "history_mode": HISTORY_MODE_SERVER,
+            "last_seen_turn": cursor,
+            "history": windowed_history(previous[max(cursor - offset, 0):], max_tokens),
+        }
+
+    return {
+        "history_mode": HISTORY_MODE_WINDOW,
+        "history": windowed_history(previous, max_tokens),
+    }
@@ -0,0 +1,67 @@
+import json
+
+# --- CONSUMIDOR DE STREAMING DO CHAT ---
+# Mesmo protocolo de linhas do /ingest-pipeline: um JSON por linha com a chave "step".
+#   {"step": "token", "msg": "texto parcial"}
+#   {"step": "final", "response": "...", "metadata": {"agent": "..."}}
+#   {"step": "error", "msg": "..."}
+# Também aceita SSE ("data: {...}"), caso o servidor responda com text/event-stream.
+
+STREAM_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl", "text/event-stream")
+
+
+def is_stream_response(response):
+    content_type = response.headers.get("Content-Type", "")
+    return any(ct in content_type for ct in STREAM_CONTENT_TYPES)
+
+
+def iter_events(response):
+    # chunk_size=None: cada pedaço é entregue assim que chega (sem esperar encher um buffer de 512 bytes)
+    for line in response.iter_lines(chunk_size=None):
+        if not line:
+            continue
+        text = line.decode("utf-8").strip()
+
+        # Linhas de controle do SSE (comentários, event:, id:, retry:)
+        if text.startswith(":") or text.startswith(("event:", "id:", "retry:")):
+            continue
+        if text.startswith("data:"):
+            text = text[5:].strip()
+        if text == "[DONE]":
+            break
+
+        try:
+            yield json.loads(text)
+        except json.JSONDecodeError:
+            continue
+
+
+class ChatStream:
+    def __init__(self, response):
+        self.response = response
+        self.chunks = []
+        self.final_text = None
+        self.metadata = {}
+        self.error = None
+
+    def tokens(self):
+        # Consumido pelo ChatWorker em segundo plano: acumula o texto em `chunks` (a UI lê o parcial
+        # nos reruns do fragmento); metadados e erro ficam no objeto
+        for event in iter_events(self.response):
+            step = event.get("step")
+            if step == "token":
+                chunk = event.get("msg", "")
+                if chunk:
+                    self.chunks.append(chunk)
+                    yield chunk
+            elif step == "final":
+                self.final_text = event.get("response") or event.get("answer")
+                self.metadata = event.get("metadata", {}) or {}
+            elif step == "error":
+                self.error = event.get("msg", "Erro no streaming.")
+                break
+
+    @property
+    def text(self):
+        # A resposta consolidada do evento final prevalece sobre a concatenação dos tokens
+        return self.final_text or "".join(self.chunks)
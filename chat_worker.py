@@ -0,0 +1,149 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from chat_stream import ChatStream, is_stream_response
+
+# --- CHAT EM SEGUNDO PLANO ---
+# O POST do /queries roda num pool do processo (criado via st.cache_resource no app.py),
+# fora da thread do script: o app só consulta o job em reruns de fragmento.
+# No máximo uma requisição em andamento por conversation_id; "Limpar Conversa" e o botão
+# de cancelar interrompem o job (a conexão é fechada e o resultado é descartado).
+
+DEFAULT_CHAT_WORKERS = 8
+
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_ERROR = "error"
+JOB_CANCELLED = "cancelled"
+
+EMPTY_RESPONSE = "⚠️ Resposta vazia."
+
+
+class ChatJob:
+    def __init__(self, conversation_id):
+        self.conversation_id = conversation_id
+        self.status = JOB_RUNNING
+        self.stream = None
+        self.text = None
+        self.metadata = {}
+        self.error = None
+        self.started_at = time.time()
+        self.future = None
+        self._cancelled = threading.Event()
+        self._response = None
+
+    @property
+    def partial_text(self):
+        if self.text is not None:
+            return self.text
+        return "".join(self.stream.chunks) if self.stream else ""
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def cancel(self):
+        self._cancelled.set()
+        response = self._response
+        if response is not None:
+            # Fecha a conexão: a leitura do stream na thread do worker é interrompida
+            response.close()
+
+
+class ChatWorker:
+    def __init__(self, api, path, max_workers=DEFAULT_CHAT_WORKERS, retry_status=()):
+        self.api = api
+        self.path = path
+        # Status que disparam o reenvio com o payload alternativo (ex: servidor sem estado da conversa)
+        self.retry_status = tuple(retry_status)
+        self._pool = ThreadPoolExecutor(max_workers=max(int(max_workers), 1), thread_name_prefix="chat")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _post(self, payload, stream):
+        if stream:
+            return self.api.post(
+                self.path,
+                json={**payload, "stream": True},
+                headers={"Accept": "application/x-ndjson"},
+                stream=True
+            )
+        return self.api.post(self.path, json=payload)
+
+    def _run(self, job, payload, fallback_payload, stream):
+        try:
+            job._response = self._post(payload, stream)
+            if fallback_payload is not None and job._response.status_code in self.retry_status:
+                job._response.close()
+                job._response = self._post(fallback_payload, stream)
+            response = job._response
+
+            if job.cancelled:
+                job.status = JOB_CANCELLED
+                return
+            if response.status_code != 200:
+                job.error = f"❌ Erro {response.status_code}: {response.text}"
+                job.status = JOB_ERROR
+                return
+
+            if is_stream_response(response):
+                # Tokens acumulados no ChatStream; a UI lê o parcial em cada rerun do fragmento
+                job.stream = ChatStream(response)
+                for _ in job.stream.tokens():
+                    if job.cancelled:
+                        break
+                if job.stream.error:
+                    job.error = f"❌ Erro no streaming: {job.stream.error}"
+                    job.status = JOB_ERROR
+                    return
+                job.text = job.stream.text or EMPTY_RESPONSE
+                job.metadata = job.stream.metadata
+            else:
+                # Servidor sem suporte a streaming: resposta JSON única
+                data = response.json()
+                job.text = data.get("response") or data.get("answer") or EMPTY_RESPONSE
+                job.metadata = data.get("metadata", {}) or {}
+            job.status = JOB_CANCELLED if job.cancelled else JOB_DONE
+        except requests.exceptions.ConnectionError as e:
+            job.error = None if job.cancelled else f"🔌 Não foi possível conectar em: {self.api.url(self.path)} ({e})"
+            job.status = JOB_CANCELLED if job.cancelled else JOB_ERROR
+        except Exception as e:
+            job.error = None if job.cancelled else f"🔌 Erro inesperado: {str(e)}"
+            job.status = JOB_CANCELLED if job.cancelled else JOB_ERROR
+        finally:
+            if job._response is not None:
+                job._response.close()
+
+    def submit(self, conversation_id, payload, fallback_payload=None, stream=True):
+        # Devolve (job, criado). Se já houver um job em andamento para a conversa, ele é devolvido
+        # com criado=False e nada é enviado (evita requisições duplicadas).
+        with self._lock:
+            current = self._jobs.get(conversation_id)
+            if current is not None and not current.done():
+                return current, False
+            job = ChatJob(conversation_id)
+            self._jobs[conversation_id] = job
+            job.future = self._pool.submit(self._run, job, payload, fallback_payload, stream)
+        return job, True
+
+    def get(self, conversation_id):
+        with self._lock:
+            return self._jobs.get(conversation_id)
+
+    def pop(self, conversation_id):
+        # Chamado pela UI depois de consumir o resultado do job concluído
+        with self._lock:
+            return self._jobs.pop(conversation_id, None)
+
+    def cancel(self, conversation_id):
+        with self._lock:
+            job = self._jobs.pop(conversation_id, None)
+        if job is not None:
+            job.cancel()
+        return job
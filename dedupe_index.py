@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# --- DEDUPE LOCAL DE TICKETS ---
+# Índice persistente (SQLite) dos tickets que o servidor já aceitou, por tenant.
+# A impressão digital é o ID do ticket (ticket_id ou numeroprotocolo) + hash da conversa:
+# se a conversa ganhar mensagens novas, o ticket volta a ser enviado.
+
+DEFAULT_INDEX_PATH = os.path.join(".cache", "ingested_tickets.sqlite")
+
+
+def ticket_fingerprint(item):
+    t = item.get("ticket", {}) or {}
+    key = str(t.get("ticket_id") or t.get("numeroprotocolo") or "")
+    conversa = json.dumps(item.get("conversa", []), sort_keys=True, ensure_ascii=False, default=str)
+    digest = hashlib.sha256(conversa.encode("utf-8")).hexdigest()
+    return key, digest
+
+
+class DedupeCounter:
+    def __init__(self):
+        self.checked = 0
+        self.known = 0
+        self.dropped = 0  # conhecidos que não seguiram para o envio (drop=True)
+
+
+class DedupeIndex:
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Compartilhado entre sessões/threads do processo: acesso serializado pelo lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS accepted_tickets (
+                    tenant_id TEXT NOT NULL,
+                    ticket_key TEXT NOT NULL,
+                    conversa_digest TEXT NOT NULL,
+                    accepted_at REAL NOT NULL,
+                    PRIMARY KEY (tenant_id, ticket_key, conversa_digest)
+                )
+                """
+            )
+
+    def is_known(self, tenant_id, item):
+        key, digest = ticket_fingerprint(item)
+        if not key:
+            return False
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM accepted_tickets WHERE tenant_id = ? AND ticket_key = ? AND conversa_digest = ?",
+                (tenant_id, key, digest)
+            ).fetchone()
+        return row is not None
+
+    def filter_new(self, tenant_id, tickets, counter=None, drop=True):
+        # Gerador: mantém a leitura lazy do arquivo. Com drop=False apenas conta (modo "sinalizar").
+        counter = counter or DedupeCounter()
+        for item in tickets:
+            counter.checked += 1
+            if self.is_known(tenant_id, item):
+                counter.known += 1
+                if drop:
+                    counter.dropped += 1
+                    continue
+            yield item
+
+    def mark_accepted(self, tenant_id, tickets):
+        rows = []
+        now = time.time()
+        for item in tickets:
+            key, digest = ticket_fingerprint(item)
+            if key:
+                rows.append((tenant_id, key, digest, now))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO accepted_tickets (tenant_id, ticket_key, conversa_digest, accepted_at) "
+                "VALUES (?, ?, ?, ?)",
+                rows
+            )
+        return len(rows)
+
+    def size(self, tenant_id):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM accepted_tickets WHERE tenant_id = ?", (tenant_id,)
+            ).fetchone()[0]
+
+    def clear(self, tenant_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM accepted_tickets WHERE tenant_id = ?", (tenant_id,))
@@ -0,0 +1,147 @@
+import io
+import os
+import time
+
+from PIL import Image, ImageOps
+
+# --- PRÉ-PROCESSAMENTO DE IMAGENS (ANTES DA VISÃO) ---
+# Capturas 4K em PNG chegam com vários MB. Antes da análise a imagem é decodificada uma vez,
+# reduzida para caber em max_dimension (mantendo a proporção), recodificada em JPEG/WEBP
+# e salva sem metadados (EXIF, ICC, textos do PNG). O original segue se o usuário pedir ou se
+# a versão preparada não ficar menor em bytes (PNG pequeno com paleta cresce ao virar JPEG).
+#
+# Benchmark:  python image_prep.py <pasta com capturas> [--max-dimension 1600] [--format JPEG] [--vision]
+
+DEFAULT_MAX_DIMENSION = 1600
+DEFAULT_FORMAT = "JPEG"
+DEFAULT_QUALITY = 85
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp", "PNG": ".png"}
+# Orientações EXIF que giram a imagem 90°/270° (largura e altura trocam)
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+class ImagePreprocessor:
+    def __init__(self, max_dimension=DEFAULT_MAX_DIMENSION, fmt=DEFAULT_FORMAT, quality=DEFAULT_QUALITY):
+        self.max_dimension = int(max_dimension)
+        self.fmt = fmt.upper()
+        self.quality = int(quality)
+
+    @property
+    def key(self):
+        # Entra na chave do cache de descrições: mudar a configuração gera nova análise
+        return f"{self.max_dimension}:{self.fmt}:{self.quality}"
+
+    def __call__(self, name, data):
+        # Devolve (nome, bytes, info). Se o resultado não ficar menor em bytes, mantém o original.
+        start = time.perf_counter()
+        with Image.open(io.BytesIO(data)) as img:
+            original_size = img.size
+            if img.getexif().get(0x0112) in _TRANSPOSED_ORIENTATIONS:
+                original_size = original_size[::-1]
+            # draft() deixa o decoder do JPEG reduzir já na leitura: precisa vir antes de
+            # qualquer operação que decodifique a imagem (exif_transpose devolve uma cópia)
+            img.draft("RGB", (self.max_dimension, self.max_dimension))
+            img = ImageOps.exif_transpose(img)
+            if max(img.size) > self.max_dimension:
+                img.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+
+            if self.fmt == "JPEG" and img.mode != "RGB":
+                # JPEG não tem transparência: compõe sobre fundo branco
+                rgba = img.convert("RGBA")
+                img = Image.new("RGB", rgba.size, (255, 255, 255))
+                img.paste(rgba, mask=rgba.getchannel("A"))
+
+            out = io.BytesIO()
+            # Sem exif/icc_profile/pnginfo: os metadados ficam para trás
+            img.save(out, format=self.fmt, quality=self.quality, optimize=True)
+            prepared = out.getvalue()
+            final_size = img.size
+
+        info = {
+            "original_bytes": len(data),
+            "prepared_bytes": len(prepared),
+            "original_size": original_size,
+            "prepared_size": final_size,
+            "seconds": time.perf_counter() - start,
+        }
+        if len(prepared) >= len(data):
+            info["prepared_bytes"] = len(data)
+            info["prepared_size"] = original_size
+            return name, data, info
+        base = os.path.splitext(name)[0]
+        return f"{base}{FORMAT_EXTENSIONS.get(self.fmt, '')}", prepared, info
+
+
+def _synthetic_screenshots(count=5, size=(3840, 2160)):
+    # Corpus padrão do benchmark: telas com blocos de cor e texto (parecidas com capturas reais)
+    from PIL import ImageDraw
+
+    corpus = []
+    for i in range(count):
+        img = Image.new("RGB", size, (245, 245, 245))
+        draw = ImageDraw.Draw(img)
+        for row in range(0, size[1], 40):
+            draw.rectangle([0, row, size[0], row + 1], fill=(220, 220, 220))
+            draw.text((20 + i * 10, row + 12), f"Campo {row // 40}: Rejeição 539 - NF-e {i}{row}", fill=(20, 20, 20))
+        # Região "fotográfica" (papel de parede, imagem embutida), que o PNG não comprime bem
+        noise = Image.effect_noise((size[0] // 3, size[1] // 3), 40 + i * 5).convert("RGB")
+        img.paste(noise, (size[0] // 2, size[1] // 2))
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        corpus.append((f"synthetic_{i}.png", buf.getvalue()))
+    return corpus
+
+
+def _load_corpus(folder):
+    corpus = []
+    for entry in sorted(os.listdir(folder)):
+        if entry.lower().endswith((".png", ".jpg", ".jpeg", ".webp")):
+            with open(os.path.join(folder, entry), "rb") as fp:
+                corpus.append((entry, fp.read()))
+    return corpus
+
+
+def _analyze_seconds(service, name, data):
+    buffer = io.BytesIO(data)
+    buffer.name = name
+    start = time.perf_counter()
+    service.analyze_stream(buffer)
+    return time.perf_counter() - start
+
+
+def benchmark(corpus, preprocessor, vision_service=None):
+    print(f"{'arquivo':30} {'original':>10} {'preparado':>10} {'redução':>8} {'prep (ms)':>10}"
+          + (f" {'visão orig (s)':>15} {'visão prep (s)':>15}" if vision_service else ""))
+    total_original = total_prepared = 0
+    for name, data in corpus:
+        _, prepared, info = preprocessor(name, data)
+        total_original += info["original_bytes"]
+        total_prepared += info["prepared_bytes"]
+        line = (f"{name[:30]:30} {info['original_bytes'] / 1024:>8.0f}KB {info['prepared_bytes'] / 1024:>8.0f}KB "
+                f"{1 - info['prepared_bytes'] / info['original_bytes']:>8.0%} {info['seconds'] * 1000:>10.1f}")
+        if vision_service:
+            line += (f" {_analyze_seconds(vision_service, name, data):>15.2f}"
+                     f" {_analyze_seconds(vision_service, name, prepared):>15.2f}")
+        print(line)
+    if total_original:
+        print(f"Total: {total_original / 1024:.0f}KB -> {total_prepared / 1024:.0f}KB "
+              f"({1 - total_prepared / total_original:.0%} menor)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark do pré-processamento de capturas de tela")
+    parser.add_argument("folder", nargs="?", help="pasta com capturas (padrão: corpus sintético 4K)")
+    parser.add_argument("--max-dimension", type=int, default=DEFAULT_MAX_DIMENSION)
+    parser.add_argument("--format", default=DEFAULT_FORMAT, choices=sorted(FORMAT_EXTENSIONS))
+    parser.add_argument("--quality", type=int, default=DEFAULT_QUALITY)
+    parser.add_argument("--vision", action="store_true", help="mede também a latência do VisionService")
+    args = parser.parse_args()
+
+    corpus = _load_corpus(args.folder) if args.folder else _synthetic_screenshots()
+    service = None
+    if args.vision:
+        from nasajon.service.vision_service import VisionService
+        service = VisionService()
+    benchmark(corpus, ImagePreprocessor(args.max_dimension, args.format, args.quality), service)
@@ -0,0 +1,344 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from ingest_telemetry import IngestTelemetry
+from ingestion import empty_stats, merge_stats
+
+# --- INGESTÃO EM SEGUNDO PLANO ---
+# Cada ingestão vira um job num pool do processo (criado via st.cache_resource no app.py): o stream
+# do /ingest-pipeline é consumido fora do script da sessão, então fechar a aba ou reconectar o
+# websocket não interrompe o envio. A UI só lê fotos (snapshot) do job em reruns de fragmento.
+# Estado dos jobs (progresso, stats, relatório) e checkpoint de lotes concluídos por tenant ficam
+# em SQLite: depois de reiniciar o processo, os jobs que estavam rodando aparecem como
+# interrompidos e um novo envio do mesmo lote pula os lotes já gravados. Um job que termina sem
+# lotes falhos apaga os seus lotes do checkpoint (não há o que retomar).
+
+DEFAULT_JOBS_PATH = os.path.join(".cache", "ingest_jobs.sqlite")
+DEFAULT_JOB_WORKERS = 2
+DEFAULT_LOG_LINES = 200
+MAX_JOBS_LISTED = 20
+MAX_JOBS_STORED = 200
+SAVE_INTERVAL_SECONDS = 2.0
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_PARTIAL = "partial"  # terminou com lotes falhos (novo envio retoma)
+JOB_ERROR = "error"
+JOB_INTERRUPTED = "interrupted"  # processo reiniciado no meio do job
+ACTIVE_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+
+
+class IngestJob:
+    def __init__(self, job_id, tenant_id, label, total_tickets, options=None,
+                 created_at=None, log_lines=DEFAULT_LOG_LINES):
+        self.id = job_id
+        self.tenant_id = tenant_id
+        self.label = label
+        self.total_tickets = int(total_tickets)
+        self.options = dict(options or {})
+        self.created_at = created_at or time.time()
+        self.finished_at = None
+        self.status = JOB_QUEUED
+        self.progress = None  # (lote, atual, total, mensagem)
+        self.log = deque(maxlen=log_lines)
+        self.errors = []
+        self.notices = []
+        self.parse_errors = 0
+        self.failed_chunks = 0
+        self.chunk_stats = {}  # chunk_id -> stats dos lotes deste job (concluídos agora ou antes)
+        self.waiting = {}  # chunk -> (posição na fila do tenant, motivo)
+        self.throttles = 0
+        self.error = None
+        self.report = None
+        self.telemetry = None
+        self.future = None
+        self._summary = ""
+        # Escrito pela thread do job, lido pelas sessões
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.status in ACTIVE_STATUSES
+
+    @property
+    def stats(self):
+        s = empty_stats()
+        for chunk_stats in self.chunk_stats.values():
+            s = merge_stats(s, chunk_stats)
+        return s
+
+    # --- EVENTOS (THREAD DO JOB) ---
+    def record(self, event, checkpoint):
+        step = event.get("step")
+        msg = event.get("msg", "")
+        lote = f"[Lote {event.get('chunk', 0) + 1}]"
+        with self._lock:
+            self.telemetry.record(event)
+            if step == "chunk_waiting":
+                self.waiting[event["chunk"]] = (event["position"], msg)
+            elif step == "chunk_started":
+                self.waiting.pop(event["chunk"], None)
+            elif step == "chunk_throttled":
+                self.throttles += 1
+                self.log.append(f"🚦 {lote} {msg}")
+            elif step == "init":
+                self.log.append(f"ℹ️ {lote} {msg}")
+            elif step == "progress":
+                self.progress = (lote, event.get("current", 0), event.get("total", 1), msg)
+            elif step == "log":
+                # Blocos de código (JSON de debug) entram no buffer sem as crases
+                self.log.append(f"{lote} {msg.replace('```json', '').replace('```', '').strip()}")
+            elif step == "error":
+                self.errors.append(f"{lote} {msg}")
+            elif step == "parse_errors":
+                self.parse_errors += event["count"]
+                self.log.append(f"⚠️ {lote} {event['count']} linha(s) inválida(s) no stream: "
+                                + " | ".join(event.get("samples", [])))
+            elif step == "chunk_done":
+                checkpoint[event["chunk_id"]] = event["stats"]
+                self.chunk_stats[event["chunk_id"]] = event["stats"]
+            elif step == "chunk_failed":
+                self.waiting.pop(event["chunk"], None)
+                self.failed_chunks += 1
+                self.errors.append(f"{lote} falhou: {msg}")
+            elif step == "chunk_skipped":
+                self.log.append(f"⏭️ {lote} já concluído anteriormente.")
+                self.chunk_stats[event["chunk_id"]] = checkpoint.get(event["chunk_id"], {})
+                self.progress = (lote, event.get("current", 0), event.get("total", 1), "Lote já concluído")
+            elif step == "tickets_skipped":
+                self.log.append(f"🗃️ {msg}")
+                self.progress = ("[Dedupe]", event.get("current", 0), event.get("total", 1), msg)
+
+    def notice(self, text):
+        with self._lock:
+            self.notices.append(text)
+
+    # --- FOTO PARA A UI E PARA O SQLITE ---
+    def snapshot(self):
+        with self._lock:
+            summary = self.telemetry.summary_line() if self.telemetry else self._summary
+            return {
+                "id": self.id,
+                "tenant_id": self.tenant_id,
+                "label": self.label,
+                "status": self.status,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+                "total_tickets": self.total_tickets,
+                "options": dict(self.options),
+                "progress": list(self.progress) if self.progress else None,
+                "log": list(self.log),
+                "errors": list(self.errors),
+                "notices": list(self.notices),
+                "parse_errors": self.parse_errors,
+                "failed_chunks": self.failed_chunks,
+                "chunks": len(self.chunk_stats),
+                "waiting": sorted(self.waiting.values()),
+                "throttles": self.throttles,
+                "chunk_stats": dict(self.chunk_stats),
+                "stats": self.stats,
+                "summary": summary,
+                "error": self.error,
+                "report": self.report,
+            }
+
+    @classmethod
+    def from_snapshot(cls, data, log_lines=DEFAULT_LOG_LINES):
+        job = cls(data["id"], data["tenant_id"], data.get("label", ""), data.get("total_tickets", 0),
+                  options=data.get("options"), created_at=data.get("created_at"), log_lines=log_lines)
+        job.status = data.get("status", JOB_INTERRUPTED)
+        job.finished_at = data.get("finished_at")
+        job.progress = tuple(data["progress"]) if data.get("progress") else None
+        job.log.extend(data.get("log", []))
+        job.errors = list(data.get("errors", []))
+        job.notices = list(data.get("notices", []))
+        job.parse_errors = data.get("parse_errors", 0)
+        job.failed_chunks = data.get("failed_chunks", 0)
+        job.throttles = data.get("throttles", 0)
+        job.chunk_stats = dict(data.get("chunk_stats", {}))
+        job.error = data.get("error")
+        job.report = data.get("report")
+        job._summary = data.get("summary", "")
+        return job
+
+
+class IngestJobRegistry:
+    def __init__(self, path=DEFAULT_JOBS_PATH, max_workers=DEFAULT_JOB_WORKERS, log_lines=DEFAULT_LOG_LINES):
+        self.path = path
+        self.log_lines = log_lines
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=max(int(max_workers), 1), thread_name_prefix="ingest")
+        self._jobs = {}
+        # Compartilhado entre sessões/threads do processo: SQLite e dict serializados pelo lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ingest_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    tenant_id TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    status TEXT NOT NULL,
+                    data TEXT NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+                    tenant_id TEXT NOT NULL,
+                    chunk_id TEXT NOT NULL,
+                    stats TEXT NOT NULL,
+                    done_at REAL NOT NULL,
+                    PRIMARY KEY (tenant_id, chunk_id)
+                )
+                """
+            )
+        self._restore()
+
+    def _restore(self):
+        # Jobs de execuções anteriores do processo: os que não terminaram foram interrompidos
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM ingest_jobs ORDER BY created_at DESC LIMIT ?", (MAX_JOBS_STORED,)
+            ).fetchall()
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM ingest_jobs WHERE job_id NOT IN "
+                    "(SELECT job_id FROM ingest_jobs ORDER BY created_at DESC LIMIT ?)", (MAX_JOBS_STORED,)
+                )
+        for (data,) in rows:
+            job = IngestJob.from_snapshot(json.loads(data), log_lines=self.log_lines)
+            if job.active:
+                job.status = JOB_INTERRUPTED
+                job.notices.append("Processo reiniciado durante a execução: envie o lote de novo para retomar.")
+                self._save(job)
+            self._jobs[job.id] = job
+        with self._lock:
+            self._prune()
+
+    # --- CHECKPOINT POR TENANT ---
+    def checkpoint(self, tenant_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id, stats FROM ingest_checkpoints WHERE tenant_id = ?", (tenant_id,)
+            ).fetchall()
+        return {chunk_id: json.loads(stats) for chunk_id, stats in rows}
+
+    def checkpoint_size(self, tenant_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM ingest_checkpoints WHERE tenant_id = ?", (tenant_id,)
+            ).fetchone()
+        return row[0]
+
+    def clear_checkpoint(self, tenant_id, chunk_ids=None):
+        # chunk_ids=None apaga o checkpoint inteiro do tenant
+        with self._lock, self._conn:
+            if chunk_ids is None:
+                self._conn.execute("DELETE FROM ingest_checkpoints WHERE tenant_id = ?", (tenant_id,))
+            else:
+                self._conn.executemany(
+                    "DELETE FROM ingest_checkpoints WHERE tenant_id = ? AND chunk_id = ?",
+                    [(tenant_id, chunk_id) for chunk_id in chunk_ids]
+                )
+
+    def _save_chunk(self, tenant_id, chunk_id, stats):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ingest_checkpoints (tenant_id, chunk_id, stats, done_at) VALUES (?, ?, ?, ?)",
+                (tenant_id, chunk_id, json.dumps(stats), time.time())
+            )
+
+    def _save(self, job):
+        snapshot = job.snapshot()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ingest_jobs (job_id, tenant_id, created_at, status, data) VALUES (?, ?, ?, ?, ?)",
+                (job.id, job.tenant_id, job.created_at, job.status, json.dumps(snapshot, ensure_ascii=False))
+            )
+
+    # --- EXECUÇÃO ---
+    def submit(self, tenant_id, label, total_tickets, make_runner, options=None, dedupe_counter=None,
+               on_finish=None):
+        # make_runner(done_ids) monta o ChunkedIngestion; chamado na thread do job, com o checkpoint
+        # lido no início da execução (um job enfileirado pula os lotes gravados pelos anteriores)
+        job = IngestJob(uuid.uuid4().hex[:12], tenant_id, label, total_tickets,
+                        options=options, log_lines=self.log_lines)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._save(job)
+        job.future = self._pool.submit(self._run, job, make_runner, dedupe_counter, on_finish)
+        return job
+
+    def _run(self, job, make_runner, dedupe_counter, on_finish):
+        job.telemetry = IngestTelemetry(job.total_tickets)
+        job.status = JOB_RUNNING
+        checkpoint = self.checkpoint(job.tenant_id)
+        if job.options.get("clear_db") and checkpoint:
+            job.notice("Retomada em andamento: o Reset Full foi ignorado para não apagar os lotes já gravados.")
+        ultimo_save = time.time()
+        try:
+            for event in make_runner(checkpoint.keys()).run():
+                job.record(event, checkpoint)
+                if event.get("step") == "chunk_done":
+                    self._save_chunk(job.tenant_id, event["chunk_id"], event["stats"])
+                if time.time() - ultimo_save >= SAVE_INTERVAL_SECONDS:
+                    self._save(job)
+                    ultimo_save = time.time()
+            job.status = JOB_PARTIAL if job.failed_chunks else JOB_DONE
+            if job.status == JOB_DONE:
+                # Só os lotes deste job: outro job do tenant pode estar no meio de uma retomada
+                self.clear_checkpoint(job.tenant_id, list(job.chunk_stats))
+        except Exception as e:
+            job.error = str(e)
+            job.status = JOB_ERROR
+        finally:
+            if dedupe_counter is not None and dedupe_counter.known:
+                job.notice(f"🗃️ Dedupe local: {dedupe_counter.known} de {dedupe_counter.checked} tickets "
+                           + ("já tinham sido aceitos e não foram enviados."
+                              if job.options.get("dedupe_mode") == "drop"
+                              else "já constam no índice (enviados mesmo assim)."))
+            with job._lock:
+                job.telemetry.finish()
+                job.finished_at = job.telemetry.finished_at
+                job.report = job.telemetry.report(job.stats)
+            self._save(job)
+            if on_finish is not None:
+                try:
+                    on_finish(job)
+                except Exception:
+                    pass
+
+    def _prune(self):
+        # Mantém em memória os jobs ativos e os MAX_JOBS_LISTED mais recentes
+        finished = sorted((j for j in self._jobs.values() if not j.active), key=lambda j: j.created_at)
+        for job in finished[:max(len(self._jobs) - MAX_JOBS_LISTED, 0)]:
+            del self._jobs[job.id]
+
+    # --- CONSULTA (THREAD DA UI) ---
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_position(self, job_id):
+        # Posição entre os jobs que esperam um worker do pool (FIFO, por ordem de envio)
+        with self._lock:
+            fila = sorted((j for j in self._jobs.values() if j.status == JOB_QUEUED), key=lambda j: j.created_at)
+        ids = [j.id for j in fila]
+        return ids.index(job_id) + 1 if job_id in ids else None
+
+    def jobs(self, tenant_id):
+        with self._lock:
+            jobs = [j for j in self._jobs.values() if j.tenant_id == tenant_id]
+        return sorted(jobs, key=lambda j: j.created_at, reverse=True)[:MAX_JOBS_LISTED]
@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import deque
+
+# --- LIMITE DE INGESTÃO POR TENANT ---
+# Agendador do processo (criado via st.cache_resource no app.py), compartilhado por todas as
+# sessões e jobs: antes de cada POST ao /ingest-pipeline o lote pede uma vaga ao tenant.
+# - no máximo `max_in_flight` lotes em voo por tenant;
+# - balde de tokens de tickets/minuto (capacidade de um minuto, reposição contínua);
+# - fila FIFO por tenant: só o primeiro da fila pode entrar, os outros veem sua posição;
+# - 429/503 do servidor: backoff exponencial (respeita Retry-After) e o limite de lotes em voo
+#   cai pela metade; cada lote aceito devolve uma vaga (aumento aditivo até o máximo).
+
+DEFAULT_MAX_IN_FLIGHT = 4
+DEFAULT_TICKETS_PER_MINUTE = 600
+THROTTLE_STATUS = (429, 503)
+MAX_THROTTLE_RETRIES = 5
+MIN_BACKOFF_SECONDS = 2.0
+MAX_BACKOFF_SECONDS = 120.0
+WAIT_SLICE_SECONDS = 0.5
+
+WAIT_TURN = "turn"
+WAIT_BACKOFF = "backoff"
+WAIT_IN_FLIGHT = "in_flight"
+WAIT_RATE = "rate"
+WAIT_REASONS = {
+    WAIT_TURN: "aguardando a vez na fila do tenant",
+    WAIT_BACKOFF: "servidor sobrecarregado (backoff após 429/503)",
+    WAIT_IN_FLIGHT: "limite de lotes em voo do tenant",
+    WAIT_RATE: "limite de tickets/minuto do tenant",
+}
+
+
+def retry_after_seconds(response):
+    # Só o formato em segundos; data HTTP é ignorada (vale o backoff exponencial)
+    try:
+        return max(float(response.headers.get("Retry-After", "")), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class _TenantState:
+    def __init__(self, max_in_flight, tickets_per_minute, now):
+        self.limit = max_in_flight
+        self.in_flight = 0
+        self.capacity = float(tickets_per_minute)
+        self.rate = tickets_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = now
+        self.queue = deque()
+        self.backoff = 0.0
+        self.blocked_until = 0.0
+        self.throttles = 0
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def blocked(self, cost, now):
+        # (motivo, segundos até poder tentar de novo); segundos=None: espera uma liberação
+        if now < self.blocked_until:
+            return WAIT_BACKOFF, self.blocked_until - now
+        if self.in_flight >= self.limit:
+            return WAIT_IN_FLIGHT, None
+        if self.tokens < cost:
+            return WAIT_RATE, (cost - self.tokens) / self.rate
+        return None, 0.0
+
+
+class IngestScheduler:
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT, tickets_per_minute=DEFAULT_TICKETS_PER_MINUTE,
+                 clock=time.monotonic):
+        self.max_in_flight = max(int(max_in_flight), 1)
+        self.tickets_per_minute = max(int(tickets_per_minute), 1)
+        self.clock = clock
+        self._tenants = {}
+        self._cond = threading.Condition()
+
+    def _tenant(self, tenant_id, now):
+        state = self._tenants.get(tenant_id)
+        if state is None:
+            state = self._tenants[tenant_id] = _TenantState(self.max_in_flight, self.tickets_per_minute, now)
+        return state
+
+    def acquire(self, tenant_id, tickets, on_wait=None, urgent=False):
+        # Bloqueia a thread do lote até a vez dele. on_wait(posição, motivo) é chamado quando
+        # a posição na fila ou o motivo da espera mudam. urgent=True (reenvio após 429/503)
+        # entra na frente da fila para não perder o lugar.
+        waiter = object()
+        with self._cond:
+            state = self._tenant(tenant_id, self.clock())
+            if urgent:
+                state.queue.appendleft(waiter)
+            else:
+                state.queue.append(waiter)
+            cost = min(float(tickets), state.capacity)
+            ultimo = None
+            try:
+                while True:
+                    now = self.clock()
+                    state.refill(now)
+                    position = state.queue.index(waiter)
+                    if position == 0:
+                        reason, wait = state.blocked(cost, now)
+                        if reason is None:
+                            state.queue.popleft()
+                            state.in_flight += 1
+                            state.tokens -= cost
+                            # O próximo da fila reavalia (pode haver vaga para ele também)
+                            self._cond.notify_all()
+                            return
+                    else:
+                        reason, wait = WAIT_TURN, None
+                    if on_wait is not None and (position, reason) != ultimo:
+                        on_wait(position + 1, reason)
+                        ultimo = (position, reason)
+                    self._cond.wait(timeout=min(wait, WAIT_SLICE_SECONDS) if wait else WAIT_SLICE_SECONDS)
+            except BaseException:
+                if waiter in state.queue:
+                    state.queue.remove(waiter)
+                    self._cond.notify_all()
+                raise
+
+    def release(self, tenant_id, throttled=False, retry_after=None):
+        # Devolve a vaga do lote. Com throttled=True devolve o atraso aplicado ao tenant (s).
+        with self._cond:
+            now = self.clock()
+            state = self._tenant(tenant_id, now)
+            state.in_flight = max(state.in_flight - 1, 0)
+            delay = 0.0
+            if throttled:
+                state.throttles += 1
+                state.backoff = min(max(state.backoff * 2, MIN_BACKOFF_SECONDS), MAX_BACKOFF_SECONDS)
+                delay = max(state.backoff, retry_after or 0.0)
+                state.blocked_until = max(state.blocked_until, now + delay)
+                state.limit = max(state.limit // 2, 1)
+            else:
+                state.backoff = state.backoff / 2 if state.backoff > MIN_BACKOFF_SECONDS else 0.0
+                state.limit = min(state.limit + 1, self.max_in_flight)
+            self._cond.notify_all()
+            return delay
+
+    def status(self, tenant_id):
+        with self._cond:
+            now = self.clock()
+            state = self._tenant(tenant_id, now)
+            state.refill(now)
+            return {
+                "in_flight": state.in_flight,
+                "limit": state.limit,
+                "max_in_flight": self.max_in_flight,
+                "queued": len(state.queue),
+                "tokens": int(state.tokens),
+                "tickets_per_minute": self.tickets_per_minute,
+                "backoff_s": max(state.blocked_until - now, 0.0),
+                "throttles": state.throttles,
+            }
@@ -0,0 +1,158 @@
+import time
+
+# --- TELEMETRIA DA INGESTÃO ---
+# Consome os mesmos eventos que a UI (com o "ts" carimbado pelo worker ao receber cada linha)
+# e calcula: tickets/s, ETA, latência por ticket (p50/p95) e tempo por etapa do pipeline.
+# A etapa vem do campo "stage" do evento, quando o servidor envia; senão é inferida pelo texto.
+# O tempo entre dois eventos de um lote é atribuído à etapa do primeiro. Com lotes em paralelo,
+# o tempo por etapa é somado entre os lotes (tempo de trabalho, não de relógio).
+
+STAGES = (
+    ("filtro_sistema", "Filtro de sistema", ("filtro", "filtrad", "sistema")),
+    ("classificacao_ia", "Classificação IA", ("classific", "llm", "útil", "util")),
+    ("enriquecimento", "Enriquecimento do grafo", ("enriquec", "extra", "entidade", "embedding", "taxonomia")),
+    ("gravacao_neo4j", "Gravação Neo4j", ("neo4j", "grava", "salv", "cypher", "persist")),
+)
+STAGE_LABELS = {key: label for key, label, _ in STAGES}
+
+
+def detect_stage(event):
+    stage = event.get("stage")
+    if stage:
+        return stage
+    msg = str(event.get("msg", "")).lower()
+    for key, _, keywords in STAGES:
+        if any(k in msg for k in keywords):
+            return key
+    return None
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "-"
+    if seconds < 1:
+        return f"{seconds * 1000:.0f}ms"
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    minutes, secs = divmod(int(seconds), 60)
+    return f"{minutes}m{secs:02d}s" if minutes < 60 else f"{minutes // 60}h{minutes % 60:02d}m"
+
+
+class IngestTelemetry:
+    def __init__(self, total_tickets, started_at=None):
+        self.total_tickets = max(int(total_tickets), 1)
+        self.started_at = started_at or time.time()
+        self.finished_at = None
+        self.done_tickets = 0
+        self.skipped_tickets = 0
+        self.ticket_seconds = []
+        self.stage_seconds = {}
+        self.events = 0
+        self._chunks = {}  # chunk -> {"ts", "stage", "current"}
+
+    # --- COLETA ---
+    def record(self, event):
+        step = event.get("step")
+        chunk = event.get("chunk")
+        ts = event.get("ts") or time.time()
+        self.events += 1
+
+        if step == "chunk_started":
+            self._chunks[chunk] = {"ts": ts, "stage": None, "current": 0, "ticket_ts": ts}
+            return
+        if step in ("chunk_skipped", "tickets_skipped"):
+            self.skipped_tickets += event.get("size", 0)
+            return
+
+        state = self._chunks.setdefault(chunk, {"ts": ts, "stage": None, "current": 0, "ticket_ts": ts})
+        self._close_interval(state, ts)
+
+        if step == "progress":
+            current = event.get("chunk_current", 0)
+            novos = current - state["current"]
+            if novos > 0:
+                per_ticket = (ts - state["ticket_ts"]) / novos
+                self.ticket_seconds.extend([per_ticket] * novos)
+                state["current"] = current
+                state["ticket_ts"] = ts
+
+        stage = detect_stage(event)
+        if stage:
+            state["stage"] = stage
+
+        if step in ("chunk_done", "chunk_failed"):
+            if step == "chunk_done":
+                self.done_tickets += event.get("size", 0)
+            self._chunks.pop(chunk, None)
+
+    def _close_interval(self, state, ts):
+        if state["stage"]:
+            self.stage_seconds[state["stage"]] = self.stage_seconds.get(state["stage"], 0.0) + max(ts - state["ts"], 0.0)
+        state["ts"] = ts
+
+    def finish(self):
+        self.finished_at = time.time()
+
+    # --- MÉTRICAS ---
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def in_flight_tickets(self):
+        return sum(state["current"] for state in self._chunks.values())
+
+    @property
+    def processed(self):
+        return self.done_tickets + self.in_flight_tickets
+
+    @property
+    def throughput(self):
+        return self.processed / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        restantes = self.total_tickets - self.skipped_tickets - self.processed
+        if restantes <= 0:
+            return 0.0
+        return restantes / self.throughput if self.throughput > 0 else None
+
+    def summary_line(self):
+        return (f"⚡ {self.throughput:.2f} tickets/s · ⏱️ {format_seconds(self.elapsed)} · "
+                f"ETA {format_seconds(self.eta)} · p50 {format_seconds(percentile(self.ticket_seconds, 50))} · "
+                f"p95 {format_seconds(percentile(self.ticket_seconds, 95))}")
+
+    def stage_rows(self):
+        total = sum(self.stage_seconds.values()) or 1.0
+        ordem = [key for key, _, _ in STAGES] + sorted(k for k in self.stage_seconds if k not in STAGE_LABELS)
+        return [{
+            "Etapa": STAGE_LABELS.get(key, key),
+            "Tempo somado (s)": round(self.stage_seconds[key], 2),
+            "% do tempo": round(100 * self.stage_seconds[key] / total, 1),
+        } for key in ordem if key in self.stage_seconds]
+
+    def report(self, stats=None):
+        return {
+            "inicio": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started_at)),
+            "duracao_s": round(self.elapsed, 2),
+            "tickets_total": self.total_tickets,
+            "tickets_processados": self.processed,
+            "tickets_pulados": self.skipped_tickets,
+            "tickets_por_segundo": round(self.throughput, 3),
+            "latencia_ticket_s": {
+                "p50": percentile(self.ticket_seconds, 50),
+                "p95": percentile(self.ticket_seconds, 95),
+                "amostras": len(self.ticket_seconds),
+            },
+            "etapas": self.stage_rows(),
+            "eventos": self.events,
+            "stats": stats or {},
+        }
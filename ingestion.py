@@ -0,0 +1,228 @@
+import hashlib
+import json
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from ingest_scheduler import MAX_THROTTLE_RETRIES, THROTTLE_STATUS, WAIT_REASONS, retry_after_seconds
+from ndjson_reader import NdjsonReader
+
+# --- INGESTÃO EM LOTES (CHUNKS) ---
+# O lote selecionado é dividido em chunks enviados em paralelo (pool limitado) ao /ingest-pipeline.
+# Cada chunk tem um ID derivado dos tickets que contém, então um re-clique no botão
+# pula os chunks já concluídos (checkpoint guardado pelo registro de jobs, ingest_jobs.py).
+
+STATS_KEYS = (
+    "total_recebido",
+    "ja_existia",
+    "filtrado_sistema",
+    "classificado_inutil",
+    "classificado_util",
+    "salvo_sucesso",
+    "erro_processamento",
+)
+
+DEFAULT_CHUNK_SIZE = 50
+DEFAULT_MAX_WORKERS = 3
+
+
+def ticket_key(item):
+    t = item.get("ticket", {}) or {}
+    key = t.get("ticket_id") or t.get("numeroprotocolo")
+    if key:
+        return str(key)
+    # Ticket sem identificador: usa o próprio conteúdo
+    return hashlib.sha1(json.dumps(item, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def chunk_id_for(tickets):
+    digest = hashlib.sha1("|".join(ticket_key(t) for t in tickets).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def iter_chunks(tickets, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Lazy: funciona com listas e com geradores (leitura em streaming do arquivo)
+    it = iter(tickets)
+    index = 0
+    while True:
+        chunk = list(islice(it, chunk_size))
+        if not chunk:
+            return
+        yield index, chunk_id_for(chunk), chunk
+        index += 1
+
+
+def empty_stats():
+    return {k: 0 for k in STATS_KEYS}
+
+
+def merge_stats(total, partial):
+    merged = dict(total)
+    for k, v in (partial or {}).items():
+        if isinstance(v, (int, float)):
+            merged[k] = merged.get(k, 0) + v
+    return merged
+
+
+class ChunkedIngestion:
+    def __init__(self, api, path, chunks, total_tickets, clear_db=False,
+                 max_workers=DEFAULT_MAX_WORKERS, done_ids=(), on_chunk_done=None,
+                 scheduler=None, tenant_id=None, on_db_cleared=None, dedupe_counter=None):
+        self.api = api
+        self.path = path
+        self.chunks = chunks
+        self.total_tickets = max(int(total_tickets), 1)
+        self.clear_db = clear_db
+        self.max_workers = max(int(max_workers), 1)
+        self.done_ids = set(done_ids)
+        # Callback opcional (chunk, stats) chamado na thread do worker ao concluir um chunk
+        self.on_chunk_done = on_chunk_done
+        # Callback opcional chamado quando o lote com clear_db termina (o banco foi apagado de fato)
+        self.on_db_cleared = on_db_cleared
+        # IngestScheduler opcional: limite por tenant e reenvio com backoff em 429/503
+        self.scheduler = scheduler
+        self.tenant_id = tenant_id
+        # DedupeCounter opcional do filtro aplicado em `chunks`: os tickets descartados entram no
+        # progresso como pulados, para o total (contado antes do dedupe) fechar em 100%
+        self.dedupe_counter = dedupe_counter
+
+    def _send_chunk(self, events, index, chunk_id, chunk, clear_db):
+        base = {"chunk": index, "chunk_id": chunk_id, "size": len(chunk)}
+
+        def _aguardando(position, reason):
+            events.put({**base, "step": "chunk_waiting", "position": position, "reason": reason,
+                        "msg": WAIT_REASONS.get(reason, reason), "ts": time.time()})
+
+        for tentativa in range(MAX_THROTTLE_RETRIES + 1):
+            if self.scheduler is not None:
+                # Vaga no limite do tenant (compartilhado entre sessões); reenvios voltam pela frente da fila
+                self.scheduler.acquire(self.tenant_id, len(chunk), on_wait=_aguardando, urgent=tentativa > 0)
+            throttle = None
+            try:
+                throttle = self._attempt(events, base, chunk, clear_db,
+                                         can_retry=self.scheduler is not None and tentativa < MAX_THROTTLE_RETRIES)
+            finally:
+                if self.scheduler is not None:
+                    delay = self.scheduler.release(self.tenant_id, throttled=throttle is not None,
+                                                   retry_after=throttle[1] if throttle else None)
+            if throttle is None:
+                return
+            events.put({**base, "step": "chunk_throttled", "status": throttle[0], "delay": delay,
+                        "msg": f"HTTP {throttle[0]}: servidor sobrecarregado, nova tentativa em {delay:.0f}s "
+                               f"({tentativa + 1}/{MAX_THROTTLE_RETRIES})", "ts": time.time()})
+
+    def _attempt(self, events, base, chunk, clear_db, can_retry=False):
+        # Um POST do lote. Devolve (status, retry_after) quando o servidor pediu para esperar
+        # (429/503) e ainda há tentativas; senão emite chunk_done/chunk_failed e devolve None.
+        final_stats = None
+        # "ts": carimbo de quando o worker recebeu o evento (base da telemetria)
+        events.put({**base, "step": "chunk_started", "ts": time.time()})
+        try:
+            response = self.api.post(
+                self.path,
+                json={"tickets": chunk, "clear_db": clear_db},
+                stream=True
+            )
+            if can_retry and response.status_code in THROTTLE_STATUS:
+                retry_after = retry_after_seconds(response)
+                response.close()
+                return response.status_code, retry_after
+            if response.status_code != 200:
+                events.put({**base, "step": "chunk_failed",
+                            "msg": f"HTTP {response.status_code}: {response.text[:300]}", "ts": time.time()})
+                return None
+
+            reader = NdjsonReader(response)
+            for event in reader:
+                if event.get("step") == "final":
+                    final_stats = event.get("stats")
+                else:
+                    events.put({**event, **base, "ts": time.time()})
+
+            if reader.parse_errors:
+                # Linhas inválidas não derrubam o lote, mas aparecem na UI
+                events.put({**base, "step": "parse_errors", "count": reader.parse_errors,
+                            "samples": reader.error_samples, "ts": time.time()})
+
+            if final_stats is None:
+                events.put({**base, "step": "chunk_failed", "msg": "Stream encerrado sem evento final.",
+                            "ts": time.time()})
+            else:
+                if clear_db and self.on_db_cleared:
+                    self.on_db_cleared()
+                if self.on_chunk_done:
+                    self.on_chunk_done(chunk, final_stats)
+                events.put({**base, "step": "chunk_done", "stats": final_stats, "ts": time.time()})
+        except Exception as e:
+            events.put({**base, "step": "chunk_failed", "msg": str(e), "ts": time.time()})
+        return None
+
+    def run(self):
+        # Gerador de eventos para a UI. Os workers nunca tocam no Streamlit:
+        # tudo passa pela fila e é consumido na thread do script.
+        events = queue.Queue()
+        pending = iter(self.chunks)
+        in_flight = 0
+        progress = {}  # chunk -> tickets concluídos dentro do chunk
+        done_tickets = 0
+        dropped = 0
+
+        # Reset do banco só faz sentido antes do primeiro chunk e nunca numa retomada. Enquanto
+        # nenhum chunk com clear_db for concluído, vai um chunk por vez e o próximo leva o clear_db
+        # (se o primeiro falhar, os demais não podem cair no banco antigo)
+        clear_pending = self.clear_db and not self.done_ids
+        limit = 1 if clear_pending else self.max_workers
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while True:
+                while in_flight < limit:
+                    nxt = next(pending, None)
+                    # Montar o chunk consome o filtro de dedupe: conta os descartados até aqui
+                    if self.dedupe_counter is not None and self.dedupe_counter.dropped > dropped:
+                        novos = self.dedupe_counter.dropped - dropped
+                        dropped = self.dedupe_counter.dropped
+                        done_tickets += novos
+                        yield {"step": "tickets_skipped", "size": novos,
+                               "current": min(done_tickets + sum(progress.values()), self.total_tickets),
+                               "total": self.total_tickets,
+                               "msg": f"{novos} ticket(s) já aceitos pulados pelo dedupe local."}
+                    if nxt is None:
+                        break
+                    index, chunk_id, chunk = nxt
+                    if chunk_id in self.done_ids:
+                        done_tickets += len(chunk)
+                        yield {"step": "chunk_skipped", "chunk": index, "chunk_id": chunk_id, "size": len(chunk),
+                               "current": min(done_tickets + sum(progress.values()), self.total_tickets),
+                               "total": self.total_tickets}
+                        continue
+                    pool.submit(self._send_chunk, events, index, chunk_id, chunk, clear_pending)
+                    in_flight += 1
+
+                if in_flight == 0:
+                    return
+
+                event = events.get()
+                step = event.get("step")
+
+                if step in ("chunk_done", "chunk_failed"):
+                    in_flight -= 1
+                    progress.pop(event["chunk"], None)
+                    if step == "chunk_done":
+                        done_tickets += event["size"]
+                        # Banco apagado de fato: os próximos chunks seguem em paralelo, sem clear_db
+                        clear_pending = False
+                    limit = 1 if clear_pending else self.max_workers
+                    yield event
+                    continue
+
+                if step == "progress":
+                    # Converte o progresso local do chunk em progresso global do lote
+                    # (o local segue em "chunk_current" para a telemetria)
+                    progress[event["chunk"]] = event.get("current", 0)
+                    current = min(done_tickets + sum(progress.values()), self.total_tickets)
+                    yield {**event, "current": current, "total": self.total_tickets,
+                           "chunk_current": event.get("current", 0)}
+                    continue
+
+                yield event
@@ -0,0 +1,85 @@
+import json
+import zlib
+
+# --- HISTÓRICO COMPACTO DO CHAT ---
+# Cada mensagem é um registro com __slots__ (papel, texto, agente, marcador de cache).
+# Os metadados do agente ("Bastidores") ficam fora da lista, serializados e comprimidos,
+# e só são descomprimidos quando o usuário pede para vê-los.
+# O histórico é limitado a MAX_STORED_MESSAGES: as mais antigas saem, e `offset` conta quantas
+# já saíram (o cursor do servidor continua absoluto).
+# Os registros aceitam msg["content"] / msg.get("agent"), como os dicts usados antes.
+
+MAX_STORED_MESSAGES = 400
+DEFAULT_VISIBLE_MESSAGES = 30
+
+
+class ChatMessage:
+    __slots__ = ("id", "role", "content", "agent", "cached", "has_debug")
+
+    def __init__(self, msg_id, role, content, agent=None, cached=None, has_debug=False):
+        self.id = msg_id
+        self.role = role
+        self.content = content
+        self.agent = agent
+        self.cached = cached
+        self.has_debug = has_debug
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        return default if value is None else value
+
+    def __repr__(self):
+        return f"ChatMessage({self.role!r}, {self.content[:40]!r})"
+
+
+class MessageStore:
+    def __init__(self, max_messages=MAX_STORED_MESSAGES):
+        self.max_messages = max_messages
+        self._messages = []
+        self._metadata = {}  # id -> JSON comprimido
+        self._next_id = 0
+        self.offset = 0
+
+    def append(self, message):
+        # Aceita o dict do app: {"role", "content", "debug"?, "agent"?, "cached"?}
+        debug = message.get("debug")
+        record = ChatMessage(
+            self._next_id, message["role"], message["content"],
+            agent=message.get("agent"), cached=message.get("cached"), has_debug=debug is not None
+        )
+        if debug is not None:
+            raw = json.dumps(debug, ensure_ascii=False, default=str).encode("utf-8")
+            self._metadata[record.id] = zlib.compress(raw)
+        self._next_id += 1
+        self._messages.append(record)
+
+        excess = len(self._messages) - self.max_messages
+        if excess > 0:
+            for old in self._messages[:excess]:
+                self._metadata.pop(old.id, None)
+            del self._messages[:excess]
+            self.offset += excess
+        return record
+
+    def metadata(self, message):
+        blob = self._metadata.get(message.id)
+        return json.loads(zlib.decompress(blob).decode("utf-8")) if blob is not None else {}
+
+    def tail(self, count):
+        # (posição absoluta, mensagem) das últimas `count` mensagens
+        start = max(len(self._messages) - count, 0)
+        return [(self.offset + i, m) for i, m in enumerate(self._messages[start:], start)]
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __iter__(self):
+        return iter(self._messages)
+
+    def __getitem__(self, index):
+        return self._messages[index]
@@ -0,0 +1,54 @@
+import codecs
+import json
+
+# --- LEITOR DE STREAM NDJSON ---
+# Usado pelo /ingest-pipeline (um JSON por linha). Lê o corpo em blocos grandes (em respostas
+# chunked o requests entrega cada bloco assim que chega, sem esperar encher o buffer), decodifica
+# UTF-8 de forma incremental (caracteres multibyte partidos entre blocos não quebram a linha)
+# e conta as linhas inválidas em vez de descartá-las em silêncio.
+
+READ_CHUNK_SIZE = 64 * 1024
+MAX_ERROR_SAMPLES = 5
+
+
+class NdjsonReader:
+    def __init__(self, response, chunk_size=READ_CHUNK_SIZE):
+        self.response = response
+        self.chunk_size = chunk_size
+        self.lines = 0
+        self.parse_errors = 0
+        self.error_samples = []
+
+    def _lines(self):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        buffer = ""
+        for block in self.response.iter_content(chunk_size=self.chunk_size):
+            buffer += decoder.decode(block)
+            if "\n" not in buffer:
+                continue
+            *complete, buffer = buffer.split("\n")
+            yield from complete
+        buffer += decoder.decode(b"", final=True)
+        if buffer:
+            yield buffer
+
+    def __iter__(self):
+        for line in self._lines():
+            line = line.strip()
+            if not line:
+                continue
+            self.lines += 1
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError as e:
+                self._parse_error(line, e)
+                continue
+            if not isinstance(event, dict):
+                self._parse_error(line, "linha não é um objeto JSON")
+                continue
+            yield event
+
+    def _parse_error(self, line, error):
+        self.parse_errors += 1
+        if len(self.error_samples) < MAX_ERROR_SAMPLES:
+            self.error_samples.append(f"{error}: {line[:120]}")
@@ -0,0 +1,376 @@
+# --- ÁRVORE DE TAXONOMIA ---
+# Índice pai -> filhos montado uma vez por carga (O(n)), com profundidade, caminho
+# ("Sistema > Módulo > Funcionalidade"), detecção de órfãos e de ciclos.
+# Criação/edição/remoção atualizam o índice localmente, sem refazer o fetch.
+
+import unicodedata
+
+MAX_DEPTH = 50
+
+
+class TaxonomyTree:
+    def __init__(self, nodes):
+        # Cópia rasa: a lista recebida pode ser compartilhada pelo cache de GET condicional
+        self.nodes = {n["id"]: dict(n) for n in nodes}
+        self.children = {}
+        for n in self.nodes.values():
+            self.children.setdefault(n.get("parent_id"), []).append(n["id"])
+        self._rebuild()
+
+    # --- CONSTRUÇÃO ---
+    def _walk(self, root_id, level, visited, path_prefix):
+        # DFS iterativa (sem recursão) com limite de profundidade
+        stack = [(root_id, level, path_prefix)]
+        while stack:
+            node_id, depth, prefix = stack.pop()
+            if node_id in visited:
+                continue
+            visited.add(node_id)
+            node = self.nodes[node_id]
+            path = f"{prefix} > {node['name']}" if prefix else node["name"]
+            self.depth[node_id] = depth
+            self.paths[node_id] = path
+            self.order.append(node_id)
+            if depth >= MAX_DEPTH:
+                continue
+            # reversed para manter a ordem original dos filhos na pilha
+            for child_id in reversed(self.children.get(node_id, [])):
+                stack.append((child_id, depth + 1, path))
+
+    def _rebuild(self):
+        self.order = []
+        self.depth = {}
+        self.paths = {}
+        self.cycles = set()
+        self.orphans = set()
+        visited = set()
+
+        for root_id in self.children.get(None, []):
+            self._walk(root_id, 0, visited, "")
+
+        # Órfãos: pai informado mas inexistente. Entram com a subárvore deles.
+        for node_id, node in self.nodes.items():
+            parent_id = node.get("parent_id")
+            if parent_id is not None and parent_id not in self.nodes and node_id not in visited:
+                self.orphans.add(node_id)
+                self._walk(node_id, 0, visited, "")
+
+        # O que sobrou só é alcançável por um ciclo (A -> B -> A): seguindo os pais
+        # dentro do restante, os membros do ciclo são os que voltam à própria cadeia
+        remaining = {node_id for node_id in self.nodes if node_id not in visited}
+        seen_from = {}
+        for start in remaining:
+            chain = []
+            current = start
+            while current in remaining and current not in seen_from:
+                seen_from[current] = start
+                chain.append(current)
+                current = self.nodes[current].get("parent_id")
+            if current in remaining and seen_from.get(current) == start:
+                self.cycles.update(chain[chain.index(current):])
+
+        for node_id in [n for n in self.nodes if n in self.cycles]:
+            self._walk(node_id, 0, visited, "")
+
+        self._options = None
+
+    # --- CONSULTAS ---
+    def label(self, node_id):
+        node = self.nodes[node_id]
+        level = self.depth.get(node_id, 0)
+        if node_id in self.cycles:
+            return f"♻️ [Ciclo] {node['name']}"
+        if node_id in self.orphans:
+            return f"⚠️ [Orfão] {node['name']}"
+        prefix = "└── " * level if level > 0 else "📦 "
+        return f"{prefix}{node['name']}"
+
+    @property
+    def options(self):
+        # Lista (id, rótulo) na ordem da árvore, usada pelo navegador e pelos selects de pai
+        if self._options is None:
+            self._options = [(node_id, self.label(node_id)) for node_id in self.order]
+        return self._options
+
+    def get(self, node_id):
+        return self.nodes.get(node_id)
+
+    def descendants(self, node_id):
+        result = set()
+        stack = list(self.children.get(node_id, []))
+        while stack:
+            child_id = stack.pop()
+            if child_id in result:
+                continue
+            result.add(child_id)
+            stack.extend(self.children.get(child_id, []))
+        return result
+
+    def __len__(self):
+        return len(self.nodes)
+
+    # --- ATUALIZAÇÃO INCREMENTAL ---
+    def add_node(self, node):
+        node = dict(node)
+        self.nodes[node["id"]] = node
+        self.children.setdefault(node.get("parent_id"), []).append(node["id"])
+        self._rebuild()
+
+    def add_nodes(self, nodes):
+        # Inserção em lote (importação): reconstrói a ordem uma única vez
+        for node in nodes:
+            node = dict(node)
+            self.nodes[node["id"]] = node
+            self.children.setdefault(node.get("parent_id"), []).append(node["id"])
+        self._rebuild()
+
+    def update_node(self, node_id, changes):
+        node = self.nodes[node_id]
+        old_parent = node.get("parent_id")
+        node.update(changes)
+        new_parent = node.get("parent_id")
+        if new_parent != old_parent:
+            self.children[old_parent].remove(node_id)
+            self.children.setdefault(new_parent, []).append(node_id)
+        self._rebuild()
+
+    def remove_node(self, node_id):
+        node = self.nodes.pop(node_id, None)
+        if node is None:
+            return
+        self.children.get(node.get("parent_id"), []).remove(node_id)
+        # Filhos do nó removido ficam órfãos até o servidor dizer o contrário
+        self._rebuild()
+
+
+# --- NAVEGAÇÃO SOB DEMANDA ---
+# Para taxonomias muito grandes: só os filhos dos nós expandidos são buscados
+# (GET /taxonomies/nodes?type=&parent_id=) e renderizados, em páginas de CHILDREN_PAGE_SIZE.
+# Expõe a mesma interface de consulta/atualização da TaxonomyTree usada pelos formulários.
+
+CHILDREN_PAGE_SIZE = 50
+
+
+def normalize_text(text):
+    # Minúsculas e sem acentos, para a busca "ferias" achar "Férias"
+    decomposed = unicodedata.normalize("NFKD", str(text or ""))
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def node_matches(node, query):
+    q = normalize_text(query)
+    if q in normalize_text(node.get("name")):
+        return True
+    exemplos = (node.get("metadata") or {}).get("exemplos", []) or []
+    return any(q in normalize_text(ex) for ex in exemplos)
+
+
+class LazyTaxonomy:
+    def __init__(self):
+        self.nodes = {}
+        self.children = {}      # parent_id -> [ids] (só para pais já carregados)
+        self.depth = {}
+        self.expanded = set()
+        self.limits = {}        # parent_id -> quantos filhos exibir
+
+    def is_loaded(self, parent_id):
+        return parent_id in self.children
+
+    def load_children(self, parent_id, fetch_children):
+        # fetch_children(parent_id) -> lista de nós; chamado só na primeira expansão
+        if parent_id not in self.children:
+            base_depth = self.depth.get(parent_id, -1) + 1 if parent_id is not None else 0
+            self.children[parent_id] = []
+            for n in fetch_children(parent_id):
+                self.nodes[n["id"]] = dict(n)
+                self.depth[n["id"]] = base_depth
+                self.children[parent_id].append(n["id"])
+        return self.children[parent_id]
+
+    def toggle(self, node_id):
+        if node_id in self.expanded:
+            self.expanded.discard(node_id)
+        else:
+            self.expanded.add(node_id)
+
+    def show_more(self, parent_id):
+        self.limits[parent_id] = self.limits.get(parent_id, CHILDREN_PAGE_SIZE) + CHILDREN_PAGE_SIZE
+
+    def visible_rows(self, fetch_children):
+        # Linhas a desenhar: ("node", id, depth) ou ("more", parent_id, depth, restantes).
+        # DFS com pilha de tarefas: ("expand", parent_id, depth) gera as linhas dos filhos.
+        rows = []
+        stack = [("expand", None, 0)]
+        while stack:
+            item = stack.pop()
+            if item[0] == "expand":
+                _, parent_id, depth = item
+                kids = self.load_children(parent_id, fetch_children)
+                limit = self.limits.get(parent_id, CHILDREN_PAGE_SIZE)
+                tasks = [("node", node_id, depth) for node_id in kids[:limit]]
+                if len(kids) > limit:
+                    tasks.append(("more", parent_id, depth, len(kids) - limit))
+                stack.extend(reversed(tasks))
+                continue
+            rows.append(item)
+            if item[0] == "node" and item[1] in self.expanded and item[2] < MAX_DEPTH:
+                stack.append(("expand", item[1], item[2] + 1))
+        return rows
+
+    # --- Interface compartilhada com TaxonomyTree ---
+    def label(self, node_id):
+        level = self.depth.get(node_id, 0)
+        prefix = "└── " * level if level > 0 else "📦 "
+        return f"{prefix}{self.nodes[node_id]['name']}"
+
+    @property
+    def options(self):
+        # Só os nós já carregados (raízes + filhos de nós expandidos)
+        order = []
+        stack = list(reversed(self.children.get(None, [])))
+        while stack:
+            node_id = stack.pop()
+            order.append(node_id)
+            stack.extend(reversed(self.children.get(node_id, [])))
+        return [(node_id, self.label(node_id)) for node_id in order]
+
+    def get(self, node_id):
+        return self.nodes.get(node_id)
+
+    def descendants(self, node_id):
+        result = set()
+        stack = list(self.children.get(node_id, []))
+        while stack:
+            child_id = stack.pop()
+            if child_id in result:
+                continue
+            result.add(child_id)
+            stack.extend(self.children.get(child_id, []))
+        return result
+
+    def add_node(self, node):
+        node = dict(node)
+        parent_id = node.get("parent_id")
+        if parent_id in self.children:
+            self.nodes[node["id"]] = node
+            self.depth[node["id"]] = self.depth.get(parent_id, -1) + 1 if parent_id is not None else 0
+            self.children[parent_id].append(node["id"])
+
+    def add_nodes(self, nodes):
+        # Pais antes dos filhos (ordem da importação), então um passe basta
+        for node in nodes:
+            self.add_node(node)
+
+    def update_node(self, node_id, changes):
+        node = self.nodes.get(node_id)
+        if node is None:
+            return
+        if changes.get("parent_id", node.get("parent_id")) == node.get("parent_id"):
+            node.update(changes)
+            return
+        # Mudou de pai: sai da lista antiga e a subárvore (profundidade mudou) é descarregada
+        self.remove_node(node_id)
+        node.update(changes)
+        self.add_node(node)
+
+    def remove_node(self, node_id):
+        node = self.nodes.pop(node_id, None)
+        if node is None:
+            return
+        siblings = self.children.get(node.get("parent_id"))
+        if siblings and node_id in siblings:
+            siblings.remove(node_id)
+        self.expanded.discard(node_id)
+        self.children.pop(node_id, None)
+
+
+# --- BUSCA APROXIMADA (DUPLICADOS) ---
+# Índice de trigramas sobre nome, descrição e metadata.exemplos de cada nó, por tipo de taxonomia.
+# A busca só visita os nós que compartilham algum trigrama com o texto (listas invertidas),
+# então o custo não depende do tamanho da taxonomia. Mesmos métodos de atualização da
+# TaxonomyTree: o app aplica criação/edição/remoção nele como em qualquer outro cache.
+
+SIMILAR_THRESHOLD = 0.45
+SIMILAR_LIMIT = 5
+
+
+def trigrams(text):
+    words = " ".join(normalize_text(text).split())
+    if not words:
+        return frozenset()
+    padded = f"  {words} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class TaxonomyIndex:
+    def __init__(self, nodes=()):
+        self.nodes = {}
+        self.fields = {}    # id -> [(campo, trigramas)]
+        self.postings = {}  # trigrama -> {(id, posição do campo)}
+        self.add_nodes(nodes)
+
+    def _node_fields(self, node):
+        textos = [("nome", node.get("name")), ("descrição", node.get("description"))]
+        textos += [("exemplo", ex) for ex in (node.get("metadata") or {}).get("exemplos", []) or []]
+        return [(campo, trigrams(texto)) for campo, texto in textos if texto]
+
+    def add_node(self, node):
+        node = dict(node)
+        if node["id"] in self.nodes:
+            self.remove_node(node["id"])
+        self.nodes[node["id"]] = node
+        self.fields[node["id"]] = self._node_fields(node)
+        for pos, (_, grams) in enumerate(self.fields[node["id"]]):
+            for g in grams:
+                self.postings.setdefault(g, set()).add((node["id"], pos))
+
+    def add_nodes(self, nodes):
+        for node in nodes:
+            self.add_node(node)
+
+    def update_node(self, node_id, changes):
+        # Só os trigramas do nó editado são trocados
+        if node_id in self.nodes:
+            self.add_node({**self.nodes[node_id], **changes})
+
+    def remove_node(self, node_id):
+        self.nodes.pop(node_id, None)
+        for pos, (_, grams) in enumerate(self.fields.pop(node_id, [])):
+            for g in grams:
+                entries = self.postings.get(g)
+                if entries is not None:
+                    entries.discard((node_id, pos))
+                    if not entries:
+                        del self.postings[g]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def search(self, text, limit=SIMILAR_LIMIT, threshold=SIMILAR_THRESHOLD):
+        # Similaridade de Dice entre o texto e cada campo; vale o melhor campo do nó
+        query = trigrams(text)
+        if not query:
+            return []
+        hits = {}
+        for g in query:
+            for key in self.postings.get(g, ()):
+                hits[key] = hits.get(key, 0) + 1
+
+        best = {}
+        for (node_id, pos), shared in hits.items():
+            campo, grams = self.fields[node_id][pos]
+            score = 2 * shared / (len(query) + len(grams))
+            if score >= threshold and score > best.get(node_id, (0, None))[0]:
+                best[node_id] = (score, campo)
+
+        ranked = sorted(best.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        return [(score, campo, self.nodes[node_id]) for node_id, (score, campo) in ranked]
+
+    def similar(self, texts, limit=SIMILAR_LIMIT, threshold=SIMILAR_THRESHOLD):
+        # Vários textos (nome + exemplos do item novo): fica o melhor resultado de cada nó
+        best = {}
+        for text in texts:
+            for score, campo, node in self.search(text, limit, threshold):
+                if score > best.get(node["id"], (0,))[0]:
+                    best[node["id"]] = (score, campo, node)
+        return sorted(best.values(), key=lambda item: item[0], reverse=True)[:limit]
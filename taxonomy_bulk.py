@@ -0,0 +1,290 @@
+import csv
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# --- IMPORTAÇÃO / EXPORTAÇÃO EM LOTE DE TAXONOMIAS ---
+# Formatos de importação:
+#   CSV por níveis:   Sistema,Módulo,Funcionalidade   (uma linha = um caminho na hierarquia)
+#   CSV explícito:    ref,name,description,parent_ref,exemplos,responsabilidade
+#   JSON aninhado:    [{"name": ..., "description": ..., "metadata": {...}, "children": [...]}]
+#   JSON plano:       [{"ref": ..., "name": ..., "parent_ref": ...}]
+# As referências de pai são resolvidas localmente e os nós são enviados em lotes por nível
+# (pais antes dos filhos), com paralelismo limitado dentro de cada nível.
+
+PATH_SEP = " > "
+BULK_SUFFIX = "/bulk"
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_MAX_WORKERS = 4
+
+CSV_EXPLICIT_COLUMNS = ("ref", "name", "description", "parent_ref", "exemplos", "responsabilidade")
+
+
+def _split_exemplos(value):
+    if isinstance(value, list):
+        return [x.strip() for x in value if str(x).strip()]
+    return [x.strip() for x in (value or "").split(";") if x.strip()]
+
+
+def _metadata_from_row(row):
+    meta = {}
+    if row.get("exemplos"):
+        meta["exemplos"] = _split_exemplos(row["exemplos"])
+    if row.get("responsabilidade"):
+        meta["responsabilidade"] = row["responsabilidade"].strip()
+    return meta
+
+
+def _path_nodes(paths):
+    # Cada caminho gera um nó por prefixo; prefixos repetidos viram o mesmo nó
+    nodes = {}
+    for parts in paths:
+        parts = [p.strip() for p in parts if p and p.strip()]
+        for i in range(len(parts)):
+            ref = PATH_SEP.join(parts[:i + 1])
+            if ref not in nodes:
+                nodes[ref] = {
+                    "ref": ref,
+                    "parent_ref": PATH_SEP.join(parts[:i]) or None,
+                    "name": parts[i],
+                    "description": "",
+                    "metadata": {},
+                }
+    return list(nodes.values())
+
+
+def parse_csv(text):
+    reader = csv.reader(io.StringIO(text))
+    rows = [r for r in reader if any(c.strip() for c in r)]
+    if not rows:
+        return []
+    header = [h.strip().lower() for h in rows[0]]
+
+    if "name" in header:
+        nodes = []
+        for raw in rows[1:]:
+            row = dict(zip(header, raw))
+            name = (row.get("name") or "").strip()
+            if not name:
+                continue
+            nodes.append({
+                "ref": (row.get("ref") or name).strip(),
+                "parent_ref": (row.get("parent_ref") or "").strip() or None,
+                "name": name,
+                "description": (row.get("description") or "").strip(),
+                "metadata": _metadata_from_row(row),
+            })
+        return nodes
+
+    # CSV por níveis: o cabeçalho só nomeia os níveis (Sistema, Módulo, ...)
+    return _path_nodes(rows[1:])
+
+
+def parse_json(text):
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("nodes", [data])
+
+    if any("children" in item for item in data):
+        nodes = []
+        stack = [(item, None) for item in reversed(data)]
+        while stack:
+            item, parent_ref = stack.pop()
+            name = item["name"].strip()
+            ref = f"{parent_ref}{PATH_SEP}{name}" if parent_ref else name
+            nodes.append({
+                "ref": ref,
+                "parent_ref": parent_ref,
+                "name": name,
+                "description": item.get("description", ""),
+                "metadata": item.get("metadata", {}) or {},
+            })
+            stack.extend((child, ref) for child in reversed(item.get("children", [])))
+        return nodes
+
+    return [{
+        "ref": str(item.get("ref") or item["name"]),
+        "parent_ref": item.get("parent_ref"),
+        "name": item["name"],
+        "description": item.get("description", ""),
+        "metadata": item.get("metadata", {}) or {},
+    } for item in data]
+
+
+def plan_import(import_nodes, tree):
+    # Ordem topológica por níveis. Nós cujo caminho já existe na árvore são reaproveitados.
+    # parent_ref pode apontar para outro ref do arquivo ou para o id de um nó existente.
+    by_ref = {n["ref"]: n for n in import_nodes}
+    existing_by_path = {path: node_id for node_id, path in tree.paths.items()}
+    errors = []
+
+    path_of = {}
+
+    def resolve_path(ref):
+        # Caminho completo do nó (para casar com a árvore existente), iterativo e com detecção de ciclo
+        chain = []
+        current = ref
+        seen = set()
+        while current in by_ref and current not in path_of:
+            if current in seen:
+                raise ValueError(f"Ciclo nas referências de pai envolvendo '{current}'.")
+            seen.add(current)
+            chain.append(current)
+            current = by_ref[current]["parent_ref"]
+        if current in path_of:
+            base = path_of[current]
+        elif current is None:
+            base = ""
+        elif tree.get(current):
+            base = tree.paths.get(current, tree.get(current)["name"])
+        else:
+            raise ValueError(f"Pai '{current}' não encontrado no arquivo nem na taxonomia.")
+        for r in reversed(chain):
+            base = f"{base}{PATH_SEP}{by_ref[r]['name']}" if base else by_ref[r]["name"]
+            path_of[r] = base
+
+    for n in import_nodes:
+        try:
+            resolve_path(n["ref"])
+        except ValueError as e:
+            errors.append(str(e))
+
+    existing = {}
+    levels = {}
+    for n in import_nodes:
+        if n["ref"] not in path_of:
+            continue
+        path = path_of[n["ref"]]
+        if path in existing_by_path:
+            existing[n["ref"]] = existing_by_path[path]
+            continue
+        levels.setdefault(path.count(PATH_SEP), []).append(n)
+
+    return [levels[k] for k in sorted(levels)], existing, sorted(set(errors))
+
+
+def export_nodes(tree):
+    # Lista plana na ordem da árvore, com ref = id e parent_ref = id do pai
+    return [{
+        "ref": node_id,
+        "parent_ref": tree.get(node_id).get("parent_id"),
+        "path": tree.paths.get(node_id, ""),
+        "name": tree.get(node_id)["name"],
+        "description": tree.get(node_id).get("description", "") or "",
+        "metadata": tree.get(node_id).get("metadata", {}) or {},
+    } for node_id in tree.order]
+
+
+def export_json(tree):
+    # JSON aninhado (mesmo formato aceito na importação)
+    items = {}
+    roots = []
+    for n in export_nodes(tree):
+        item = {"name": n["name"], "description": n["description"], "metadata": n["metadata"], "children": []}
+        items[n["ref"]] = item
+        parent = items.get(n["parent_ref"])
+        (parent["children"] if parent else roots).append(item)
+    return json.dumps(roots, ensure_ascii=False, indent=2)
+
+
+def export_csv(tree):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(CSV_EXPLICIT_COLUMNS + ("path",))
+    for n in export_nodes(tree):
+        meta = n["metadata"]
+        writer.writerow([
+            n["ref"], n["name"], n["description"], n["parent_ref"] or "",
+            "; ".join(meta.get("exemplos", [])), meta.get("responsabilidade", ""), n["path"],
+        ])
+    return out.getvalue()
+
+
+class BulkImporter:
+    def __init__(self, api, path, node_type, batch_size=DEFAULT_BATCH_SIZE, max_workers=DEFAULT_MAX_WORKERS):
+        self.api = api
+        self.path = path
+        self.node_type = node_type
+        self.batch_size = max(int(batch_size), 1)
+        self.max_workers = max(int(max_workers), 1)
+        self.bulk_supported = True
+
+    def _payload(self, n, ids):
+        parent_ref = n["parent_ref"]
+        return {
+            "type": self.node_type,
+            "name": n["name"],
+            "description": n["description"],
+            "parent_id": ids.get(parent_ref, parent_ref),
+            "metadata": n["metadata"],
+        }
+
+    def _send_batch(self, payloads):
+        # Devolve (nós criados, erro ou None). Num POST por nó, os criados antes da falha
+        # voltam junto com o erro: o lote parcial precisa entrar na árvore local (senão um
+        # novo import duplicaria esses nós no servidor).
+        if self.bulk_supported:
+            r = self.api.post(f"{self.path}{BULK_SUFFIX}", json={"nodes": payloads})
+            if r.status_code in (200, 201):
+                return r.json().get("nodes", []), None
+            if r.status_code not in (404, 405):
+                return [], f"HTTP {r.status_code}: {r.text[:300]}"
+            # Backend sem rota de lote: cai para um POST por nó
+            self.bulk_supported = False
+
+        created = []
+        for p in payloads:
+            try:
+                r = self.api.post(self.path, json=p)
+            except Exception as e:
+                return created, str(e)
+            if r.status_code != 201:
+                return created, f"HTTP {r.status_code}: {r.text[:300]}"
+            created.append(r.json())
+        return created, None
+
+    def run(self, levels, existing):
+        # Gerador de eventos: {"step": "progress"|"error"|"final", ...}
+        ids = dict(existing)  # ref -> id no servidor
+        total = sum(len(level) for level in levels)
+        done = 0
+        created_nodes = []
+        failed = 0
+        partial = 0  # lotes que falharam no meio, com parte dos nós já criada
+        import_refs = {n["ref"] for level in levels for n in level}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for depth, level in enumerate(levels):
+                # Filhos de pais que falharam não podem ser criados
+                pending = [n for n in level if n["parent_ref"] is None or n["parent_ref"] in ids
+                           or n["parent_ref"] not in import_refs]
+                skipped = len(level) - len(pending)
+                failed += skipped
+                done += skipped
+
+                batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+                futures = {
+                    pool.submit(self._send_batch, [self._payload(n, ids) for n in batch]): batch
+                    for batch in batches
+                }
+                for fut in as_completed(futures):
+                    batch = futures[fut]
+                    try:
+                        created, error = fut.result()
+                    except Exception as e:
+                        created, error = [], str(e)
+                    for n, c in zip(batch, created):
+                        ids[n["ref"]] = c["id"]
+                        created_nodes.append({**self._payload(n, ids), **c})
+                    if error or len(created) < len(batch):
+                        failed += len(batch) - len(created)
+                        if created:
+                            partial += 1
+                            error = f"lote parcial, {len(created)} de {len(batch)} criados ({error or 'resposta incompleta'})"
+                        yield {"step": "error", "msg": f"Nível {depth + 1}: {error}"}
+                    done += len(batch)
+                    yield {"step": "progress", "current": done, "total": total,
+                           "msg": f"Nível {depth + 1}/{len(levels)}"}
+
+        yield {"step": "final", "created": created_nodes, "failed": failed, "partial": partial,
+               "reused": len(existing)}
@@ -0,0 +1,32 @@
+from answer_cache import AnswerCache, code_tokens, is_cacheable
+
+SPECIALIST = {"agent": "persona_specialist"}
+
+
+def test_default_get_only_matches_the_same_normalized_question():
+    cache = AnswerCache()
+    cache.put("Persona SQL", "Como calcular férias do funcionário?", "resposta", SPECIALIST)
+
+    hit = cache.get("Persona SQL", "como calcular ferias do funcionario")
+    assert hit is not None and hit[1] == 1.0
+    assert cache.get("Persona SQL", "como cancelar ferias do funcionario") is None
+    assert cache.get("Contábil SQL", "como calcular ferias do funcionario") is None
+
+
+def test_fuzzy_match_never_crosses_different_codes():
+    cache = AnswerCache()
+    cache.put("Persona SQL", "erro S-1200 rubrica", "resposta 1200", SPECIALIST)
+
+    assert code_tokens("erro S-1200 rubrica") == {"s-1200"}
+    assert cache.get("Persona SQL", "erro S-1210 rubrica", similarity=0.5) is None
+    assert cache.get("Persona SQL", "erro 1200 rubrica", similarity=0.5) is None
+    hit = cache.get("Persona SQL", "erro S-1200 na rubrica", similarity=0.8)
+    assert hit is not None and hit[0].text == "resposta 1200" and hit[1] < 1.0
+
+
+def test_only_read_only_agents_without_tools_are_cacheable():
+    assert is_cacheable({"agent": "receptionist"})
+    assert is_cacheable(SPECIALIST)
+    assert not is_cacheable({"agent": "ticket_agent"})
+    assert not is_cacheable({"agent": "persona_specialist", "tool_calls": [{"name": "criar_ticket"}]})
+    assert not is_cacheable({})
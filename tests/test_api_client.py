@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from api_client import ApiClient
+
+ETAG = '"v1"'
+PAYLOAD = {"agregados": {"sistema": [{"categoria": "Persona SQL", "quantidade": 3}]}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Servidor local no lugar do backend: responde 304 quando o cliente manda o ETag atual
+    def do_GET(self):
+        if self.path.startswith(("/lento", "/sobrecarga")):
+            return self._unreliable()
+        self.server.seen.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.send_header("ETag", ETAG)
+            self.end_headers()
+            return
+        body = json.dumps(PAYLOAD).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", ETAG)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _unreliable(self):
+        # /lento demora mais que o read timeout; /sobrecarga responde 503 na primeira chamada
+        self.server.hits.append(self.path)
+        if self.path.startswith("/lento"):
+            time.sleep(0.5)
+        status = 503 if self.path.startswith("/sobrecarga") and len(self.server.hits) == 1 else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    srv.seen = []
+    srv.hits = []
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_get_json_revalidates_with_etag_and_reuses_data_on_304(server):
+    api = ApiClient(f"http://127.0.0.1:{server.server_port}", "1")
+
+    first = api.get_json("/tickets/analytics", params={"limit": 10})
+    second = api.get_json("/tickets/analytics", params={"limit": 10})
+
+    assert server.seen == [None, ETAG]
+    assert first.ok and not first.not_modified
+    assert first.data == PAYLOAD and first.version == ETAG
+    assert second.ok and second.not_modified
+    assert second.data is first.data and second.version == ETAG
+    api.close()
+
+
+def test_get_json_keys_validators_by_params(server):
+    api = ApiClient(f"http://127.0.0.1:{server.server_port}", "1")
+
+    api.get_json("/tickets/analytics", params={"limit": 10})
+    other = api.get_json("/tickets/analytics", params={"limit": 20})
+
+    # Outra combinação de params não tem validador guardado: GET sem If-None-Match
+    assert server.seen == [None, None]
+    assert not other.not_modified
+    api.close()
+
+
+def test_read_timeout_is_not_retried(server):
+    api = ApiClient(f"http://127.0.0.1:{server.server_port}", "1", read_timeouts={"/lento": 0.2})
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        api.get("/lento")
+
+    assert server.hits == ["/lento"]
+    api.close()
+
+
+def test_overload_status_is_retried(server):
+    api = ApiClient(f"http://127.0.0.1:{server.server_port}", "1", backoff_factor=0)
+
+    response = api.get("/sobrecarga")
+
+    assert response.status_code == 200
+    assert server.hits == ["/sobrecarga", "/sobrecarga"]
+    api.close()
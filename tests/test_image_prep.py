@@ -0,0 +1,36 @@
+import io
+
+from PIL import Image
+
+from image_prep import ImagePreprocessor
+
+
+def _encode(img, fmt, **params):
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, **params)
+    return buf.getvalue()
+
+
+def test_small_palette_png_keeps_the_original_bytes():
+    img = Image.new("P", (300, 200))
+    img.putpalette([i % 256 for i in range(768)])
+    for x in range(0, 300, 10):
+        img.paste(x % 16, (x, 0, x + 1, 200))
+    data = _encode(img, "PNG")
+
+    name, prepared, info = ImagePreprocessor()("tela.png", data)
+
+    assert (name, prepared) == ("tela.png", data)
+    assert info["prepared_bytes"] == len(data) and info["prepared_size"] == (300, 200)
+
+
+def test_large_rotated_jpeg_is_reduced_with_the_oriented_size():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # girada 90°: largura e altura trocam
+    data = _encode(Image.effect_noise((4000, 3000), 30).convert("RGB"), "JPEG", quality=90, exif=exif)
+
+    name, prepared, info = ImagePreprocessor(max_dimension=1600)("foto.jpeg", data)
+
+    assert name == "foto.jpg" and len(prepared) < len(data)
+    assert info["original_size"] == (3000, 4000)
+    assert info["prepared_size"] == (1200, 1600)
@@ -0,0 +1,105 @@
+import threading
+import time
+
+from ingest_scheduler import (IngestScheduler, MIN_BACKOFF_SECONDS, WAIT_BACKOFF, WAIT_RATE,
+                              retry_after_seconds)
+
+
+class _Clock:
+    # Relógio manual: o tempo só anda quando o teste manda
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Response:
+    def __init__(self, retry_after=None):
+        self.headers = {} if retry_after is None else {"Retry-After": retry_after}
+
+
+def _acquire_in_thread(scheduler, tenant_id, tickets):
+    waits = []
+    done = threading.Event()
+
+    def run():
+        scheduler.acquire(tenant_id, tickets, on_wait=lambda position, reason: waits.append(reason))
+        done.set()
+
+    threading.Thread(target=run, daemon=True).start()
+    return waits, done
+
+
+def _wait_for(condition, timeout=5.0):
+    limite = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < limite, "condição não atingida"
+        time.sleep(0.01)
+
+
+def test_throttle_halves_in_flight_limit_and_success_recovers_it():
+    clock = _Clock()
+    scheduler = IngestScheduler(max_in_flight=4, tickets_per_minute=10000, clock=clock)
+
+    scheduler.acquire("t", 10)
+    assert scheduler.release("t", throttled=True) == MIN_BACKOFF_SECONDS
+    assert scheduler.status("t")["limit"] == 2
+    clock.now += MIN_BACKOFF_SECONDS
+
+    scheduler.acquire("t", 10)
+    assert scheduler.release("t", throttled=True) == 2 * MIN_BACKOFF_SECONDS
+    assert scheduler.status("t")["limit"] == 1
+    assert scheduler.status("t")["throttles"] == 2
+    clock.now += 2 * MIN_BACKOFF_SECONDS
+
+    # Aumento aditivo: uma vaga por lote aceito, até o máximo configurado
+    limits = []
+    for _ in range(4):
+        scheduler.acquire("t", 10)
+        scheduler.release("t")
+        limits.append(scheduler.status("t")["limit"])
+    assert limits == [2, 3, 4, 4]
+
+    # O backoff também foi desfeito: o próximo 429 volta ao mínimo
+    scheduler.acquire("t", 10)
+    assert scheduler.release("t", throttled=True) == MIN_BACKOFF_SECONDS
+
+
+def test_retry_after_extends_the_backoff_and_blocks_acquire_until_it_expires():
+    clock = _Clock()
+    scheduler = IngestScheduler(max_in_flight=2, tickets_per_minute=10000, clock=clock)
+
+    scheduler.acquire("t", 10)
+    assert scheduler.release("t", throttled=True, retry_after=30.0) == 30.0
+    assert scheduler.status("t")["backoff_s"] == 30.0
+
+    waits, done = _acquire_in_thread(scheduler, "t", 10)
+    _wait_for(lambda: WAIT_BACKOFF in waits)
+    assert not done.is_set()
+
+    clock.now += 30.0
+    assert done.wait(5.0)
+    assert scheduler.status("t")["in_flight"] == 1
+
+
+def test_token_bucket_waits_for_refill():
+    clock = _Clock()
+    scheduler = IngestScheduler(max_in_flight=4, tickets_per_minute=60, clock=clock)
+
+    scheduler.acquire("t", 60)
+    waits, done = _acquire_in_thread(scheduler, "t", 30)
+    _wait_for(lambda: WAIT_RATE in waits)
+
+    clock.now += 29.0
+    time.sleep(0.6)
+    assert not done.is_set()
+    clock.now += 1.0
+    assert done.wait(5.0)
+
+
+def test_retry_after_header_only_accepts_seconds():
+    assert retry_after_seconds(_Response("12")) == 12.0
+    assert retry_after_seconds(_Response("-3")) == 0.0
+    assert retry_after_seconds(_Response("Wed, 21 Oct 2026 07:28:00 GMT")) is None
+    assert retry_after_seconds(_Response()) is None
@@ -0,0 +1,95 @@
+import json
+import os
+
+from dedupe_index import DedupeCounter, DedupeIndex
+from ingest_telemetry import IngestTelemetry
+from ingestion import ChunkedIngestion, iter_chunks
+
+
+class _Response:
+    def __init__(self, status_code, events=()):
+        self.status_code = status_code
+        self.text = "" if status_code == 200 else "erro"
+        self._body = "".join(json.dumps(e) + "\n" for e in events).encode("utf-8")
+
+    def iter_content(self, chunk_size=1):
+        yield self._body
+
+    def close(self):
+        pass
+
+
+class _Api:
+    # Primeiro POST falha (5xx); os demais devolvem o evento final com as stats do chunk
+    def __init__(self, fail_first=True):
+        self.calls = []
+        self.fail_first = fail_first
+
+    def post(self, path, json=None, stream=False):
+        self.calls.append((json["clear_db"], [t["ticket"]["ticket_id"] for t in json["tickets"]]))
+        if self.fail_first and len(self.calls) == 1:
+            return _Response(502)
+        return _Response(200, [{"step": "final", "stats": {"total_recebido": len(json["tickets"])}}])
+
+
+def _tickets(count):
+    return [{"ticket": {"ticket_id": f"T{i}"}, "conversa": []} for i in range(count)]
+
+
+def _run(api, clear_db=True, done_ids=()):
+    cleared = []
+    ingestion = ChunkedIngestion(api, "/ingest-pipeline", iter_chunks(_tickets(6), 2), 6,
+                                 clear_db=clear_db, max_workers=3, done_ids=done_ids,
+                                 on_db_cleared=lambda: cleared.append(True))
+    steps = [e["step"] for e in ingestion.run() if e["step"] in ("chunk_done", "chunk_failed")]
+    return steps, cleared
+
+
+def test_clear_db_moves_to_the_next_chunk_when_the_first_fails():
+    api = _Api()
+    steps, cleared = _run(api)
+
+    assert steps == ["chunk_failed", "chunk_done", "chunk_done"]
+    # O chunk 1 leva o clear_db do chunk 0 que falhou; depois disso nenhum outro apaga o banco
+    assert [clear for clear, _ in api.calls] == [True, True, False]
+    assert api.calls[1][1] == ["T2", "T3"]
+    assert cleared == [True]
+
+
+def test_clear_db_is_sent_once_when_the_first_chunk_succeeds():
+    api = _Api(fail_first=False)
+    steps, cleared = _run(api)
+
+    assert steps == ["chunk_done"] * 3
+    assert [clear for clear, _ in api.calls] == [True, False, False]
+    assert cleared == [True]
+
+
+def test_resume_never_clears_the_database():
+    api = _Api(fail_first=False)
+    first_chunk = next(iter_chunks(_tickets(6), 2))[1]
+    _run(api, done_ids={first_chunk})
+
+    assert [clear for clear, _ in api.calls] == [False, False]
+
+
+def test_tickets_dropped_by_dedupe_count_as_skipped_progress(tmp_path):
+    index = DedupeIndex(os.path.join(str(tmp_path), "dedupe.sqlite"))
+    tickets = _tickets(6)
+    index.mark_accepted("1", [tickets[0], tickets[1], tickets[5]])
+    counter = DedupeCounter()
+    api = _Api(fail_first=False)
+    ingestion = ChunkedIngestion(api, "/ingest-pipeline",
+                                 iter_chunks(index.filter_new("1", tickets, counter=counter), 2), 6,
+                                 max_workers=1, dedupe_counter=counter)
+    telemetry = IngestTelemetry(6)
+    events = list(ingestion.run())
+    for event in events:
+        telemetry.record(event)
+
+    skipped = [e for e in events if e["step"] == "tickets_skipped"]
+    assert sum(e["size"] for e in skipped) == counter.dropped == 3
+    assert all(e["total"] == 6 and e["current"] <= 6 for e in skipped)
+    assert [ids for _, ids in api.calls] == [["T2", "T3"], ["T4"]]
+    assert telemetry.skipped_tickets + telemetry.done_tickets == 6
+    assert telemetry.eta == 0.0
@@ -0,0 +1,53 @@
+import json
+
+from ndjson_reader import READ_CHUNK_SIZE, NdjsonReader
+
+
+class _Response:
+    # Entrega o corpo em blocos do tamanho pedido, como o iter_content do requests
+    def __init__(self, body):
+        self.body = body
+        self.block_sizes = []
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.body), chunk_size):
+            block = self.body[start:start + chunk_size]
+            self.block_sizes.append(len(block))
+            yield block
+
+
+def _line(event):
+    return (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def test_lines_and_multibyte_characters_split_across_64kb_blocks():
+    # Primeira linha termina 1 byte depois do limite do bloco; o "ç" (2 bytes) e o "€" (3 bytes)
+    # da segunda linha caem exatamente sobre o limite do bloco seguinte
+    first = _line({"step": "log", "msg": "x" * READ_CHUNK_SIZE})
+    second_prefix = _line({"step": "log", "msg": ""})[:-3]
+    padding = 2 * READ_CHUNK_SIZE - len(first) - len(second_prefix) - 1
+    msg = "a" * padding + "ç€ação"
+    body = first + _line({"step": "log", "msg": msg}) + _line({"step": "final", "stats": {"total_recebido": 1}})
+    assert body[2 * READ_CHUNK_SIZE - 1:2 * READ_CHUNK_SIZE + 1] == "ç".encode("utf-8")
+
+    response = _Response(body)
+    reader = NdjsonReader(response)
+    events = list(reader)
+
+    assert max(response.block_sizes) == READ_CHUNK_SIZE
+    assert [e["step"] for e in events] == ["log", "log", "final"]
+    assert len(events[0]["msg"]) == READ_CHUNK_SIZE
+    assert events[1]["msg"] == msg
+    assert reader.lines == 3 and reader.parse_errors == 0
+
+
+def test_invalid_lines_are_counted_and_last_line_without_newline_is_read():
+    body = b'{"step": "log", "msg": "ok"}\n\n{quebrado\n[1, 2]\n{"step": "final", "stats": {}}'
+    reader = NdjsonReader(_Response(body), chunk_size=5)
+
+    events = list(reader)
+
+    assert [e["step"] for e in events] == ["log", "final"]
+    assert reader.lines == 4
+    assert reader.parse_errors == 2
+    assert len(reader.error_samples) == 2 and "{quebrado" in reader.error_samples[0]
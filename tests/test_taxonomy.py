@@ -0,0 +1,40 @@
+from taxonomy import TaxonomyTree
+
+
+def _node(node_id, parent_id=None):
+    return {"id": node_id, "name": node_id.upper(), "parent_id": parent_id}
+
+
+def test_paths_and_depth_follow_the_parent_chain():
+    tree = TaxonomyTree([_node("b", "a"), _node("a"), _node("c", "b")])
+
+    assert tree.order == ["a", "b", "c"]
+    assert tree.paths["c"] == "A > B > C"
+    assert tree.depth == {"a": 0, "b": 1, "c": 2}
+    assert not tree.orphans and not tree.cycles
+
+
+def test_orphans_enter_with_their_subtree():
+    tree = TaxonomyTree([_node("a"), _node("o", "sumiu"), _node("p", "o")])
+
+    assert tree.orphans == {"o"}
+    assert tree.paths["p"] == "O > P" and tree.depth["p"] == 1
+    assert set(tree.order) == {"a", "o", "p"}
+    assert tree.label("o").startswith("⚠️ [Orfão]")
+
+
+def test_cycles_are_detected_and_their_descendants_still_listed():
+    nodes = [
+        _node("a"),
+        _node("c1", "c2"), _node("c2", "c1"), _node("d", "c1"),  # c1 <-> c2, d pendurado no ciclo
+        _node("x", "x"),  # auto-referência
+        _node("e", "f"), _node("f", "g"), _node("g", "f"),  # e só leva até o ciclo f <-> g
+    ]
+    tree = TaxonomyTree(nodes)
+
+    assert tree.cycles == {"c1", "c2", "x", "f", "g"}
+    assert not tree.orphans
+    assert sorted(tree.order) == sorted(n["id"] for n in nodes)
+    assert len(tree.order) == len(set(tree.order))
+    assert tree.label("x").startswith("♻️ [Ciclo]")
+    assert not tree.label("d").startswith("♻️")
@@ -0,0 +1,57 @@
+from taxonomy import TaxonomyTree
+from taxonomy_bulk import parse_csv, plan_import
+
+TREE = TaxonomyTree([
+    {"id": "1", "name": "Persona SQL", "parent_id": None},
+    {"id": "2", "name": "Folha", "parent_id": "1"},
+])
+
+
+def _refs(levels):
+    return [[n["ref"] for n in level] for level in levels]
+
+
+def test_explicit_parent_ref_is_ordered_by_level_regardless_of_file_order():
+    nodes = parse_csv(
+        "ref,name,description,parent_ref\n"
+        "fun,Cálculo,,mod\n"
+        "mod,Férias,,sis\n"
+        "fun2,Abono,,mod\n"
+        "sis,Estoque Web,,\n"
+    )
+
+    levels, existing, errors = plan_import(nodes, TREE)
+
+    assert _refs(levels) == [["sis"], ["mod"], ["fun", "fun2"]]
+    assert existing == {} and errors == []
+
+
+def test_existing_paths_are_reused_and_ids_work_as_parent_ref():
+    nodes = [
+        {"ref": "p", "parent_ref": None, "name": "Persona SQL"},
+        {"ref": "f", "parent_ref": "p", "name": "Folha"},
+        {"ref": "novo", "parent_ref": "f", "name": "Rescisão"},
+        {"ref": "pelo_id", "parent_ref": "2", "name": "Férias"},
+    ]
+
+    levels, existing, errors = plan_import(nodes, TREE)
+
+    assert existing == {"p": "1", "f": "2"}
+    # Os dois novos ficam sob "Persona SQL > Folha": mesmo nível, enviados juntos
+    assert _refs(levels) == [["novo", "pelo_id"]]
+    assert errors == []
+
+
+def test_cycles_and_missing_parents_are_reported_and_left_out():
+    nodes = [
+        {"ref": "a", "parent_ref": "b", "name": "A"},
+        {"ref": "b", "parent_ref": "a", "name": "B"},
+        {"ref": "c", "parent_ref": "nao_existe", "name": "C"},
+        {"ref": "ok", "parent_ref": None, "name": "OK"},
+    ]
+
+    levels, existing, errors = plan_import(nodes, TREE)
+
+    assert _refs(levels) == [["ok"]]
+    assert any("Ciclo" in e for e in errors)
+    assert any("nao_existe" in e for e in errors)
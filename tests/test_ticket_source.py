@@ -0,0 +1,51 @@
+import io
+import json
+
+import pytest
+
+from ticket_source import TicketSource, iter_json_values
+
+TICKETS = [
+    {"ticket": {"ticket_id": "A1", "titulo": "Erro ] na rubrica [S-1200]"},
+     "conversa": [{"role": "cliente", "text": "valores: [1, 2], \"aspas\" e } chaves"}]},
+    {"ticket": {"ticket_id": "A2", "titulo": "Férias – cálculo"}, "conversa": []},
+    {"ticket": {"ticket_id": "A3", "valor": 12345.678, "ativo": True, "pai": None}, "conversa": []},
+]
+
+
+def _values(data, chunk_size):
+    return list(iter_json_values(io.BytesIO(data), chunk_size=chunk_size))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 64 * 1024])
+def test_top_level_array_with_brackets_inside_strings(chunk_size):
+    data = json.dumps(TICKETS, ensure_ascii=False, indent=2).encode("utf-8")
+
+    assert _values(data, chunk_size) == TICKETS
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5])
+def test_ndjson_and_single_object_with_bom(chunk_size):
+    ndjson = "\n".join(json.dumps(t, ensure_ascii=False) for t in TICKETS).encode("utf-8")
+    single = "\ufeff".encode("utf-8") + json.dumps(TICKETS[1], ensure_ascii=False).encode("utf-8")
+
+    assert _values(ndjson, chunk_size) == TICKETS
+    assert _values(single, chunk_size) == [TICKETS[1]]
+
+
+def test_numbers_cut_at_the_end_of_a_read_are_not_split():
+    assert _values(b"[1, 23456, -7.5e3]", chunk_size=3) == [1, 23456, -7.5e3]
+    assert _values(b"12 345", chunk_size=2) == [12, 345]
+
+
+def test_empty_array_and_truncated_array():
+    assert _values(b"  [ ]  ", chunk_size=2) == []
+    with pytest.raises(ValueError):
+        _values(json.dumps(TICKETS).encode("utf-8")[:-1], chunk_size=16)
+
+
+def test_ticket_source_counts_and_previews_without_a_list():
+    source = TicketSource.from_text(json.dumps(TICKETS, ensure_ascii=False))
+
+    assert source.count() == 3
+    assert [t["ticket"]["ticket_id"] for t in source.preview(2)] == ["A1", "A2"]
@@ -0,0 +1,185 @@
+import codecs
+import io
+import json
+from itertools import islice
+
+# --- LEITURA INCREMENTAL DE EXPORTS DE TICKETS ---
+# Nunca materializa o arquivo inteiro como lista Python: os tickets são decodificados
+# um a um direto do arquivo, no estilo do ijson.
+# Formatos aceitos:
+#   - Array JSON no topo:  [ {...}, {...} ]
+#   - NDJSON / JSONL:      {...}\n{...}\n
+#   - Objeto único:        {...}
+
+READ_CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\r\n"
+
+_decoder = json.JSONDecoder()
+
+# --- MODELO DE TICKET ---
+# Modelo anonimizado exibido na aba de ingestão (e base do corpus sintético do prefilter.py)
+TEMPLATE_JSON = [
+  {
+    "ticket": {
+      "ticket_id": "uuid-gerado-automaticamente",
+      "numeroprotocolo": 12345678,
+      "sistema": "Persona SQL",
+      "versao_sistema": "2.0.0",
+      "tipo": "Dúvida",
+      "situacao": 3,
+      "prioridade": "Normal",
+      "ocorrencias": "S2EDU006 - DÚVIDA SOBRE CÁLCULO",
+      "canal_abertura": "portal",
+      "resumo_admin": "Erro no cálculo de férias",
+      "ultima_resposta_resumo": "Verificamos que a rubrica estava incorreta...",
+      "atendimentosituacao": "uuid-situacao"
+    },
+    "datas": {
+      "datacriacao": "2025-01-27 10:00:00+00",
+      "data_ultima_resposta": "2025-01-27 12:00:00+00",
+      "data_ultima_resposta_admin": "2025-01-27 11:30:00+00",
+      "dataconclusao": "2025-01-27 14:00:00+00"
+    },
+    "cliente": {
+      "id_cliente": "uuid-cliente",
+      "codigo_cliente": "99999",
+      "nome_cliente": "EMPRESA EXEMPLO LTDA",
+      "nome_fantasia_cliente": "EMPRESA EXEMPLO",
+      "cnpj_cliente": 12345678000199,
+      "email_contato": "contato@empresa.com.br",
+      "nome_contato": "FULANO DE TAL",
+      "telefone_contato": "11-99999-9999"
+    },
+    "suporte": {
+      "nome_equipe": "Suporte Persona",
+      "responsavel_web": "analista@nasajon.com.br"
+    },
+    "conversa": [
+      {
+        "timestamp": "2025-01-27 10:00:00+00",
+        "role": "analista",
+        "author_name": "Analista Nasajon",
+        "canal": "manual",
+        "text": "Olá, qual seria sua dúvida?",
+        "imagens": []
+      },
+      {
+        "timestamp": "2025-01-27 10:05:00+00",
+        "role": "cliente",
+        "author_name": "Fulano de Tal",
+        "canal": "portal",
+        "text": "O cálculo do evento S-1200 está retornando erro de rubrica.",
+        "imagens": ["https://exemplo.com/print_erro.png"]
+      }
+    ]
+  }
+]
+
+
+def _skip(buf, pos, chars):
+    while pos < len(buf) and buf[pos] in chars:
+        pos += 1
+    return pos
+
+
+def iter_json_values(fp, chunk_size=READ_CHUNK_SIZE):
+    # fp: arquivo binário. Se o primeiro valor for um array, itera seus elementos;
+    # caso contrário itera os valores de topo em sequência (NDJSON ou objeto único).
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buf = ""
+    pos = 0
+    eof = False
+    in_array = None
+    read_size = chunk_size
+
+    def fill():
+        nonlocal buf, pos, eof
+        data = fp.read(read_size)
+        if not data:
+            eof = True
+            buf = buf[pos:] + decoder.decode(b"", final=True)
+        else:
+            buf = buf[pos:] + decoder.decode(data)
+        pos = 0
+
+    while True:
+        separators = WHITESPACE + ("," if in_array else "")
+        pos = _skip(buf, pos, separators)
+        if pos >= len(buf):
+            if eof:
+                if in_array:
+                    raise ValueError("JSON truncado: array não foi fechado.")
+                return
+            fill()
+            continue
+
+        if in_array is None:
+            in_array = buf[pos] == "["
+            if in_array:
+                pos += 1
+            continue
+
+        if in_array and buf[pos] == "]":
+            return
+
+        try:
+            value, end = _decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # Valor ainda incompleto no buffer: lê mais (em blocos crescentes para objetos grandes)
+            read_size = min(read_size * 2, 16 * 1024 * 1024)
+            fill()
+            continue
+
+        if end == len(buf) and not eof:
+            # Números/literais no fim do buffer podem estar cortados: confirma com mais dados
+            fill()
+            continue
+
+        read_size = chunk_size
+        pos = end
+        yield value
+
+
+class TicketSource:
+    # Fonte reiterável: cada iteração reabre o arquivo do início via `opener`
+    def __init__(self, opener, name=""):
+        self.opener = opener
+        self.name = name
+        self._count = None
+
+    @classmethod
+    def from_uploaded_file(cls, uploaded_file):
+        def opener():
+            uploaded_file.seek(0)
+            return uploaded_file
+        return cls(opener, name=uploaded_file.name)
+
+    @classmethod
+    def from_text(cls, text):
+        data = text.encode("utf-8")
+        return cls(lambda: io.BytesIO(data), name="texto colado")
+
+    def detach(self):
+        # Cópia em memória independente do upload: um job em segundo plano lê o conteúdo
+        # sem disputar a posição do arquivo com os reruns da sessão (nem depender dela)
+        data = self.opener().read()
+        source = TicketSource(lambda: io.BytesIO(data), name=self.name)
+        source._count = self._count
+        return source
+
+    def __iter__(self):
+        return iter_json_values(self.opener())
+
+    def count(self):
+        # Conta sem guardar os tickets em memória
+        if self._count is None:
+            self._count = sum(1 for _ in self)
+        return self._count
+
+    def preview(self, n=3):
+        return list(islice(self, n))
+
+    def head(self, n):
+        return islice(self, n)
@@ -0,0 +1,121 @@
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# --- ANÁLISE DE IMAGENS DO CHAT ---
+# As descrições do VisionService são guardadas pelo hash do conteúdo da imagem (não pelo nome
+# do arquivo): a mesma captura reenviada com outro nome não é reanalisada, e capturas diferentes
+# com o mesmo nome não são confundidas. LRU em memória na frente de um SQLite em disco.
+# Vários anexos são analisados em paralelo num pool compartilhado pelo processo; a UI só
+# consulta os futures, sem bloquear o input do chat enquanto a análise roda.
+
+DEFAULT_VISION_CACHE_PATH = os.path.join(".cache", "vision_descriptions.sqlite")
+DEFAULT_MEMORY_ENTRIES = 256
+DEFAULT_VISION_WORKERS = 3
+
+
+def image_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class VisionCache:
+    def __init__(self, path=DEFAULT_VISION_CACHE_PATH, max_entries=DEFAULT_MEMORY_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Compartilhado entre sessões/threads do processo: acesso serializado pelo lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS vision_descriptions (
+                    digest TEXT PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+
+    def _remember(self, digest, description):
+        self._memory[digest] = description
+        self._memory.move_to_end(digest)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, digest):
+        with self._lock:
+            if digest in self._memory:
+                self._memory.move_to_end(digest)
+                return self._memory[digest]
+            row = self._conn.execute(
+                "SELECT description FROM vision_descriptions WHERE digest = ?", (digest,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._remember(digest, row[0])
+            return row[0]
+
+    def put(self, digest, description):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO vision_descriptions (digest, description, created_at) VALUES (?, ?, ?)",
+                (digest, description, time.time())
+            )
+            self._remember(digest, description)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM vision_descriptions")
+            self._memory.clear()
+
+
+class VisionAnalyzer:
+    def __init__(self, get_service, cache=None, max_workers=DEFAULT_VISION_WORKERS):
+        # get_service() devolve o VisionService do processo (criado uma vez, via st.cache_resource)
+        self.get_service = get_service
+        self.cache = cache or VisionCache()
+        self._pool = ThreadPoolExecutor(max_workers=max(int(max_workers), 1), thread_name_prefix="vision")
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _analyze(self, digest, name, data, preprocessor):
+        cached = self.cache.get(digest)
+        if cached is not None:
+            return cached
+        if preprocessor is not None:
+            # Redimensiona/recodifica na thread do worker (fora do rerun do Streamlit)
+            name, data, _ = preprocessor(name, data)
+        # O VisionService recebe um arquivo, como o UploadedFile original
+        buffer = io.BytesIO(data)
+        buffer.name = name
+        description = self.get_service().analyze_stream(buffer)
+        if description:
+            self.cache.put(digest, description)
+        return description
+
+    def submit(self, name, data, preprocessor=None):
+        # Devolve (digest, future). A mesma imagem enviada por duas sessões ao mesmo tempo
+        # compartilha o mesmo future em vez de ser analisada duas vezes.
+        # A configuração do pré-processamento entra na chave: original e reduzida são entradas distintas.
+        digest = image_digest(data)
+        if preprocessor is not None:
+            digest = f"{digest}:{preprocessor.key}"
+        with self._lock:
+            future = self._in_flight.get(digest)
+            if future is None:
+                future = self._pool.submit(self._analyze, digest, name, data, preprocessor)
+                self._in_flight[digest] = future
+                future.add_done_callback(lambda _f, d=digest: self._forget(d))
+        return digest, future
+
+    def _forget(self, digest):
+        with self._lock:
+            self._in_flight.pop(digest, None)